@@ -17,4 +17,13 @@
 #  * limitations under the License.
 #  
 
-import extractors,filters,parser,document
\ No newline at end of file
+#
+#  * Submodules are imported on first use (see lazy.py): boilerpy.extractors works
+#  * after a plain "import boilerpy", but nothing is imported before it is needed.
+#
+
+from . import lazy
+
+SUBMODULES = ("extractors", "filters", "parser", "document", "batch", "export", "models", "server", "runner", "pipeline", "dedup", "templates", "incremental")
+
+lazy.install(__name__, dict((name, lazy.submodule(__name__, name)) for name in SUBMODULES))
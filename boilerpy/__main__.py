@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# 
+#  * Command line of boilerpy:
+#  *	python -m boilerpy serve [--host HOST] [--port PORT] [--workers N] [--queue-size N] [--timeout SECONDS]
+#  *	python -m boilerpy batch-plan DB MANIFEST... [--lease-size N]
+#  *	python -m boilerpy batch-work DB OUTPUT [--extractor NAME] [--processes N] [--lease-duration SECONDS]
+#  *	python -m boilerpy batch-status DB
+#  * See server.py and runner.py.
+#  
+
+import sys
+
+USAGE = "usage: python -m boilerpy serve|batch-plan|batch-work|batch-status [options]  (COMMAND --help for the options)"
+
+def main(argv):
+	command = argv[0] if len(argv) > 0 else None
+	if command == "serve":
+		from boilerpy import server
+		server.main(argv[1:])
+	elif command in ("batch-plan", "batch-work", "batch-status"):
+		from boilerpy import runner
+		runner.main(command, argv[1:])
+	else:
+		print >>sys.stderr, USAGE
+		return 2
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
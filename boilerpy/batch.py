@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+#
+#  * boilerpipe
+#  *
+#  * Copyright (c) 2009 Christian Kohlschtter
+#  *
+#  * The author licenses this file to You under the Apache License, Version 2.0
+#  * (the "License"); you may not use this file except in compliance with
+#  * the License.  You may obtain a copy of the License at
+#  *
+#  *	 http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#
+
+import time
+from array import array
+from . import document
+from . import filters
+from .rules import FEATURE_TYPECODES
+
+#
+#  * The features of the {@link TextBlock}s of several documents, packed into one
+#  * array per feature (see getColumn). The documents are laid out one after the
+#  * other, each of them preceded by padding rows holding the features of
+#  * {@link TextBlock#EMPTY_START}, and the last one followed by padding as well.
+#  * Rule classifiers looking at most padding blocks away can thus look at the
+#  * rows around every block, and see exactly what they see at the start and end
+#  * of a single document.
+#  *
+#  * docOffsets[i] is the row of the first block of the i-th document, and
+#  * docOffsets[i+1]-padding the row after its last block.
+#
+class BlockBatch(object):
+	def __init__(self, docs, padding=1):
+		self.docs = docs
+		self.padding = padding
+		pads = [document.TextBlock.EMPTY_START]*padding
+		rows = list(pads)
+		self.docOffsets = array('i')
+		for doc in docs:
+			self.docOffsets.append(len(rows))
+			rows.extend(doc.getTextBlocks())
+			rows.extend(pads)
+		self.docOffsets.append(len(rows))
+		self.rows = rows
+		self.columns = {}
+
+	def __len__(self): return len(self.rows)
+
+	#
+	# 	 * Returns the array of a block feature (see FEATURE_TYPECODES), one item per
+	# 	 * row. Columns are packed on first use only.
+	#
+	def getColumn(self, feature):
+		column = self.columns.get(feature)
+		if column == None:
+			column = array(FEATURE_TYPECODES[feature], [getattr(tb, feature) for tb in self.rows])
+			self.columns[feature] = column
+		return column
+
+	#
+	# 	 * Sets the content flags of the blocks, given one flag per row (flags of
+	# 	 * padding rows are ignored), and returns whether each document was changed.
+	#
+	def scatter(self, flags):
+		offsets = self.docOffsets
+		k = self.padding
+		return [document.setContentFlags(self.rows[offsets[i]:offsets[i+1]-k], flags[offsets[i]:offsets[i+1]-k]) for i in range(len(self.docs))]
+
+
+#
+#  * Classifies the blocks of several documents in one pass with a classifier
+#  * having a classifyBatch() method, such as a {@link RuleClassifier}.
+#  * Returns whether each document was changed.
+#
+def classifyDocuments(classifier, docs):
+	batch = BlockBatch(docs, max(classifier.window, 1))
+	return batch.scatter(classifier.classifyBatch(batch))
+
+#
+#  * Processes several documents with a filter (chain), running the filters which
+#  * can classify a batch on all documents at once, and the others document by
+#  * document. Filters are skipped, and blocks released in lean mode, as by
+#  * FilterChain.process for each document (see DocumentState). The result is the
+#  * same as that of processing each document on its own. Returns whether each
+#  * document was changed.
+#
+def processDocuments(filtr, docs, lean=False):
+	if not isinstance(filtr, filters.FilterChain): return processFilter(filtr, docs)
+	states = [filtr.newState(doc, lean) for doc in docs]
+	changes = processChain(filtr, docs, states)
+	for state in states: filtr.addPasses(state)
+	return changes
+
+def processChain(chain, docs, states):
+	changes = [False]*len(docs)
+	for filtr in chain.filterArr:
+		if isinstance(filtr, filters.FilterChain):
+			childChanges = processChain(filtr, docs, states)
+		else:
+			positions = [i for i, state in enumerate(states) if state.shouldRun(filtr, chain.skipNoOps)]
+			childChanges = [False]*len(docs)
+			for i, changed in zip(positions, processFilter(filtr, [docs[i] for i in positions])):
+				childChanges[i] = changed
+				states[i].ran(filtr)
+			for state in states: state.next()
+		changes = [a or b for a, b in zip(changes, childChanges)]
+	return changes
+
+def processFilter(filtr, docs):
+	if not docs: return []
+	if isinstance(filtr, filters.RoutingFilter): return routeDocuments(filtr, docs)
+	if hasattr(filtr, "classifyBatch"): return classifyDocuments(filtr, docs)
+	return [filtr.process(doc) for doc in docs]
+
+#processes the documents of each route of a RoutingFilter together
+def routeDocuments(router, docs):
+	start = time.time()
+	groups = dict((route, []) for route in filters.ROUTES)
+	for i, doc in enumerate(docs): groups[router.getRoute(doc)].append(i)
+	#the time taken to route them, shared by the documents
+	routeSeconds = (time.time()-start)/max(len(docs), 1)
+	changes = [False]*len(docs)
+	for route in filters.ROUTES:
+		positions = groups[route]
+		if not positions: continue
+		start = time.time()
+		for i, changed in zip(positions, processDocuments(router.filters[route], [docs[i] for i in positions])): changes[i] = changed
+		router.count(route, len(positions), time.time()-start+routeSeconds*len(positions))
+	return changes
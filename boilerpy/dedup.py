@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+#
+#  * boilerpipe
+#  *
+#  * Copyright (c) 2009 Christian Kohlschtter
+#  *
+#  * The author licenses this file to You under the Apache License, Version 2.0
+#  * (the "License"); you may not use this file except in compliance with
+#  * the License.  You may obtain a copy of the License at
+#  *
+#  *	 http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#
+
+#
+#  * Skips the extraction of pages seen before, for batches with many copies of
+#  * the same pages (mirrors, syndicated stories, AMP variants). See
+#  * {@link extractDocuments}, or Extractor.getDocs(texts, fingerprints). Each
+#  * extracted page is fingerprinted three ways:
+#  *
+#  * - the hash of its HTML: the same HTML gets the same document back;
+#  * - the hash of its parsed blocks, with every block feature the filters look
+#  *	at: pages differing only in markup get the same document back, without
+#  *	running the filters;
+#  * - the SimHash of its block texts, weighted by their number of words: a page
+#  *	within maxDistance bits of a stored one is a near-duplicate. Its content is
+#  *	taken over only if the blocks from the first to the last content block of
+#  *	the stored page, and the blocks just before and after them, are found with
+#  *	the same texts in the new page; the other blocks (navigation, related
+#  *	links...) may differ. Otherwise the page is extracted as usual.
+#  *
+#  * The documents returned for duplicates are shared, and should not be changed.
+#
+
+import hashlib
+import time
+from collections import OrderedDict
+from . import document
+
+SIMHASH_BITS = 64
+
+#
+#  * The fingerprints of the last maxSize extracted pages, and statistics of the
+#  * pages looked up.
+#
+class FingerprintStore(object):
+	def __init__(self, maxSize=1000, maxDistance=3):
+		self.maxSize = maxSize
+		self.maxDistance = maxDistance
+		#rawHash -> Fingerprint, least recently used first
+		self.fingerprints = OrderedDict()
+		#parsedHash -> the fingerprints with it, most recently added last: pages
+		#differing in markup only have one each
+		self.byParsedHash = {}
+		#two SimHashes within maxDistance bits have at least one of maxDistance+1
+		#bands in common
+		bandBits = SIMHASH_BITS // (maxDistance+1)
+		self.bandShifts = [i*bandBits for i in range(maxDistance+1)]
+		self.bandMask = (1 << bandBits) - 1
+		self.bands = [{} for shift in self.bandShifts]
+		#pages per outcome, see getReport
+		self.counts = dict((outcome, 0) for outcome in OUTCOMES)
+		#near-duplicates whose content span was not found, which were extracted
+		self.nearRejected = 0
+		self.extractSeconds = 0.0
+		self.savedSeconds = 0.0
+
+	def __len__(self): return len(self.fingerprints)
+
+	def findRaw(self, rawHash):
+		fingerprint = self.fingerprints.get(rawHash)
+		if fingerprint != None: self.touch(fingerprint)
+		return fingerprint
+
+	def findParsed(self, parsedHash):
+		fingerprints = self.byParsedHash.get(parsedHash)
+		if not fingerprints: return None
+		fingerprint = fingerprints[-1]
+		self.touch(fingerprint)
+		return fingerprint
+
+	#the fingerprints within maxDistance bits of a SimHash, the closest first
+	def findNear(self, simhash):
+		candidates = set()
+		for band, shift in zip(self.bands, self.bandShifts):
+			candidates.update(band.get((simhash >> shift) & self.bandMask, ()))
+		near = [(getDistance(simhash, fingerprint.simhash), fingerprint.rawHash, fingerprint) for fingerprint in candidates]
+		return [fingerprint for distance, rawHash, fingerprint in sorted(near) if distance <= self.maxDistance]
+
+	def add(self, fingerprint):
+		if fingerprint.rawHash in self.fingerprints: self.remove(self.fingerprints[fingerprint.rawHash])
+		while len(self.fingerprints) >= self.maxSize: self.remove(self.fingerprints.itervalues().next())
+		self.fingerprints[fingerprint.rawHash] = fingerprint
+		self.byParsedHash.setdefault(fingerprint.parsedHash, []).append(fingerprint)
+		for band, shift in zip(self.bands, self.bandShifts):
+			band.setdefault((fingerprint.simhash >> shift) & self.bandMask, set()).add(fingerprint)
+
+	def remove(self, fingerprint):
+		del self.fingerprints[fingerprint.rawHash]
+		fingerprints = self.byParsedHash[fingerprint.parsedHash]
+		fingerprints.remove(fingerprint)
+		if not fingerprints: del self.byParsedHash[fingerprint.parsedHash]
+		for band, shift in zip(self.bands, self.bandShifts):
+			key = (fingerprint.simhash >> shift) & self.bandMask
+			band[key].discard(fingerprint)
+			if not band[key]: del band[key]
+
+	#marks a fingerprint as the most recently used
+	def touch(self, fingerprint):
+		del self.fingerprints[fingerprint.rawHash]
+		self.fingerprints[fingerprint.rawHash] = fingerprint
+
+	#counts a page; seconds is the time it took, and fingerprint the page it reused
+	def count(self, outcome, seconds, fingerprint=None):
+		self.counts[outcome] += 1
+		self.extractSeconds += seconds
+		if fingerprint != None: self.savedSeconds += max(fingerprint.seconds-seconds, 0.0)
+
+	def getReport(self):
+		numPages = sum(self.counts.values())
+		lines = ["%d pages, %d fingerprints stored" % (numPages, len(self))]
+		lines.extend("%-12s %8d" % (outcome, self.counts[outcome]) for outcome in OUTCOMES)
+		lines.append("%d near-duplicates failed verification" % self.nearRejected)
+		lines.append("%.3f s spent, %.3f s saved (%.0f%%)" % (self.extractSeconds, self.savedSeconds, 100*self.savedSeconds/max(self.extractSeconds+self.savedSeconds, 1e-9)))
+		return "\n".join(lines)
+
+#the outcomes of extractDocuments, in the order of getReport
+OUTCOMES = ("exact", "sameBlocks", "near", "extracted", "unparsable")
+
+class Fingerprint(object):
+	__slots__ = ("rawHash", "parsedHash", "simhash", "doc", "contentSpan", "seconds")
+
+	def __init__(self, rawHash, parsedHash, simhash, doc, contentSpan, seconds):
+		self.rawHash = rawHash
+		self.parsedHash = parsedHash
+		self.simhash = simhash
+		self.doc = doc
+		#the texts of the parsed blocks from the first to the last content block,
+		#which of them are content, and the blocks around them; None if the content
+		#cannot be matched to parsed blocks, e.g. when the filters changed the text
+		self.contentSpan = contentSpan
+		#the time the extraction took
+		self.seconds = seconds
+
+
+#
+#  * Extracts several documents like Extractor.getDocs, reusing the documents of
+#  * the pages of the store and adding the fingerprints of the pages extracted.
+#  * Copies of the same page within texts are extracted once; near-duplicates
+#  * are only looked up among the pages of earlier calls.
+#  *
+#  * The filters do not run on near-duplicates: their documents are the parsed
+#  * ones, with the content flags of the blocks taken over (see takeContent).
+#  * Their content is the same text, but their blocks are not merged, and carry
+#  * none of the labels the filters would have added.
+#
+def extractDocuments(extractor, texts, store, batched=False):
+	docs = [None]*len(texts)
+	#pages extracted by this call, by raw and parsed hash
+	rawHashes = {}
+	parsedHashes = {}
+	pending = []
+	copies = []
+	for i, text in enumerate(texts):
+		start = time.time()
+		rawHash = getRawHash(text)
+		fingerprint = store.findRaw(rawHash)
+		if fingerprint != None:
+			docs[i] = fingerprint.doc
+			store.count("exact", time.time()-start, fingerprint)
+			continue
+		if rawHash in rawHashes:
+			copies.append((i, "exact", rawHashes[rawHash], time.time()-start))
+			continue
+		doc = extractor.parseDoc(text)
+		if doc == None:
+			store.count("unparsable", time.time()-start)
+			continue
+		blockTexts = [tb.getText() for tb in doc.getTextBlocks()]
+		offsets = [tb.offsetBlocksStart for tb in doc.getTextBlocks()]
+		parsedHash = getParsedHash(doc)
+		fingerprint = store.findParsed(parsedHash)
+		if fingerprint != None:
+			docs[i] = fingerprint.doc
+			store.count("sameBlocks", time.time()-start, fingerprint)
+			continue
+		if parsedHash in parsedHashes:
+			copies.append((i, "sameBlocks", parsedHashes[parsedHash], time.time()-start))
+			continue
+		simhash = getSimHash(doc)
+		near = store.findNear(simhash)
+		for fingerprint in near:
+			if takeContent(doc, blockTexts, fingerprint):
+				docs[i] = doc
+				seconds = time.time()-start
+				store.count("near", seconds, fingerprint)
+				#its copies are found by hash from now on
+				store.add(Fingerprint(rawHash, parsedHash, simhash, doc, getContentSpan(doc, blockTexts, offsets), max(fingerprint.seconds, seconds)))
+				break
+		else:
+			if near: store.nearRejected += 1
+			rawHashes[rawHash] = parsedHashes[parsedHash] = len(pending)
+			pending.append((i, doc, blockTexts, offsets, rawHash, parsedHash, simhash, time.time()-start))
+	if pending:
+		pendingDocs = [doc for i, doc, texts, offsets, rawHash, parsedHash, simhash, seconds in pending]
+		start = time.time()
+		extractor.filterDocs(pendingDocs, batched)
+		#the time of the filters, shared by the documents by their number of blocks
+		filterSeconds = time.time()-start
+		numBlocks = max(sum(len(texts) for i, doc, texts, offsets, rawHash, parsedHash, simhash, seconds in pending), 1)
+		fingerprints = []
+		for i, doc, texts, offsets, rawHash, parsedHash, simhash, seconds in pending:
+			seconds += filterSeconds*len(texts)/numBlocks
+			docs[i] = doc
+			fingerprint = Fingerprint(rawHash, parsedHash, simhash, doc, getContentSpan(doc, texts, offsets), seconds)
+			store.add(fingerprint)
+			store.count("extracted", seconds)
+			fingerprints.append(fingerprint)
+		for i, outcome, j, seconds in copies:
+			docs[i] = fingerprints[j].doc
+			store.count(outcome, seconds, fingerprints[j])
+	return docs
+
+def getRawHash(text):
+	if isinstance(text, unicode): text = text.encode("utf8")
+	return hashlib.sha1(text).digest()
+
+#the hash of the title and of the features of the blocks the filters look at
+def getParsedHash(doc):
+	h = hashlib.sha1()
+	h.update(repr(doc.getTitle()))
+	for tb in doc.getTextBlocks():
+		h.update(repr((tb.getText(), tb.numWords, tb.numWordsInAnchorText, tb.numWordsInWrappedLines, tb.numWrappedLines, tb.offsetBlocksStart, tb.offsetBlocksEnd, tb.tagLevel, sorted(tb.labels))))
+	return h.digest()
+
+#
+#  * The weighted votes of the blocks for each bit are summed in one long integer
+#  * holding a counter per bit, LANE_BITS wide: SPREAD[b] is the byte b with its
+#  * bits moved to the lowest bits of 8 counters.
+#
+LANE_BITS = 32
+SPREAD = [sum(((b >> i) & 1) << (i*LANE_BITS) for i in range(8)) for b in range(256)]
+
+def getSimHash(doc):
+	counters = 0
+	total = 0
+	for tb in doc.getTextBlocks():
+		text = tb.getText()
+		if not text: continue
+		if isinstance(text, unicode): text = text.encode("utf8")
+		digest = hashlib.md5(text).digest()
+		spread = 0
+		for i in range(SIMHASH_BITS//8): spread |= SPREAD[ord(digest[i])] << (i*8*LANE_BITS)
+		weight = max(tb.numWords, 1)
+		counters += weight*spread
+		total += weight
+	mask = (1 << LANE_BITS) - 1
+	simhash = 0
+	for bit in range(SIMHASH_BITS):
+		if 2*((counters >> (bit*LANE_BITS)) & mask) > total: simhash |= 1 << bit
+	return simhash
+
+def getDistance(a, b): return bin(a ^ b).count("1")
+
+#
+#  * Returns (before, texts, isContent, after) for the parsed blocks from the
+#  * first to the last content block, with the texts of the blocks around them
+#  * (None at the start and end of the document), given the texts and offsets of
+#  * the blocks before filtering; or None if the content is not the text of
+#  * parsed blocks, see document.getContentPositions.
+#
+def getContentSpan(doc, texts, offsets):
+	positions = document.getContentPositions(doc.getTextBlocks(), texts, offsets)
+	if not positions: return None
+	first, last = positions[0], positions[-1]
+	isContent = [False]*(last-first+1)
+	for pos in positions: isContent[pos-first] = True
+	before = texts[first-1] if first > 0 else None
+	after = texts[last+1] if last+1 < len(texts) else None
+	return (before, tuple(texts[first:last+1]), tuple(isContent), after)
+
+#
+#  * Marks the blocks of a parsed document like those of the content span of a
+#  * near-duplicate, if the span is found in the document between the same
+#  * blocks, so that content added around it is not missed. Returns whether it was.
+#
+def takeContent(doc, texts, fingerprint):
+	if fingerprint.contentSpan == None: return False
+	before, spanTexts, isContent, after = fingerprint.contentSpan
+	spanTexts = list(spanTexts)
+	n = len(spanTexts)
+	pos = -1
+	while True:
+		try:
+			pos = texts.index(spanTexts[0], pos+1)
+		except ValueError:
+			return False
+		if texts[pos:pos+n] != spanTexts: continue
+		if (texts[pos-1] if pos > 0 else None) == before and (texts[pos+n] if pos+n < len(texts) else None) == after: break
+	textBlocks = doc.getTextBlocks()
+	for tb in textBlocks: tb.setIsContent(False)
+	for tb, flag in zip(textBlocks[pos:pos+n], isContent): tb.setIsContent(flag)
+	return True
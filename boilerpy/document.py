@@ -17,7 +17,9 @@
 #  * limitations under the License.
 #  
 # package: de.l3s.boilerpipe.document
-import copy,sys
+import bisect,copy,sys
+from array import array
+from collections import defaultdict
 
 # 
 #  * Some pre-defined labels which can be used in conjunction with
@@ -51,6 +53,12 @@ class TextDocument(object):
 	def __init__(self, textBlocks, title=None):
 		self.title = title
 		self.textBlocks = textBlocks
+		#how the document was parsed, set by the Extractor -- see extractors.PARSE_PATHS
+		self.parsePath = None
+		self.labelIndex = None
+		#the TextDocumentStatistics of the blocks as parsed, collected by the parser
+		#while flushing them; None once a filter changed the blocks
+		self.parseStatistics = None
 
 	#	  * Returns the {@link TextBlock}s of this document.
 	#	  * 
@@ -60,7 +68,33 @@ class TextDocument(object):
 		""" generated source for method getTextBlocks """
 		return self.textBlocks
 
-	def setTextBlocks(self,textBlocks): self.textBlocks=textBlocks
+	def setTextBlocks(self,textBlocks):
+		self.textBlocks=textBlocks
+		self.parseStatistics = None
+		if self.labelIndex != None: self.labelIndex.update(textBlocks)
+
+	# 
+	#	  * Keeps a {@link LabelIndex} of the blocks from now on, so that
+	#	  * {@link #getBlocksWithLabels} does not need to scan all blocks. Filters
+	#	  * changing the list of blocks must go through {@link #setTextBlocks}.
+	#	  * 
+	#	  * @return The index.
+	def enableLabelIndex(self):
+		if self.labelIndex == None: self.labelIndex = LabelIndex(self.textBlocks)
+		return self.labelIndex
+
+	# 
+	#	  * Returns the blocks having any of the given labels, in document order.
+	def getBlocksWithLabels(self, *labels):
+		if self.labelIndex != None:
+			return [self.textBlocks[pos] for pos in self.labelIndex.getPositions(*labels)]
+		return [tb for tb in self.textBlocks if not tb.labels.isdisjoint(labels)]
+
+	# 
+	#	  * Returns the (ascending) positions of the blocks having any of the given labels.
+	def getLabelPositions(self, *labels):
+		if self.labelIndex != None: return self.labelIndex.getPositions(*labels)
+		return [pos for pos, tb in enumerate(self.textBlocks) if not tb.labels.isdisjoint(labels)]
 
 	# 
 	#	  * Returns the "main" title for this document, or <code>null</code> if no
@@ -105,6 +139,14 @@ class TextDocument(object):
 			sb+=block.getText()+'\n'
 		return sb
 
+	# 
+	#	  * Releases the text of the blocks which are not content, and their labels
+	#	  * too if labels is True. See the lean mode of filters.FilterChain.
+	#	  
+	def releaseNonContent(self, labels=False):
+		for tb in self.textBlocks:
+			if not tb.isContent(): tb.release(labels)
+
 	#	  * Returns detailed debugging information about the contained {@link TextBlock}s.
 	#	  * @return Debug information.
 	def debugString(self):
@@ -117,6 +159,48 @@ class TextDocument(object):
 
 
 
+# 
+#  * An inverted index from labels to the {@link TextBlock}s of a {@link TextDocument}
+#  * carrying them. The blocks report label changes (including those caused by
+#  * merging) and the document reports a new list of blocks.
+#  
+class LabelIndex(object):
+	def __init__(self, textBlocks):
+		self.blocksByLabel = defaultdict(set)
+		self.positions = {}
+		self.update(textBlocks)
+
+	# 
+	#	  * Takes over a new list of blocks, indexing added blocks and dropping the
+	#	  * removed ones.
+	#	  
+	def update(self, textBlocks):
+		positions = {}
+		for pos, tb in enumerate(textBlocks): positions[tb] = pos
+		for tb in self.positions:
+			if tb not in positions:
+				for label in tb.labels: self.remove(tb, label)
+				tb.labelIndex = None
+		blocksByLabel = self.blocksByLabel
+		for tb in positions:
+			if tb not in self.positions:
+				tb.labelIndex = self
+				for label in tb.labels: blocksByLabel[label].add(tb)
+		self.positions = positions
+
+	def add(self, tb, label):
+		self.blocksByLabel[label].add(tb)
+
+	def remove(self, tb, label):
+		blocks = self.blocksByLabel.get(label)
+		if blocks != None: blocks.discard(tb)
+
+	def getPositions(self, *labels):
+		if len(labels) == 1: blocks = self.blocksByLabel.get(labels[0], ())
+		else: blocks = set().union(*[self.blocksByLabel.get(label, ()) for label in labels])
+		return sorted(self.positions[tb] for tb in blocks)
+
+
 # 
 #  * Describes a block of text.
 #  * 
@@ -134,8 +218,12 @@ class TextBlock(object):
 		self.labels = set()
 		self.numFullTextWords = 0
 		self.tagLevel = 0
+		#set while the block is part of a document with a LabelIndex
+		self.labelIndex = None
 		
 		self.text = text
+		#segments of merged text, joined lazily by getText()
+		self.textSegments = None
 		self.containedTextElements = containedTextElements
 		self.numWords = numWords
 		self.numWordsInAnchorText = numWordsInAnchorText
@@ -167,8 +255,15 @@ class TextBlock(object):
 
 	def getText(self):
 		""" generated source for method getText """
+		if self.textSegments != None:
+			self.text = '\n'.join(self.textSegments)
+			self.textSegments = None
 		return self.text
 
+	def setText(self, text):
+		self.text = text
+		self.textSegments = None
+
 	def getNumWords(self):
 		""" generated source for method getNumWords """
 		return self.numWords
@@ -185,21 +280,49 @@ class TextBlock(object):
 		""" generated source for method getLinkDensity """
 		return self.linkDensity
 
+	# 
+	#	  * Merges the given {@link TextBlock} into this one. The text is not copied
+	#	  * until {@link #getText()} is called, so merging long runs of blocks stays
+	#	  * linear in the length of the text.
+	#	  
 	def mergeNext(self, nextTextBlock):
 		""" generated source for method mergeNext """
-		if self.text==None: self.text=""
-		self.text+='\n'+nextTextBlock.text
+		self.appendTextOf(nextTextBlock)
+		self.addCountsOf(nextTextBlock)
+		self.initDensities()
+
+	# 
+	#	  * Merges a run of subsequent {@link TextBlock}s into this one, updating
+	#	  * word counts and densities only once for the whole run.
+	#	  * 
+	#	  * @param blocks The blocks to merge, in document order.
+	#	  
+	def mergeRange(self, blocks):
+		if len(blocks)==0: return
+		for tb in blocks:
+			self.appendTextOf(tb)
+			self.addCountsOf(tb)
+		self.initDensities()
+
+	def appendTextOf(self, nextTextBlock):
+		if self.textSegments == None:
+			self.textSegments = ["" if self.text==None else self.text]
+		if nextTextBlock.textSegments != None: self.textSegments.extend(nextTextBlock.textSegments)
+		else: self.textSegments.append(nextTextBlock.text)
+
+	def addCountsOf(self, nextTextBlock):
 		self.numWords += nextTextBlock.numWords
 		self.numWordsInAnchorText += nextTextBlock.numWordsInAnchorText
 		self.numWordsInWrappedLines += nextTextBlock.numWordsInWrappedLines
 		self.numWrappedLines += nextTextBlock.numWrappedLines
 		self.offsetBlocksStart = min(self.offsetBlocksStart, nextTextBlock.offsetBlocksStart)
 		self.offsetBlocksEnd = max(self.offsetBlocksEnd, nextTextBlock.offsetBlocksEnd)
-		self.initDensities()
 		self._isContent |= nextTextBlock.isContent()
 		self.containedTextElements|=nextTextBlock.containedTextElements
 		self.numFullTextWords += nextTextBlock.numFullTextWords
 		self.labels|=nextTextBlock.labels
+		if self.labelIndex != None:
+			for label in nextTextBlock.labels: self.labelIndex.add(self, label)
 		self.tagLevel = min(self.tagLevel, nextTextBlock.tagLevel)
 
 	def getOffsetBlocksStart(self):
@@ -222,6 +345,7 @@ class TextBlock(object):
 	def addLabel(self, label):
 		""" generated source for method addLabel """
 		self.labels.add(label)
+		if self.labelIndex != None: self.labelIndex.add(self, label)
 
 	# 
 	#	  * Checks whether this TextBlock has the given label.
@@ -237,6 +361,7 @@ class TextBlock(object):
 		""" generated source for method removeLabel """
 		try:
 			self.labels.remove(label)
+			if self.labelIndex != None: self.labelIndex.remove(self, label)
 			return True
 		except KeyError:
 			return False
@@ -264,8 +389,10 @@ class TextBlock(object):
 		""" generated source for method addLabels """
 		if len(labels)==0 or labels[0] == None: return
 		if self.labels == None:	self.labels = set()
-		elif len(labels)==1 and (type(labels[0])==set or type(labels[0])==list): self.labels|=set(labels[0])
-		else: self.labels|=set(labels)
+		elif len(labels)==1 and isinstance(labels[0], (set, frozenset, list, tuple)): labels=labels[0]
+		self.labels.update(labels)
+		if self.labelIndex != None:
+			for label in labels: self.labelIndex.add(self, label)
 
 
 	# 
@@ -276,13 +403,24 @@ class TextBlock(object):
 		""" generated source for method getContainedTextElements """
 		return self.containedTextElements
 
+	#drops the text of the block, keeping its counts, and its labels if labels is True
+	def release(self, labels=False):
+		self.text = ""
+		self.textSegments = None
+		self.containedTextElements = None
+		if labels and self.labels:
+			for label in list(self.labels): self.removeLabel(label)
+
 	def clone(self):
 		try:
 			clone = copy.copy(self)
 		except copy.error:
 			raise copy.error
 		if self.labels != None:	clone.labels = self.labels.copy()
+		#the clone is not part of the document
+		clone.labelIndex = None
 		if self.containedTextElements != None: clone.containedTextElements = self.containedTextElements.copy()
+		if self.textSegments != None: clone.textSegments = list(self.textSegments)
 		return clone
 
 	def getTagLevel(self):
@@ -296,6 +434,90 @@ class TextBlock(object):
 TextBlock.EMPTY_START = TextBlock("", set(), 0, 0, 0, 0, -1)
 TextBlock.EMPTY_END = TextBlock("", set(), 0, 0, 0, 0, sys.maxint)
 
+# 
+#  * What remains of a {@link TextDocument} once it has been processed: its title
+#  * and the text of its content blocks. See Extractor.getLeanDoc.
+#  
+class LeanDocument(object):
+	__slots__ = ("title", "contentTexts", "parsePath")
+
+	def __init__(self, doc):
+		self.title = doc.getTitle()
+		self.contentTexts = [tb.getText() for tb in doc.getTextBlocks() if tb.isContent()]
+		self.parsePath = doc.parsePath
+
+	def getTitle(self): return self.title
+
+	#the same text as TextDocument.getContent
+	def getContent(self): return "".join(text+'\n' for text in self.contentTexts)
+
+# 
+#  * Sets the content flags of several blocks at once, like setIsContent() does for
+#  * one block. Returns whether any flag was changed.
+#  
+def setContentFlags(textBlocks, flags):
+	changed = False
+	for tb, isContent in zip(textBlocks, flags):
+		if tb._isContent != isContent:
+			tb._isContent = isContent
+			changed = True
+	return changed
+
+# 
+#  * Returns the positions of the parsed blocks which make up the content blocks
+#  * of a filtered document, given the texts and offsets of the parsed blocks; or
+#  * None if some content is not the text of parsed blocks (e.g. split by a
+#  * filter). A content block merged by the filters is matched to the parsed
+#  * blocks within its offsets, skipping those removed before merging.
+#  
+def getContentPositions(textBlocks, texts, offsets):
+	positions = []
+	for tb in textBlocks:
+		if not tb.isContent(): continue
+		text = tb.getText()
+		cursor = 0
+		for pos in range(bisect.bisect_left(offsets, tb.offsetBlocksStart), bisect.bisect_right(offsets, tb.offsetBlocksEnd)):
+			piece = texts[pos]
+			end = cursor+len(piece)
+			if text.startswith(piece, cursor) and (end == len(text) or text[end] == "\n"):
+				positions.append(pos)
+				cursor = end+1
+		if cursor != len(text)+1: return None
+	return positions
+
+#the TextBlock fields packed by packDocument, one int each, in this order
+PACKED_FIELDS = ("numWords", "numWordsInAnchorText", "numWordsInWrappedLines", "numWrappedLines", "offsetBlocksStart", "offsetBlocksEnd", "tagLevel", "numFullTextWords", "_isContent")
+
+#
+#  * Packs a parsed {@link TextDocument} into plain values which pickle compactly,
+#  * to ship it to another process: (title, parsePath, texts, fields, labels)
+#  * with the texts of the blocks, their PACKED_FIELDS in one array, and
+#  * (block, labels) pairs for the blocks having labels. The contained text
+#  * elements of the blocks are not kept.
+#
+def packDocument(doc):
+	textBlocks = doc.getTextBlocks()
+	fields = array('i')
+	for tb in textBlocks: fields.extend([getattr(tb, name) for name in PACKED_FIELDS])
+	labels = [(i, tuple(tb.labels)) for i, tb in enumerate(textBlocks) if tb.labels]
+	return (doc.title, doc.parsePath, [tb.getText() for tb in textBlocks], fields, labels)
+
+#the document of packDocument
+def unpackDocument(packed):
+	title, parsePath, texts, fields, labels = packed
+	numFields = len(PACKED_FIELDS)
+	textBlocks = []
+	for i, text in enumerate(texts):
+		tb = TextBlock(text, frozenset())
+		for name, value in zip(PACKED_FIELDS, fields[i*numFields:(i+1)*numFields]): setattr(tb, name, value)
+		tb._isContent = bool(tb._isContent)
+		tb.initDensities()
+		textBlocks.append(tb)
+	for i, blockLabels in labels: textBlocks[i].labels = set(blockLabels)
+	doc = TextDocument(textBlocks, title)
+	doc.parsePath = parsePath
+	return doc
+
 
 
 #  * Provides shallow statistics on a given TextDocument
@@ -308,14 +530,25 @@ class TextDocumentStatistics(object):
 	#	  *
 	#	  * @param doc The {@link TextDocument}.
 	#	  * @param contentOnly if true then o
+	#	  *
+	#	  * Without a document, the statistics start empty and are collected
+	#	  * with {@link #addBlock}.
 	#	  
-	def __init__(self, doc, contentOnly):
+	def __init__(self, doc=None, contentOnly=False):
 		self.numWords=0
 		self.numBlocks=0
+		self.numWordsInAnchorText=0
+		self.maxBlockWords=0
+		if doc == None: return
 		for tb in doc.getTextBlocks():
 			if contentOnly and not tb.isContent(): continue 
-			self.numWords += tb.getNumWords()
-			self.numBlocks += 1
+			self.addBlock(tb)
+
+	def addBlock(self, tb):
+		self.numWords += tb.getNumWords()
+		self.numBlocks += 1
+		self.numWordsInAnchorText += tb.numWordsInAnchorText
+		if tb.numWords > self.maxBlockWords: self.maxBlockWords = tb.numWords
 
 
 	#	  * Returns the average number of words at block-level (= overall number of words divided by
@@ -335,3 +568,11 @@ class TextDocumentStatistics(object):
 	def getNumWords(self):
 		""" generated source for method getNumWords """
 		return self.numWords
+
+	#the share of words in links, over all blocks
+	def getLinkDensity(self):
+		return self.numWordsInAnchorText / float(self.numWords) if self.numWords else 0.0
+
+	#the share of words in the block with the most words
+	def getLargestBlockShare(self):
+		return self.maxBlockWords / float(self.numWords) if self.numWords else 0.0
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+#
+#  * boilerpipe
+#  *
+#  * Copyright (c) 2009 Christian Kohlschtter
+#  *
+#  * The author licenses this file to You under the Apache License, Version 2.0
+#  * (the "License"); you may not use this file except in compliance with
+#  * the License.  You may obtain a copy of the License at
+#  *
+#  *	 http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#
+
+#
+#  * Exports the features of the {@link TextBlock}s of many documents, one row per
+#  * block, for training classifiers. Documents are parsed by worker processes,
+#  * which send back whole columns as array bytes; rows are appended to in-memory
+#  * arrays ({@link FeatureArrays}) or to one file per column ({@link FeatureFiles}).
+#  *
+#  * The columns are, in order:
+#  *	docId, position - the index of the document in the input, and of the block in the document
+#  *	the features, e.g. numWords, for the block itself
+#  *	the features of the blocks around it, named like in rules.py: prev.numWords, next2.numWords...
+#  *	  Blocks outside the document look like {@link TextBlock#EMPTY_START}.
+#  *	label:<label> - 1 if the block has the label, for each of the requested labels
+#  *	isContent - the decision of the filter, if any
+#
+
+import os
+import re
+from array import array
+from multiprocessing import Pool
+from . import batch
+from . import document
+from . import parser
+from .rules import FEATURE_TYPECODES
+
+DEFAULT_FEATURES = ("numWords", "numWordsInAnchorText", "textDensity", "linkDensity", "tagLevel")
+
+class FeatureExporter(object):
+	#filtr - optional filter (chain) whose decisions are exported as the isContent column
+	#features - names of block features, see rules.FEATURE_TYPECODES
+	#window - how many blocks before and after each block to export the features of
+	#labels - labels to export as 0/1 columns
+	#tagActions - optional tag action map of the parser, e.g. parser.MarkupTagActionMap() for markup labels
+	#ignoreSelectors - see parser.IgnoreSelectors
+	def __init__(self, filtr=None, features=DEFAULT_FEATURES, window=1, labels=(), tagActions=None, ignoreSelectors=None):
+		for feature in features:
+			if feature not in FEATURE_TYPECODES: raise ValueError("unknown block feature: %r" % feature)
+		self.filter = filtr
+		self.features = tuple(features)
+		self.window = window
+		self.labels = tuple(labels)
+		self.tagActions = tagActions
+		if ignoreSelectors != None: ignoreSelectors = parser.IgnoreSelectors(ignoreSelectors)
+		self.ignoreSelectors = ignoreSelectors
+		self.offsets = [0] + [offset for distance in range(1, window+1) for offset in (-distance, distance)]
+		self.columns = [("docId", 'i'), ("position", 'i')]
+		for offset in self.offsets:
+			for feature in self.features:
+				self.columns.append((getColumnName(feature, offset), FEATURE_TYPECODES[feature]))
+		for label in self.labels: self.columns.append(("label:" + label, 'b'))
+		if filtr != None: self.columns.append(("isContent", 'b'))
+
+	def getColumnNames(self): return [name for name, typecode in self.columns]
+
+	def parseDoc(self, text):
+		bpParser = parser.BoilerpipeHTMLParser(self.tagActions, self.ignoreSelectors)
+		try:
+			bpParser.feed(text)
+		except Exception:
+			return None
+		doc = bpParser.toTextDocument()
+		if self.filter != None: self.filter.process(doc)
+		return doc
+
+	#
+	# 	 * Returns the columns of one document, as a list of arrays in the order of
+	# 	 * self.columns. A document which cannot be parsed has no rows.
+	#
+	def getDocColumns(self, docId, text):
+		return self.getColumnsOf(docId, self.parseDoc(text))
+
+	def getColumnsOf(self, docId, doc):
+		blocks = doc.getTextBlocks() if doc != None else []
+		n = len(blocks)
+		columns = [array('i', [docId])*n, array('i', range(n))]
+		rows = batch.BlockBatch([document.TextDocument(blocks)], max(self.window, 1))
+		k = rows.padding
+		for offset in self.offsets:
+			for feature in self.features:
+				columns.append(rows.getColumn(feature)[k+offset:k+offset+n])
+		for label in self.labels:
+			columns.append(array('b', [label in tb.labels for tb in blocks]))
+		if self.filter != None:
+			columns.append(array('b', [tb.isContent() for tb in blocks]))
+		return columns
+
+	#
+	# 	 * Exports the blocks of texts to sink (see {@link FeatureArrays}). With
+	# 	 * processes > 1, documents are parsed by a pool of worker processes;
+	# 	 * chunksize documents are sent to a worker at a time. Returns the sink.
+	#
+	def export(self, texts, sink, processes=1, chunksize=16):
+		if processes <= 1:
+			for docId, text in enumerate(texts):
+				sink.append(self.getDocColumns(docId, text))
+			return sink
+		pool = Pool(processes, initWorker, (self,))
+		try:
+			for data in pool.imap(exportInWorker, enumerate(texts), chunksize):
+				sink.append([array(typecode, s) for (name, typecode), s in zip(self.columns, data)])
+		except:
+			pool.terminate()
+			raise
+		pool.close()
+		pool.join()
+		return sink
+
+#the name of the column of a feature of the block at an offset, e.g. prev.numWords
+def getColumnName(feature, offset):
+	if offset == 0: return feature
+	if offset == -1: return "prev." + feature
+	if offset == 1: return "next." + feature
+	if offset < 0: return "prev%d.%s" % (-offset, feature)
+	return "next%d.%s" % (offset, feature)
+
+#the exporter of a worker process, set when the pool starts
+workerExporter = None
+
+def initWorker(exporter):
+	global workerExporter
+	workerExporter = exporter
+
+def exportInWorker(item):
+	docId, text = item
+	return [column.tostring() for column in workerExporter.getDocColumns(docId, text)]
+
+
+#
+#  * Keeps exported columns in memory, one array per column (see columns).
+#
+class FeatureArrays(object):
+	def __init__(self, exporter):
+		self.names = exporter.getColumnNames()
+		self.columns = [array(typecode) for name, typecode in exporter.columns]
+
+	def append(self, columns):
+		for column, values in zip(self.columns, columns): column.extend(values)
+
+	def getColumn(self, name): return self.columns[self.names.index(name)]
+
+	def __len__(self): return len(self.columns[0])
+
+#
+#  * Appends exported columns to one file per column in a directory, each holding
+#  * the raw items of an array in machine byte order (e.g. 02-numWords.i for an int
+#  * column), readable with {@link readFeatureFiles} or numpy.fromfile. A columns.txt
+#  * file lists the columns and their typecodes.
+#
+class FeatureFiles(object):
+	def __init__(self, exporter, directory):
+		if not os.path.isdir(directory): os.makedirs(directory)
+		self.directory = directory
+		f = open(os.path.join(directory, "columns.txt"), "w")
+		for name, typecode in exporter.columns: f.write("%s\t%s\n" % (name, typecode))
+		f.close()
+		self.files = [open(os.path.join(directory, getFileName(i, name, typecode)), "ab") for i, (name, typecode) in enumerate(exporter.columns)]
+
+	def append(self, columns):
+		for f, column in zip(self.files, columns): column.tofile(f)
+
+	def close(self):
+		for f in self.files: f.close()
+
+#labels may contain any character, so files are numbered, e.g. 02-numWords.i
+def getFileName(index, name, typecode):
+	return "%02d-%s.%s" % (index, re.sub(r'[^\w.-]', '_', name), typecode)
+
+#
+#  * Reads the columns written by {@link FeatureFiles}, as a list of
+#  * (name, array) tuples.
+#
+def readFeatureFiles(directory):
+	f = open(os.path.join(directory, "columns.txt"))
+	columnDefs = [line.rstrip("\n").split("\t") for line in f if line.strip()]
+	f.close()
+	columns = []
+	for i, (name, typecode) in enumerate(columnDefs):
+		column = array(typecode)
+		path = os.path.join(directory, getFileName(i, name, typecode))
+		f = open(path, "rb")
+		column.fromfile(f, os.path.getsize(path) / column.itemsize)
+		f.close()
+		columns.append((name, column))
+	return columns
@@ -26,19 +26,48 @@
 #
 
 
-from xml.sax import parseString, SAXException
-import HTMLParser
 from . import filters
 from . import parser
-import urllib2
+from . import document
+from . import lazy
 import re
 
+#the ways a document can be parsed, as recorded in TextDocument.parsePath:
+#with expat, with HTMLParser, or with HTMLParser after expat failed on a well-formedness error
+PARSE_PATH_XML="xml"
+PARSE_PATH_HTML="html"
+PARSE_PATH_XML_FALLBACK="xml-fallback"
+PARSE_PATHS=(PARSE_PATH_XML,PARSE_PATH_HTML,PARSE_PATH_XML_FALLBACK)
+
 class Extractor(object):
-	def __init__(self,filtr):
+	#ignoreSelectors - optional tag names, classes and ids (e.g. "nav", ".cookie-banner", "#comments")
+	#of elements to skip at parse time, see parser.IgnoreSelectors
+	#backend - optional parser.ParserBackend, e.g. parser.FastHTMLTokenizer(); by default the
+	#standard library's HTMLParser is used
+	#xmlMode - None to parse every document as HTML, "auto" to parse documents which look like XML
+	#(see parser.looksLikeXML) with expat, or "always" to try expat first for every document.
+	#Documents which are not well-formed fall back to the HTML parser.
+	#useLabelIndex - keep a label index on each document (see TextDocument.enableLabelIndex),
+	#which speeds up label-driven filters on documents with many labels
+	#poolParsers - reuse the HTML parsers of this extractor (see parser.ParserPool) instead of
+	#creating one per document
+	#templateIndex - optional templates.TemplateIndex, which drops the template blocks of the
+	#documents given with a host before filtering
+	def __init__(self,filtr,ignoreSelectors=None,backend=None,xmlMode=None,useLabelIndex=False,poolParsers=True,templateIndex=None):
 		self.filter=filtr	
+		if ignoreSelectors!=None: ignoreSelectors=parser.IgnoreSelectors(ignoreSelectors)
+		self.ignoreSelectors=ignoreSelectors
+		self.backend=backend
+		if xmlMode not in (None,"auto","always"): raise ValueError("unknown xmlMode: %r" % xmlMode)
+		self.xmlMode=xmlMode
+		self.useLabelIndex=useLabelIndex
+		#number of documents parsed per path
+		self.parsePathCounts=dict((path,0) for path in PARSE_PATHS)
+		self.parserPool=parser.ParserPool(self.newParser) if poolParsers else None
+		self.templateIndex=templateIndex
 	
-	def getContent(self, text):
-		return self.getDoc(text).getContent()
+	def getContent(self, text, host=None):
+		return self.getDoc(text,host).getContent()
 	
 	def getContentFromUrl(self, url):
 		return self.getDocFromUrl(url).getContent()
@@ -50,13 +79,86 @@ class Extractor(object):
 		return self.getDoc(self.readFromFile(filename))
 	
 	def getDocFromUrl(self,url):
-		return self.getDoc(self.readFromUrl(filename))
-
-	def getDoc(self,text):
+		host=None
+		if self.templateIndex!=None:
+			from .templates import getHost
+			host=getHost(url)
+		return self.getDoc(self.readFromUrl(url),host)
+
+	#host - the host of the page (e.g. www.example.com), for the templateIndex
+	def getDoc(self,text,host=None):
 		doc=self.parseDoc(text)
+		if host!=None and self.templateIndex!=None: self.templateIndex.process(doc,host)
+		if self.useLabelIndex: doc.enableLabelIndex()
 		self.filter.process(doc)
 		return doc
 
+	# 
+	# 	 * Extracts the content of a document with less memory than getDoc: the text
+	# 	 * of blocks is released as soon as the filters are done with it (see the lean
+	# 	 * mode of filters.FilterChain), and only a document.LeanDocument is kept.
+	# 	 * Returns None if the document cannot be parsed.
+	# 	 
+	def getLeanDoc(self,text):
+		doc=self.parseDoc(text,False)
+		if doc==None: return None
+		if self.useLabelIndex: doc.enableLabelIndex()
+		filtr=self.filter
+		if not isinstance(filtr,filters.FilterChain): filtr=filters.FilterChain([filtr])
+		filtr.process(doc,True)
+		return document.LeanDocument(doc)
+
+	# 
+	# 	 * Extracts several documents. Documents which cannot be parsed are returned
+	# 	 * as None. Given a dedup.FingerprintStore, the documents of pages seen
+	# 	 * before are reused, see dedup.extractDocuments. With batched=True, the
+	# 	 * rule classifiers run on all documents at once (see batch.processDocuments);
+	# 	 * since the classifiers are compiled, packing the batch costs more than it
+	# 	 * saves (see benchBatch), so documents are filtered one by one by default.
+	# 	 
+	def getDocs(self,texts,fingerprints=None,batched=False):
+		if fingerprints!=None:
+			from .dedup import extractDocuments
+			return extractDocuments(self,texts,fingerprints,batched)
+		docs=[self.parseDoc(text) for text in texts]
+		self.filterDocs([doc for doc in docs if doc!=None],batched)
+		return docs
+
+	def filterDocs(self,docs,batched=False):
+		if self.useLabelIndex:
+			for doc in docs: doc.enableLabelIndex()
+		if batched:
+			from .batch import processDocuments
+			processDocuments(self.filter,docs)
+		else:
+			for doc in docs: self.filter.process(doc)
+
+	# 
+	# 	 * Extracts a recrawled page, reusing the extraction of its previous crawl
+	# 	 * for the blocks which did not change; see incremental.extractIncremental.
+	# 	 * Returns (doc, record), the record being for the next crawl.
+	# 	 
+	def getUpdatedDoc(self,text,record=None):
+		from .incremental import extractIncremental
+		return extractIncremental(self,text,record)
+
+	# 
+	# 	 * Extracts a document given as an iterable of string chunks (or a string),
+	# 	 * yielding the text of content blocks as soon as the filter is done with them.
+	# 	 * Only filters which need a bounded window of blocks can do that; other filter
+	# 	 * chains are refused with a ValueError.
+	# 	 
+	def getContentStream(self,chunks):
+		return (tb.getText() for tb in self.getBlockStream(chunks) if tb.isContent())
+
+	def getBlockStream(self,chunks):
+		if not self.filter.isStreamable():
+			names=", ".join(f.__class__.__name__ for f in filters.getUnstreamableFilters(self.filter))
+			raise ValueError("the filter chain cannot be streamed, these filters need the whole document: "+names)
+		if isinstance(chunks,basestring): chunks=[chunks]
+		bpParser=parser.BoilerpipeHTMLParser(ignoreSelectors=self.ignoreSelectors)
+		return self.filter.processStream(bpParser.parseStream(chunks))
+
 	def readFromFile(self,filename):
 		f=open(filename,'r')
 		text=f.read()
@@ -66,8 +168,12 @@ class Extractor(object):
 		except UnicodeDecodeError: pass
 		return text
 	
-	def readFromUrl(self,url):
-		f=urllib2.urlopen(url)
+	#timeout - optional timeout in seconds of the connection
+	def readFromUrl(self,url,timeout=None):
+		#imported here, as urllib2 takes longer to import than the rest of boilerpy
+		import urllib2
+		if timeout!=None: f=urllib2.urlopen(url,timeout=timeout)
+		else: f=urllib2.urlopen(url)
 		text=f.read()
 		encoding=self.getUrlEncoding(f)
 		f.close()
@@ -81,20 +187,62 @@ class Extractor(object):
 			return f.headers['content-type'].split('charset=')[1].split(';')[0]
 		except: return 'utf8'
 	
-	def parseDoc(self,inputStr):
-		bpParser=parser.BoilerpipeHTMLParser()
+	def newParser(self):
+		if self.backend!=None: return parser.BoilerpipeParser(self.backend,ignoreSelectors=self.ignoreSelectors)
+		return parser.BoilerpipeHTMLParser(ignoreSelectors=self.ignoreSelectors)
+
+	def createParser(self,keepTextElements=True):
+		bpParser=self.parserPool.acquire() if self.parserPool!=None else self.newParser()
+		bpParser.keepTextElements=keepTextElements
+		return bpParser
+
+	#gives back a parser of createParser once its document is built
+	def releaseParser(self,bpParser):
+		if self.parserPool!=None: self.parserPool.release(bpParser)
+
+	#keepTextElements - whether blocks record their text elements, see TextBlock.getContainedTextElements
+	def parseDoc(self,inputStr,keepTextElements=True):
+		path=PARSE_PATH_HTML
+		if self.xmlMode=="always" or (self.xmlMode=="auto" and parser.looksLikeXML(inputStr)):
+			doc=self.parseXMLDoc(inputStr,keepTextElements)
+			if doc!=None: return self.setParsePath(doc,PARSE_PATH_XML)
+			path=PARSE_PATH_XML_FALLBACK
+		doc=self.parseHTMLDoc(inputStr,keepTextElements)
+		if doc!=None: self.setParsePath(doc,path)
+		return doc
+
+	#returns None if the document is not well-formed
+	def parseXMLDoc(self,inputStr,keepTextElements=True):
+		from xml.sax import SAXException
+		handler=parser.BoilerpipeSAXContentHandler(ignoreSelectors=self.ignoreSelectors)
+		handler.keepTextElements=keepTextElements
+		try:
+			handler.feed(inputStr)
+		except SAXException:
+			return None
+		return handler.toTextDocument()
+
+	def parseHTMLDoc(self,inputStr,keepTextElements=True):
+		bpParser=self.createParser(keepTextElements)
 		try:
-			bpParser.feed(inputStr)
-		except:
-			#in case of error, try again, first removing script tag content
-			bpParser=parser.BoilerpipeHTMLParser()
-			inputStr=re.sub(r'<(?:script|SCRIPT)[^>]*>.*?</(?:script|SCRIPT)>','<script></script>',inputStr,0,re.DOTALL)
 			try:
 				bpParser.feed(inputStr)
 			except:
-				print "Error parsing HTML : "+str(e)
-				return None
-		doc=bpParser.toTextDocument()
+				#in case of error, try again, first removing script tag content
+				bpParser.recycle()
+				inputStr=re.sub(r'<(?:script|SCRIPT)[^>]*>.*?</(?:script|SCRIPT)>','<script></script>',inputStr,0,re.DOTALL)
+				try:
+					bpParser.feed(inputStr)
+				except Exception as e:
+					print "Error parsing HTML : "+str(e)
+					return None
+			return bpParser.toTextDocument()
+		finally:
+			self.releaseParser(bpParser)
+
+	def setParsePath(self,doc,path):
+		doc.parsePath=path
+		self.parsePathCounts[path]+=1
 		return doc
 
 
@@ -102,31 +250,33 @@ class Extractor(object):
 # class ArticleExtractor
 #  * A full-text extractor which is tuned towards news articles. In this scenario
 #  * it achieves higher accuracy than {@link DefaultExtractor}.
-articleFilterChain=filters.FilterChain([
-	filters.TerminatingBlocksFinder(),
-	filters.DocumentTitleMatchClassifier(None,True),
-	filters.NumWordsRulesClassifier(),
-	filters.IgnoreBlocksAfterContentFilter(),
-	filters.BlockProximityFusion(1,False,False),
-	filters.BoilerplateBlockFilter(),
-	filters.BlockProximityFusion(1,True,False),
-	filters.KeepLargestBlockFilter(),
-	filters.ExpandTitleToContentFilter()
-])
+def createArticleFilterChain(module):
+	return filters.FilterChain([
+		filters.TerminatingBlocksFinder(),
+		filters.DocumentTitleMatchClassifier(None,True),
+		filters.NumWordsRulesClassifier(),
+		filters.IgnoreBlocksAfterContentFilter(),
+		filters.BlockProximityFusion(1,False,False),
+		filters.BoilerplateBlockFilter(),
+		filters.BlockProximityFusion(1,True,False),
+		filters.KeepLargestBlockFilter(),
+		filters.ExpandTitleToContentFilter()
+	])
 # 	 * Works very well for most types of Article-like HTML.
-ARTICLE_EXTRACTOR = Extractor(articleFilterChain)
+# ARTICLE_EXTRACTOR
 
 
 
 # class DefaultExtractor
 # 	 * Usually worse than {@link ArticleExtractor}, but simpler/no heuristics.
 #  * A quite generic full-text extractor. 
-defaultFilterChain=filters.FilterChain([
-	filters.SimpleBlockFusionProcessor(),
-	filters.BlockProximityFusion(1,False,False),
-	filters.DensityRulesClassifier()
-])
-DEFAULT_EXTRACTOR = Extractor(defaultFilterChain)
+def createDefaultFilterChain(module):
+	return filters.FilterChain([
+		filters.SimpleBlockFusionProcessor(),
+		filters.BlockProximityFusion(1,False,False),
+		filters.DensityRulesClassifier()
+	])
+# DEFAULT_EXTRACTOR
 
 
 
@@ -134,13 +284,14 @@ DEFAULT_EXTRACTOR = Extractor(defaultFilterChain)
 #  * A full-text extractor which extracts the largest text component of a page.
 #  * For news articles, it may perform better than the {@link DefaultExtractor},
 #  * but usually worse than {@link ArticleExtractor}.
-largestContentFilterChain=filters.FilterChain([
-	filters.NumWordsRulesClassifier(),
-	filters.BlockProximityFusion(1,False,False),
-	filters.KeepLargestBlockFilter()
-])
+def createLargestContentFilterChain(module):
+	return filters.FilterChain([
+		filters.NumWordsRulesClassifier(),
+		filters.BlockProximityFusion(1,False,False),
+		filters.KeepLargestBlockFilter()
+	])
 # 	 * Like {@link DefaultExtractor}, but keeps the largest text block only.
-LARGEST_CONTENT_EXTRACTOR = Extractor(largestContentFilterChain)
+# LARGEST_CONTENT_EXTRACTOR
 
 
 
@@ -148,7 +299,7 @@ LARGEST_CONTENT_EXTRACTOR = Extractor(largestContentFilterChain)
 # class CanolaExtractor
 # 	 * Trained on krdwrd Canola (different definition of "boilerplate"). You may
 # 	 * give it a try.
-CANOLA_EXTRACTOR = Extractor(filters.CanolaFilter())
+# CANOLA_EXTRACTOR
 
 
 
@@ -158,7 +309,7 @@ CANOLA_EXTRACTOR = Extractor(filters.CanolaFilter())
 # 	 * Dummy Extractor; should return the input text. Use this to double-check
 # 	 * that your problem is within a particular {@link BoilerpipeExtractor}, or
 # 	 * somewhere else.
-KEEP_EVERYTHING_EXTRACTOR = Extractor(filters.MarkEverythingContentFilter())
+# KEEP_EVERYTHING_EXTRACTOR
 
 
 
@@ -167,17 +318,43 @@ KEEP_EVERYTHING_EXTRACTOR = Extractor(filters.MarkEverythingContentFilter())
 #
 #  * A quite generic full-text extractor solely based upon the number of words per
 #  * block (the current, the previous and the next block).
-NUM_WORDS_RULES_EXTRACTOR=Extractor(filters.NumWordsRulesClassifier())
+# NUM_WORDS_RULES_EXTRACTOR
 
 
 
 # class ArticleSentencesExtractor
 #  * A full-text extractor which is tuned towards extracting sentences from news articles.
-ARTICLE_SENTENCES_EXTRACTOR=Extractor(filters.FilterChain([
-	articleFilterChain,
-	filters.SplitParagraphBlocksFilter(),
-	filters.MinClauseWordsFilter()
-]))
+def createArticleSentencesExtractor(module):
+	return Extractor(filters.FilterChain([
+		module.articleFilterChain,
+		filters.SplitParagraphBlocksFilter(),
+		filters.MinClauseWordsFilter()
+	]))
+
+
+# listingFilterChain
+#  * For listings, search results and index pages: keeps the blocks with at least
+#  * 5 words, i.e. the titles and snippets of the items, but not the navigation.
+#  * The article heuristics would keep a single item, and the density rules of
+#  * {@link DefaultExtractor} none, as they take titles and snippets for links.
+def createListingFilterChain(module):
+	return filters.FilterChain([
+		filters.MarkEverythingContentFilter(),
+		filters.MinWordsFilter(5)
+	])
+
+
+# AUTO_EXTRACTOR
+#  * Picks the filters by the kind of page: those of {@link ArticleExtractor} for
+#  * articles, the listingFilterChain for listings, and none for pages of a few
+#  * blocks. See filters.RoutingFilter; AUTO_EXTRACTOR.filter.getReport() tells
+#  * how many pages took each route, and how long their filters took.
+def createAutoExtractor(module):
+	return Extractor(filters.RoutingFilter(
+		module.articleFilterChain,
+		module.listingFilterChain,
+		filters.MarkEverythingContentFilter()
+	))
 
 
 #  * A full-text extractor which extracts the largest text component of a page.
@@ -191,3 +368,26 @@ class KeepEverythingWithMinKWordsFilter(filters.FilterChain):
 			filters.MinWordsFilter(kMin)
 		]
 		super(KeepEverythingWithMinKWordsFilter, self).__init__(filters)
+
+
+# 
+# 	 * The extractors and filter chains above are built on first use, so that
+# 	 * importing this module does not compile every classifier; see lazy.py.
+# 	 
+LAZY_ATTRIBUTES={
+	"articleFilterChain":createArticleFilterChain,
+	"defaultFilterChain":createDefaultFilterChain,
+	"largestContentFilterChain":createLargestContentFilterChain,
+	"listingFilterChain":createListingFilterChain,
+	"ARTICLE_EXTRACTOR":lambda module: Extractor(module.articleFilterChain),
+	"DEFAULT_EXTRACTOR":lambda module: Extractor(module.defaultFilterChain),
+	"LARGEST_CONTENT_EXTRACTOR":lambda module: Extractor(module.largestContentFilterChain),
+	"CANOLA_EXTRACTOR":lambda module: Extractor(filters.CanolaFilter()),
+	"KEEP_EVERYTHING_EXTRACTOR":lambda module: Extractor(filters.MarkEverythingContentFilter()),
+	"NUM_WORDS_RULES_EXTRACTOR":lambda module: Extractor(filters.NumWordsRulesClassifier()),
+	"ARTICLE_SENTENCES_EXTRACTOR":createArticleSentencesExtractor,
+	"AUTO_EXTRACTOR":createAutoExtractor
+}
+#import * takes these names from the lazy module, which builds them
+__all__=["Extractor","KeepEverythingWithMinKWordsFilter","PARSE_PATH_XML","PARSE_PATH_HTML","PARSE_PATH_XML_FALLBACK","PARSE_PATHS"]+sorted(LAZY_ATTRIBUTES)
+lazy.install(__name__,LAZY_ATTRIBUTES)
@@ -58,13 +58,57 @@
 
 
 import re
+import time
 from . import document
+from . import rules
 from document import DefaultLabels
 
+#the parts of a document's state which filters read and write: the content flags,
+#the labels, and the list of blocks (including their text and counts)
+STATE_CONTENT = "content"
+STATE_LABELS = "labels"
+STATE_BLOCKS = "blocks"
+ALL_STATE = frozenset([STATE_CONTENT, STATE_LABELS, STATE_BLOCKS])
+
 # Boilerpipe abstract interface
 
 class BoilerpipeFilter(object):
+	#the state the filter reads and writes, see FilterChain
+	READS = ALL_STATE
+	WRITES = ALL_STATE
+	#whether running the filter again, on the state it left, changes nothing
+	IDEMPOTENT = False
+	#whether the filter may mark blocks as content which were not, and whether it
+	#reads the text of blocks -- see the lean mode of FilterChain
+	ADDS_CONTENT = True
+	READS_TEXT = True
+
 	def process(self, doc): pass
+
+	#ADDS_CONTENT, for filters where it depends on their parameters
+	def addsContent(self): return self.ADDS_CONTENT
+
+	# 
+	# 	 * Whether the filter cannot change anything on a document, given its
+	# 	 * {@link DocumentState}. Checked by {@link FilterChain} before each pass.
+	# 	 
+	def isNoOp(self, state): return False
+
+	# 
+	# 	 * Whether the filter only needs a bounded window of blocks around each block,
+	# 	 * so that it can process blocks while the document is being parsed -- see
+	# 	 * {@link #processStream}. Filters looking at the whole document are not.
+	# 	 
+	def isStreamable(self): return False
+
+	# 
+	# 	 * Processes the blocks of an iterator, yielding each block as soon as the
+	# 	 * filter is done with it. Merged blocks are not yielded, removed ones
+	# 	 * neither. The result is the same as that of {@link #process}. Filters which
+	# 	 * are not streamable refuse with a ValueError, like Extractor.getBlockStream.
+	# 	 
+	def processStream(self, blocks):
+		raise ValueError("the filter cannot be streamed, it needs the whole document: "+self.__class__.__name__)
 	
 	def subtractBlocks(self,blockArr,blocksToRemove):
 		#inefficient but in place: for block in blocksToRemove: blockArr.remove(blocksToRemove)
@@ -85,17 +129,177 @@ class BoilerpipeFilter(object):
 		return newBlockArr
 
 # chain together multiple filters in sequence
+# 
+#  * Unless skipNoOps is False, filters are skipped when they cannot change
+#  * anything: when their preconditions do not hold (see isNoOp), or when an
+#  * IDEMPOTENT filter already ran and nothing it reads or writes changed since.
+#  * The state each filter WRITES is considered changed after it runs. passes and
+#  * skippedPasses count the filter passes run and skipped by the chain.
+#  * 
+#  * In lean mode, the text of non-content blocks is released as soon as no
+#  * later filter can make them content or read their text, and their labels
+#  * once no later filter reads labels either. Only the content of the document
+#  * can be used afterwards.
+#  
 class FilterChain(BoilerpipeFilter):
-	def __init__(self,filterArr):
+	def __init__(self,filterArr,skipNoOps=True):
 		super(FilterChain, self).__init__()
 		self.filterArr=filterArr
+		self.skipNoOps=skipNoOps
+		self.passes=0
+		self.skippedPasses=0
 		
-	def process(self,doc):
+	def process(self,doc,lean=False):
+		state=self.newState(doc,lean)
+		isUpdated=self.processState(doc,state)
+		self.addPasses(state)
+		return isUpdated
+
+	def newState(self,doc,lean=False):
+		state=DocumentState(doc)
+		if lean: state.releasePoints=getReleasePoints(self)
+		state.releaseBlocks()
+		return state
+
+	def addPasses(self,state):
+		self.passes+=state.passes
+		self.skippedPasses+=state.skippedPasses
+
+	def processState(self,doc,state):
 		isUpdated=False
 		for filtr in self.filterArr:
-			isUpdated|=filtr.process(doc)
+			if isinstance(filtr,FilterChain):
+				isUpdated|=filtr.processState(doc,state)
+			else:
+				if state.shouldRun(filtr,self.skipNoOps):
+					isUpdated|=filtr.process(doc)
+					state.ran(filtr)
+				state.next()
 		return isUpdated
 
+	def isStreamable(self):
+		return all(filtr.isStreamable() for filtr in self.filterArr)
+
+	def processStream(self, blocks):
+		for filtr in self.filterArr:
+			blocks=filtr.processStream(blocks)
+		return blocks
+
+
+#the filters of a chain and of the chains in it, in the order they run
+def getLeafFilters(filtr):
+	if not isinstance(filtr, FilterChain): return [filtr]
+	return [leaf for child in filtr.filterArr for leaf in getLeafFilters(child)]
+
+# 
+#  * Returns after how many filters of a chain the text of non-content blocks can
+#  * be released, and after how many their labels can: once no later filter
+#  * ADDS_CONTENT or READS_TEXT, and for labels, once none READS them either.
+#  
+def getReleasePoints(chain):
+	textPosition = labelsPosition = 0
+	for position, filtr in enumerate(getLeafFilters(chain)):
+		if filtr.addsContent() or filtr.READS_TEXT: textPosition = position+1
+		if STATE_LABELS in filtr.READS: labelsPosition = position+1
+	return textPosition, max(textPosition, labelsPosition)
+
+# 
+#  * What a {@link FilterChain} knows about a document while running its filters:
+#  * a version number per part of the state (STATE_CONTENT, ...), increased when a
+#  * filter writing it runs, and facts about the document, computed when a filter
+#  * asks for them and kept until the state they depend on changes.
+#  
+class DocumentState(object):
+	def __init__(self, doc):
+		self.doc = doc
+		self.versions = dict((part, 0) for part in ALL_STATE)
+		self.facts = {}
+		#the versions of what each idempotent filter reads and writes, when it last ran
+		self.lastRuns = {}
+		self.passes = 0
+		self.skippedPasses = 0
+		#the number of filters (of nested chains too) done, and in lean mode, the
+		#positions after which blocks are released -- see getReleasePoints
+		self.position = 0
+		self.releasePoints = None
+
+	def releaseBlocks(self):
+		if self.releasePoints == None: return
+		textPosition, labelsPosition = self.releasePoints
+		if self.position == textPosition: self.doc.releaseNonContent(self.position == labelsPosition)
+		elif self.position == labelsPosition: self.doc.releaseNonContent(True)
+
+	def getVersions(self, parts):
+		return tuple(self.versions[part] for part in sorted(parts))
+
+	#whether a filter of a chain is to run, counting it as skipped otherwise
+	def shouldRun(self, filtr, skipNoOps=True):
+		if skipNoOps and self.canSkip(filtr):
+			self.skippedPasses += 1
+			return False
+		return True
+
+	#moves on to the next filter of the chain, once the current one ran or was skipped
+	def next(self):
+		self.position += 1
+		self.releaseBlocks()
+
+	def ran(self, filtr):
+		self.passes += 1
+		for part in filtr.WRITES: self.versions[part] += 1
+		if filtr.IDEMPOTENT: self.lastRuns[id(filtr)] = (filtr, self.getVersions(filtr.READS | filtr.WRITES))
+
+	def canSkip(self, filtr):
+		lastRun = self.lastRuns.get(id(filtr))
+		if lastRun != None and lastRun[1] == self.getVersions(filtr.READS | filtr.WRITES): return True
+		return filtr.isNoOp(self)
+
+	def getFact(self, name, parts, compute):
+		versions = self.getVersions(parts)
+		fact = self.facts.get(name)
+		if fact != None and fact[0] == versions: return fact[1]
+		value = compute()
+		self.facts[name] = (versions, value)
+		return value
+
+	def getNumBlocks(self): return len(self.doc.getTextBlocks())
+
+	def getNumContentBlocks(self):
+		return self.getFact("numContentBlocks", (STATE_CONTENT, STATE_BLOCKS), lambda: sum(1 for tb in self.doc.getTextBlocks() if tb.isContent()))
+
+	def hasLabel(self, label):
+		return self.getFact(("label", label), (STATE_LABELS, STATE_BLOCKS), lambda: len(self.doc.getBlocksWithLabels(label)) > 0)
+
+	def hasAnyLabel(self, labels): return any(self.hasLabel(label) for label in labels)
+
+
+# 
+#  * Returns the filters of a filter (chain) which cannot process a stream of blocks.
+#  
+def getUnstreamableFilters(filtr):
+	if isinstance(filtr, FilterChain):
+		return [f for child in filtr.filterArr for f in getUnstreamableFilters(child)]
+	if filtr.isStreamable(): return []
+	return [filtr]
+
+
+# 
+#  * Classifies the blocks of a stream with classifier.classify(prev, current, next),
+#  * like the process() methods of the classifiers do for a whole document.
+#  
+def classifyStream(classifier, blocks):
+	prevBlock = document.TextBlock.EMPTY_START
+	currentBlock = None
+	for nextBlock in blocks:
+		if currentBlock != None:
+			classifier.classify(prevBlock, currentBlock, nextBlock)
+			yield currentBlock
+			prevBlock = currentBlock
+		currentBlock = nextBlock
+	if currentBlock != None:
+		classifier.classify(prevBlock, currentBlock, document.TextBlock.EMPTY_START)
+		yield currentBlock
+
 
 #-----------------------------------------------------------------------
 #                           SIMPLE FILTERS
@@ -109,6 +313,12 @@ class FilterChain(BoilerpipeFilter):
 #  * @author Christian Kohlschtter
 #  
 class MarkEverythingContentFilter(BoilerpipeFilter):
+	READS = frozenset([STATE_BLOCKS])
+	WRITES = frozenset([STATE_CONTENT])
+	IDEMPOTENT = True
+
+	def isNoOp(self, state): return state.getNumContentBlocks() == state.getNumBlocks()
+
 	def process(self, doc):
 		""" generated source for method process """
 		changes = False
@@ -118,6 +328,13 @@ class MarkEverythingContentFilter(BoilerpipeFilter):
 				changes = True
 		return changes
 
+	def isStreamable(self): return True
+
+	def processStream(self, blocks):
+		for tb in blocks:
+			tb.setIsContent(True)
+			yield tb
+
 
 # 
 #  * Reverts the "isContent" flag for all {@link TextBlock}s
@@ -126,6 +343,9 @@ class MarkEverythingContentFilter(BoilerpipeFilter):
 #  
 class InvertedFilter(BoilerpipeFilter):
 
+	READS = frozenset([STATE_CONTENT, STATE_BLOCKS])
+	WRITES = frozenset([STATE_CONTENT])
+
 	def process(self, doc):
 		""" generated source for method process """
 		tbs = doc.getTextBlocks()
@@ -133,6 +353,13 @@ class InvertedFilter(BoilerpipeFilter):
 		for tb in tbs: tb.setIsContent(not tb.isContent())
 		return True
 
+	def isStreamable(self): return True
+
+	def processStream(self, blocks):
+		for tb in blocks:
+			tb.setIsContent(not tb.isContent())
+			yield tb
+
 
 # 
 #  * Removes {@link TextBlock}s which have explicitly been marked as "not content". 
@@ -140,6 +367,14 @@ class InvertedFilter(BoilerpipeFilter):
 #  * @author Christian Kohlschtter
 #  
 class BoilerplateBlockFilter(BoilerpipeFilter):
+	READS = frozenset([STATE_CONTENT, STATE_BLOCKS])
+	WRITES = frozenset([STATE_BLOCKS])
+	IDEMPOTENT = True
+	ADDS_CONTENT = False
+	READS_TEXT = False
+
+	def isNoOp(self, state): return state.getNumContentBlocks() == state.getNumBlocks()
+
 	def process(self, doc):
 		""" generated source for method process """
 		textBlocks = doc.getTextBlocks()
@@ -149,6 +384,12 @@ class BoilerplateBlockFilter(BoilerpipeFilter):
 
 		return hasChanges
 
+	def isStreamable(self): return True
+
+	def processStream(self, blocks):
+		for tb in blocks:
+			if tb.isContent(): yield tb
+
 
 # 
 #  * Keeps only those content blocks which contain at least <em>k</em> words.
@@ -156,6 +397,14 @@ class BoilerplateBlockFilter(BoilerpipeFilter):
 #  * @author Christian Kohlschtter
 #  
 class MinWordsFilter(BoilerpipeFilter):
+	READS = frozenset([STATE_CONTENT, STATE_BLOCKS])
+	WRITES = frozenset([STATE_CONTENT])
+	IDEMPOTENT = True
+	ADDS_CONTENT = False
+	READS_TEXT = False
+
+	def isNoOp(self, state): return state.getNumContentBlocks() == 0
+
 	def __init__(self, minWords):
 		super(MinWordsFilter, self).__init__()
 		self.minWords = minWords
@@ -163,12 +412,23 @@ class MinWordsFilter(BoilerpipeFilter):
 	def process(self, doc):
 		changes = False
 		for tb in doc.getTextBlocks():
-			if not tb.isContent(): continue 
-			if tb.getNumWords() < self.minWords:
-				tb.setIsContent(False)
-				changes = True
+			changes |= self.processBlock(tb)
 		return changes
 
+	def processBlock(self, tb):
+		if not tb.isContent(): return False
+		if tb.getNumWords() < self.minWords:
+			tb.setIsContent(False)
+			return True
+		return False
+
+	def isStreamable(self): return True
+
+	def processStream(self, blocks):
+		for tb in blocks:
+			self.processBlock(tb)
+			yield tb
+
 
 # 
 #  * Keeps only blocks that have at least one segment fragment ("clause") with at
@@ -181,6 +441,13 @@ class MinWordsFilter(BoilerpipeFilter):
 #  * @see SplitParagraphBlocksFilter
 #  
 class MinClauseWordsFilter(BoilerpipeFilter):
+	READS = frozenset([STATE_CONTENT, STATE_BLOCKS])
+	WRITES = frozenset([STATE_CONTENT])
+	IDEMPOTENT = True
+	ADDS_CONTENT = False
+
+	def isNoOp(self, state): return state.getNumContentBlocks() == 0
+
 	def __init__(self, minWords=5, acceptClausesWithoutDelimiter=False):
 		super(MinClauseWordsFilter, self).__init__()
 		self.minWords = minWords
@@ -193,23 +460,34 @@ class MinClauseWordsFilter(BoilerpipeFilter):
 		""" generated source for method process """
 		changes = False
 		for tb in doc.getTextBlocks():
-			if not tb.isContent(): continue 
-			hasClause = False
-			possibleClauseArr=self.PAT_CLAUSE_DELIMITER.split(tb.getText())
-			for possibleClause in possibleClauseArr[:-1]:
-				hasClause = self.isClauseAccepted(possibleClause)
-				if hasClause: break
-			
-			#  since clauses should *always end* with a delimiter, we normally
-			#  don't consider text without one
-			if self.acceptClausesWithoutDelimiter:
-				hasClause |= self.isClauseAccepted(possibleClauseArr[-1])
-			if not hasClause:
-				tb.setIsContent(False)
-				changes = True
-				#  System.err.println("IS NOT CONTENT: " + text);
+			changes |= self.processBlock(tb)
 		return changes
 
+	def processBlock(self, tb):
+		if not tb.isContent(): return False
+		hasClause = False
+		possibleClauseArr=self.PAT_CLAUSE_DELIMITER.split(tb.getText())
+		for possibleClause in possibleClauseArr[:-1]:
+			hasClause = self.isClauseAccepted(possibleClause)
+			if hasClause: break
+		
+		#  since clauses should *always end* with a delimiter, we normally
+		#  don't consider text without one
+		if self.acceptClausesWithoutDelimiter:
+			hasClause |= self.isClauseAccepted(possibleClauseArr[-1])
+		if not hasClause:
+			tb.setIsContent(False)
+			#  System.err.println("IS NOT CONTENT: " + text);
+			return True
+		return False
+
+	def isStreamable(self): return True
+
+	def processStream(self, blocks):
+		for tb in blocks:
+			self.processBlock(tb)
+			yield tb
+
 	def isClauseAccepted(self, text):
 		""" generated source for method isClause """
 		n = 1
@@ -230,6 +508,8 @@ class MinClauseWordsFilter(BoilerpipeFilter):
 #  * @see MinClauseWordsFilter
 #  
 class SplitParagraphBlocksFilter(BoilerpipeFilter):
+	ADDS_CONTENT = False
+
 	def process(self, doc):
 		changes = False
 		blocks = doc.getTextBlocks()
@@ -290,18 +570,32 @@ class LabelToBoilerplateFilter(BoilerpipeFilter):
 	""" generated source for class LabelToBoilerplateFilter """
 	#INSTANCE_STRICTLY_NOT_CONTENT = LabelToBoilerplateFilter(DefaultLabels.STRICTLY_NOT_CONTENT)
 
+	WRITES = frozenset([STATE_CONTENT])
+	IDEMPOTENT = True
+	ADDS_CONTENT = False
+	READS_TEXT = False
+
+	def isNoOp(self, state): return not state.hasAnyLabel(self.labels)
+
 	def __init__(self, *labels):
 		super(LabelToBoilerplateFilter, self).__init__()
 		self.labels = labels
 
 	def process(self, doc):
 		changes = False
-		for tb in doc.getTextBlocks():
-			if tb.isContent() and any(tb.hasLabel(label) for label in self.labels):
+		for tb in doc.getBlocksWithLabels(*self.labels):
+			if tb.isContent():
 				tb.setIsContent(False)
 				changes = True
 		return changes
 
+	def isStreamable(self): return True
+
+	def processStream(self, blocks):
+		for tb in blocks:
+			if tb.isContent() and not tb.getLabels().isdisjoint(self.labels): tb.setIsContent(False)
+			yield tb
+
 
 # 
 #  * Marks all blocks that contain a given label as "content".
@@ -310,6 +604,11 @@ class LabelToBoilerplateFilter(BoilerpipeFilter):
 #  
 class LabelToContentFilter(BoilerpipeFilter):
 	""" generated source for class LabelToContentFilter """
+	WRITES = frozenset([STATE_CONTENT])
+	IDEMPOTENT = True
+
+	def isNoOp(self, state): return not state.hasAnyLabel(self.labels)
+
 	def __init__(self, *labels):
 		""" generated source for method __init__ """
 		super(LabelToContentFilter, self).__init__()
@@ -317,12 +616,19 @@ class LabelToContentFilter(BoilerpipeFilter):
 
 	def process(self, doc):
 		changes = False
-		for tb in doc.getTextBlocks():
-			if not tb.isContent() and any(tb.hasLabel(label) for label in self.labels):
+		for tb in doc.getBlocksWithLabels(*self.labels):
+			if not tb.isContent():
 				tb.setIsContent(True)
 				changes = True
 		return changes
 
+	def isStreamable(self): return True
+
+	def processStream(self, blocks):
+		for tb in blocks:
+			if not tb.isContent() and not tb.getLabels().isdisjoint(self.labels): tb.setIsContent(True)
+			yield tb
+
 
 
 
@@ -339,6 +645,8 @@ class LabelToContentFilter(BoilerpipeFilter):
 #  * @author Christian Kohlschtter
 #  
 class SimpleBlockFusionProcessor(BoilerpipeFilter):
+	def isNoOp(self, state): return state.getNumBlocks() < 2
+
 	def process(self, doc):
 		""" generated source for method process """
 		textBlocks = doc.getTextBlocks()
@@ -357,9 +665,24 @@ class SimpleBlockFusionProcessor(BoilerpipeFilter):
 		if changes: doc.setTextBlocks(self.subtractBlocks(textBlocks,blocksToRemove))
 		return changes
 
+	def isStreamable(self): return True
+
+	def processStream(self, blocks):
+		prevBlock = None
+		for block in blocks:
+			if prevBlock != None and prevBlock.getTextDensity() == block.getTextDensity():
+				prevBlock.mergeNext(block)
+			else:
+				if prevBlock != None: yield prevBlock
+				prevBlock = block
+		if prevBlock != None: yield prevBlock
+
 
 
 class ContentFusion(BoilerpipeFilter):
+	#only blocks following content blocks are merged
+	def isNoOp(self, state): return state.getNumBlocks() < 2 or state.getNumContentBlocks() == 0
+
 	def process(self, doc):
 		""" generated source for method process """
 		textBlocks = doc.getTextBlocks()
@@ -461,6 +784,9 @@ class BlockProximityFusion(BoilerpipeFilter):
 		self.contentOnly = contentOnly
 		self.sameTagLevelOnly = sameTagLevelOnly
 
+	#only content blocks are merged into their predecessors
+	def isNoOp(self, state): return state.getNumBlocks() < 2 or state.getNumContentBlocks() == 0
+
 	def process(self, doc):
 		""" generated source for method process """
 		textBlocks = doc.getTextBlocks()
@@ -483,21 +809,11 @@ class BlockProximityFusion(BoilerpipeFilter):
 			if not block.isContent():
 				prevBlock = block
 				continue 
-			diffBlocks = block.getOffsetBlocksStart() - prevBlock.getOffsetBlocksEnd() - 1;
-			if diffBlocks <= self.maxBlocksDistance:
-				ok=True
-				if self.contentOnly:
-					if not prevBlock.isContent() or not block.isContent():
-						ok = False
-				if self.sameTagLevelOnly and prevBlock.getTagLevel() != block.getTagLevel():
-					ok = False
-				if ok:
-					prevBlock.mergeNext(block)
-					#remove current block
-					blocksToRemove.append(block)
-					changes = True
-				else:
-					prevBlock = block
+			if self.canMerge(prevBlock, block):
+				prevBlock.mergeNext(block)
+				#remove current block
+				blocksToRemove.append(block)
+				changes = True
 			else:
 				prevBlock = block
 				
@@ -508,6 +824,30 @@ class BlockProximityFusion(BoilerpipeFilter):
 			
 		return changes
 
+	#checks whether block (a content block) is to be merged into prevBlock
+	def canMerge(self, prevBlock, block):
+		diffBlocks = block.getOffsetBlocksStart() - prevBlock.getOffsetBlocksEnd() - 1;
+		if diffBlocks > self.maxBlocksDistance: return False
+		if self.contentOnly and not prevBlock.isContent(): return False
+		if self.sameTagLevelOnly and prevBlock.getTagLevel() != block.getTagLevel(): return False
+		return True
+
+	def isStreamable(self): return True
+
+	def processStream(self, blocks):
+		prevBlock = None
+		for block in blocks:
+			if prevBlock == None:
+				#with contentOnly, blocks before the first content block are left alone
+				if self.contentOnly and not block.isContent(): yield block
+				else: prevBlock = block
+			elif block.isContent() and self.canMerge(prevBlock, block):
+				prevBlock.mergeNext(block)
+			else:
+				yield prevBlock
+				prevBlock = block
+		if prevBlock != None: yield prevBlock
+
 
 
 # 
@@ -525,11 +865,18 @@ class KeepLargestBlockFilter(BoilerpipeFilter):
 	#INSTANCE = KeepLargestBlockFilter(False)
 	#INSTANCE_EXPAND_TO_SAME_TAGLEVEL = KeepLargestBlockFilter(True)
 
+	WRITES = frozenset([STATE_CONTENT, STATE_LABELS])
+	ADDS_CONTENT = False
+	READS_TEXT = False
+
 	def __init__(self, expandToSameLevelText=False):
 		""" generated source for method __init__ """
 		super(KeepLargestBlockFilter, self).__init__()
 		self.expandToSameLevelText = expandToSameLevelText
 
+	#only expanding marks other blocks than the largest content block
+	def addsContent(self): return self.expandToSameLevelText
+
 	def process(self, doc):
 		""" generated source for method process """
 		textBlocks = doc.getTextBlocks()
@@ -574,17 +921,25 @@ class KeepLargestBlockFilter(BoilerpipeFilter):
 #  * @author Christian Kohlschtter
 #  
 class ExpandTitleToContentFilter(BoilerpipeFilter):
+	WRITES = frozenset([STATE_CONTENT])
+	IDEMPOTENT = True
+
+	def isNoOp(self, state): return state.getNumContentBlocks() == 0 or not state.hasLabel(DefaultLabels.TITLE)
+
 	def process(self, doc):
 		""" generated source for method process """
-		i = 0
-		titleIdx = -1
+		titlePositions = doc.getLabelPositions(DefaultLabels.TITLE)
+		if len(titlePositions) == 0: return False
 		contentStart = -1
-		for tb in doc.getTextBlocks():
-			if contentStart == -1 and tb.hasLabel(DefaultLabels.TITLE):
-				titleIdx = i
-			if contentStart == -1 and tb.isContent():
+		for i, tb in enumerate(doc.getTextBlocks()):
+			if tb.isContent():
 				contentStart = i
-			i += 1
+				break
+		#the last title up to the first content block
+		titleIdx = -1
+		for pos in titlePositions:
+			if contentStart != -1 and pos > contentStart: break
+			titleIdx = pos
 			
 		if contentStart <= titleIdx or titleIdx == -1: return False
 		
@@ -662,6 +1017,19 @@ class AddPrecedingLabelsFilter(BoilerpipeFilter):
 
 class DocumentTitleMatchClassifier(BoilerpipeFilter):
 	""" generated source for class DocumentTitleMatchClassifier """
+	#separators between the parts of a title, from the strictest to the loosest
+	PATS_TITLE_SEPARATOR = [
+		re.compile("[ ]*[\||:][ ]*"),
+		re.compile("[ ]*[\||:\(\)][ ]*"),
+		re.compile("[ ]*[\||:\(\)\-][ ]*"),
+		re.compile("[ ]*[\||,|:\(\)\-][ ]*")
+	]
+	PAT_WORD = re.compile("\w+",re.UNICODE)
+
+	READS = frozenset([STATE_BLOCKS])
+	WRITES = frozenset([STATE_LABELS])
+	IDEMPOTENT = True
+	ADDS_CONTENT = False
 
 	def __init__(self, title, useDocTitle=False):
 		""" generated source for method __init__ """
@@ -669,6 +1037,7 @@ class DocumentTitleMatchClassifier(BoilerpipeFilter):
 		self.useDocTitle=useDocTitle
 		if useDocTitle: self.potentialTitles=None
 		else: self.potentialTitles=self.findPotentialTitles(title)
+		self.candidates=self.getCandidates(self.potentialTitles)
 					
 	def findPotentialTitles(self,title):
 		if title == None: return None
@@ -678,14 +1047,9 @@ class DocumentTitleMatchClassifier(BoilerpipeFilter):
 		else:
 			potentialTitles = set()
 			potentialTitles.add(title)
-			p = self.getLongestPart(title, "[ ]*[\||:][ ]*")
-			if p != None: potentialTitles.add(p)
-			p = self.getLongestPart(title, "[ ]*[\||:\(\)][ ]*")
-			if p != None: potentialTitles.add(p)
-			p = self.getLongestPart(title, "[ ]*[\||:\(\)\-][ ]*")
-			if p != None: potentialTitles.add(p)
-			p = self.getLongestPart(title, "[ ]*[\||,|:\(\)\-][ ]*")
-			if p != None: potentialTitles.add(p)
+			for pattern in self.PATS_TITLE_SEPARATOR:
+				p = self.getLongestPart(title, pattern)
+				if p != None: potentialTitles.add(p)
 		return potentialTitles
 
 	def getPotentialTitles(self):
@@ -694,7 +1058,8 @@ class DocumentTitleMatchClassifier(BoilerpipeFilter):
 
 	def getLongestPart(self, title, pattern):
 		""" generated source for method getLongestPart """
-		parts = re.split(pattern,title)
+		if isinstance(pattern, basestring): pattern = re.compile(pattern)
+		parts = pattern.split(title)
 		if len(parts)==1: return None
 		
 		longestNumWords = 0
@@ -709,16 +1074,34 @@ class DocumentTitleMatchClassifier(BoilerpipeFilter):
 		else: return longestPart.strip()
 
 	def getNumWords(self,text):
-		return len(re.findall("\w+",text,re.UNICODE))
+		return len(self.PAT_WORD.findall(text))
+
+	# 
+	# 	 * Returns the lower-cased potential titles and the set of their lengths,
+	# 	 * or <code>None</code> if there are none.
+	# 	 
+	def getCandidates(self, potentialTitles):
+		if potentialTitles == None: return None
+		candidates = set(candidate.lower() for candidate in potentialTitles)
+		return candidates, set(len(candidate) for candidate in candidates)
 
 	def process(self, doc):
 		""" generated source for method process """
-		if self.useDocTitle: self.potentialTitles=self.findPotentialTitles(doc.getTitle())
-		if self.potentialTitles == None: return False
+		if self.useDocTitle:
+			self.potentialTitles=self.findPotentialTitles(doc.getTitle())
+			candidates=self.getCandidates(self.potentialTitles)
+		else: candidates=self.candidates
+		if candidates == None: return False
+		candidates, lengths = candidates
+		maxLength = max(lengths)
 		changes = False
 		for tb in doc.getTextBlocks():
-			text=tb.getText().strip().lower()
-			if any(candidate.lower()==text for candidate in self.potentialTitles):
+			text=tb.getText()
+			#blocks from the parser are stripped already; skip long ones without copying them
+			if len(text) > maxLength and not text[0].isspace() and not text[-1].isspace(): continue
+			text=text.strip()
+			if len(text) not in lengths: continue
+			if text.lower() in candidates:
 				tb.addLabel(DefaultLabels.TITLE)
 				changes = True
 		return changes
@@ -743,6 +1126,9 @@ class DocumentTitleMatchClassifier(BoilerpipeFilter):
 #  * @author Christian Kohlschtter
 #  
 class HeuristicFilterBase(BoilerpipeFilter):
+	ADDS_CONTENT = False
+	READS_TEXT = False
+
 	def getNumFullTextWords(self, tb, minTextDensity=9):
 		if tb.getTextDensity() >= minTextDensity: return tb.getNumWords()
 		else: return 0
@@ -754,6 +1140,12 @@ class HeuristicFilterBase(BoilerpipeFilter):
 #  * @author Christian Kohlschtter
 #  
 class MinFulltextWordsFilter(HeuristicFilterBase):
+	READS = frozenset([STATE_CONTENT, STATE_BLOCKS])
+	WRITES = frozenset([STATE_CONTENT])
+	IDEMPOTENT = True
+
+	def isNoOp(self, state): return state.getNumContentBlocks() == 0
+
 	def __init__(self, minWords=30):
 		self.minWords = minWords
 
@@ -815,11 +1207,16 @@ class IgnoreBlocksAfterContentFilter(HeuristicFilterBase):
 	#DEFAULT_INSTANCE = IgnoreBlocksAfterContentFilter(60)
 	#INSTANCE_200 = IgnoreBlocksAfterContentFilter(200)
 
+	WRITES = frozenset([STATE_CONTENT])
+
+	def isNoOp(self, state): return not state.hasLabel(DefaultLabels.INDICATES_END_OF_TEXT)
+
 	def __init__(self, minNumWords=60):
 		self.minNumWords = minNumWords
 
 	def process(self, doc):
 		""" generated source for method process """
+		if len(doc.getLabelPositions(DefaultLabels.INDICATES_END_OF_TEXT)) == 0: return False
 		changes = False
 		numWords = 0
 		foundEndOfText = False
@@ -843,12 +1240,17 @@ class IgnoreBlocksAfterContentFilter(HeuristicFilterBase):
 #  
 class IgnoreBlocksAfterContentFromEndFilter(HeuristicFilterBase):
 
+	WRITES = frozenset([STATE_CONTENT, STATE_LABELS])
+
+	def isNoOp(self, state): return not state.hasLabel(DefaultLabels.INDICATES_END_OF_TEXT)
+
 	def process(self, doc):
 		""" generated source for method process """
 		changes = False
 		words = 0
 		blocks = doc.getTextBlocks()
 		if len(blocks)==0: return False
+		if len(doc.getLabelPositions(DefaultLabels.INDICATES_END_OF_TEXT)) == 0: return False
 		for tb in blocks[::-1]:
 			if tb.hasLabel(DefaultLabels.INDICATES_END_OF_TEXT):
 				tb.addLabel(DefaultLabels.STRICTLY_NOT_CONTENT)
@@ -861,6 +1263,73 @@ class IgnoreBlocksAfterContentFromEndFilter(HeuristicFilterBase):
 		return changes
 
 
+# 
+#  * Checks a text against a lexicon of phrases in a single pass. The lexicon maps
+#  * each mode to its phrases:
+#  * - "prefix": the text starts with the phrase
+#  * - "infix": the text contains the phrase
+#  * - "exact": the text is the phrase
+#  * - "afterNumber": the text starts with digits followed by the phrase
+#  * 
+#  * The phrases are put into a trie once, which is compiled into a single
+#  * regular expression, so matching walks the trie at each position of the text
+#  * rather than testing every phrase. Its cost depends on the length of the text,
+#  * not on the number of phrases. Phrases should be lower case, like the texts.
+#  
+class PhraseMatcher(object):
+	PREFIX = "prefix"
+	INFIX = "infix"
+	EXACT = "exact"
+	AFTER_NUMBER = "afterNumber"
+	MODES = (PREFIX, INFIX, EXACT, AFTER_NUMBER)
+
+	def __init__(self, lexicon):
+		for mode in lexicon:
+			if mode not in self.MODES: raise ValueError("unknown phrase mode: %r" % mode)
+		branches = []
+		if lexicon.get(self.PREFIX): branches.append(r"\A" + self.trieRegex(lexicon[self.PREFIX]))
+		if lexicon.get(self.EXACT): branches.append(r"\A" + self.trieRegex(lexicon[self.EXACT], r"\Z"))
+		#the lookahead takes all leading digits, without backtracking into them
+		if lexicon.get(self.AFTER_NUMBER): branches.append(r"\A(?=(?P<number>[0-9]+))(?P=number)" + self.trieRegex(lexicon[self.AFTER_NUMBER]))
+		if lexicon.get(self.INFIX): branches.append(self.trieRegex(lexicon[self.INFIX]))
+		if len(branches) == 0: self.pattern = None
+		else: self.pattern = re.compile("|".join(branches), re.UNICODE)
+
+	def matches(self, text):
+		return self.pattern != None and self.pattern.search(text) != None
+
+	# 
+	# 	 * Returns a regular expression matching any of the phrases, followed by terminal.
+	# 	 
+	def trieRegex(self, phrases, terminal=""):
+		trie = {}
+		for phrase in phrases:
+			if len(phrase) == 0: continue
+			if isinstance(phrase, str): phrase = phrase.decode("utf8")
+			node = trie
+			for c in phrase: node = node.setdefault(c, {})
+			node[""] = None
+		return self.nodeRegex(trie, terminal)
+
+	def nodeRegex(self, node, terminal):
+		#without a terminal, a phrase ending here already matches
+		if "" in node and terminal == "": return ""
+		alternatives = [re.escape(c) + self.nodeRegex(child, terminal) for c, child in sorted(node.items()) if c != ""]
+		if "" in node: alternatives.append(terminal)
+		if len(alternatives) == 1: return alternatives[0]
+		return "(?:" + "|".join(alternatives) + ")"
+
+# 
+#  * Combines lexicons for {@link PhraseMatcher}, e.g. those of several languages.
+#  
+def mergeLexicons(*lexicons):
+	merged = {}
+	for lexicon in lexicons:
+		for mode, phrases in lexicon.items():
+			merged.setdefault(mode, []).extend(phrases)
+	return merged
+
+
 # 
 #  * Finds blocks which are potentially indicating the end of an article text and
 #  * marks them with {@link DefaultLabels#INDICATES_END_OF_TEXT}. This can be used
@@ -870,6 +1339,28 @@ class IgnoreBlocksAfterContentFromEndFilter(HeuristicFilterBase):
 #  * @see IgnoreBlocksAfterContentFilter
 #  
 class TerminatingBlocksFinder(BoilerpipeFilter):
+	DEFAULT_LEXICON = {
+		"prefix" : ("comments", " reuters", "please rate this", "post a comment"),
+		"infix" : ("what you think...", "add your comment", "add comment", "reader views", "have your say", "reader comments", "rtta artikeln"),
+		"exact" : ("thanks for your comments - this feedback is now closed",),
+		"afterNumber" : (" comments", " users responded in")
+	}
+
+	READS = frozenset([STATE_BLOCKS])
+	WRITES = frozenset([STATE_LABELS])
+	IDEMPOTENT = True
+	ADDS_CONTENT = False
+
+	# 
+	# 	 * @param lexicon
+	# 	 *			The phrases indicating the end of the text, as a {@link PhraseMatcher}
+	# 	 *			or a lexicon to build one from. Defaults to {@link #DEFAULT_LEXICON}.
+	# 	 
+	def __init__(self, lexicon=None):
+		super(TerminatingBlocksFinder, self).__init__()
+		if lexicon == None: lexicon = self.DEFAULT_LEXICON
+		if not isinstance(lexicon, PhraseMatcher): lexicon = PhraseMatcher(lexicon)
+		self.matcher = lexicon
 
 	#  public static long timeSpent = 0;
 	def process(self, doc):
@@ -880,37 +1371,44 @@ class TerminatingBlocksFinder(BoilerpipeFilter):
 			if tb.getNumWords() >=15: continue
 			text=tb.getText().strip()
 			if len(text)<8: continue
-			textLC = text.lower()
-			
-			startmatches=(" reuters","please rate this","post a comment")
-			inmatches=("what you think...","add your comment","add comment","reader views","have your say","reader comments","rtta artikeln")
-			eqmatch="thanks for your comments - this feedback is now closed"
-			
-			if textLC.startswith("comments") or self.startsWithNumber(textLC, " comments", " users responded in") or any(textLC.startswith(matchStr) for matchStr in startmatches) or any(matchStr in textLC for matchStr in inmatches) or textLC == eqmatch:
+			if self.matcher.matches(text.lower()):
 				tb.addLabel(DefaultLabels.INDICATES_END_OF_TEXT)
 				changes = True
 		#  timeSpent += System.currentTimeMillis() - t;
 		return changes
 
+
+# 
+#  * Classifies {@link TextBlock}s as content/not-content with a decision tree over
+#  * the features of the current, previous and next blocks, see {@link rules}. The
+#  * tree is compiled to Python code once.
+#  
+class RuleClassifier(BoilerpipeFilter):
+	READS = frozenset([STATE_BLOCKS])
+	WRITES = frozenset([STATE_CONTENT])
+	IDEMPOTENT = True
+
+	#tree - a decision tree (see rules), or a compiled classifier such as a rules.RuleTree
+	def __init__(self, tree):
+		if isinstance(tree, tuple) or isinstance(tree, bool): tree = rules.getRuleTree(tree)
+		self.ruleTree = tree
+		self.window = self.ruleTree.window
+		#classify(prev, curr, next), for trees looking at the previous and next blocks only
+		if self.ruleTree.classify != None: self.classify = self.ruleTree.classify
+
+	def process(self, doc):
+		return self.ruleTree.classifyBlocks(doc.getTextBlocks(), document.TextBlock.EMPTY_START)
+
+	def isStreamable(self): return self.window <= 1
+
+	def processStream(self, blocks): return classifyStream(self, blocks)
+
 	# 
-	# 	 * Checks whether the given text t starts with a sequence of digits,
-	# 	 * followed by one of the given strings.
-	# 	 * 
-	# 	 * @param t
-	# 	 *			The text to examine
-	# 	 * @param len
-	# 	 *			The length of the text to examine
-	# 	 * @param str
-	# 	 *			Any strings that may follow the digits.
-	# 	 * @return true if at least one combination matches
+	# 	 * Evaluates the tree over all rows of a {@link BlockBatch} at once. The flags
+	# 	 * of padding rows are not meaningful.
 	# 	 
-	def startsWithNumber(self, text, *matchStrArr):
-		""" generated source for method startsWithNumber """
-		numberMatch=re.search('\D',text)
-		if numberMatch==None: pos=len(text)
-		else: pos=numberMatch.start()
-		if pos==0: return False
-		else: return any(text.startswith(matchStr,pos) for matchStr in matchStrArr)
+	def classifyBatch(self, batch): return self.ruleTree.evaluateBatch(batch)
+
 
 
 # 
@@ -921,48 +1419,8 @@ class TerminatingBlocksFinder(BoilerpipeFilter):
 #  * 
 #  * @author Christian Kohlschtter
 #  
-class NumWordsRulesClassifier(BoilerpipeFilter):
-
-	def process(self, doc):
-		""" generated source for method process """
-		textBlocks = doc.getTextBlocks()
-		hasChanges = False
-		
-		n=len(textBlocks)
-		for i,currentBlock in enumerate(textBlocks):
-			if i>0: prevBlock=textBlocks[i-1]
-			else: prevBlock=document.TextBlock.EMPTY_START
-			if i+1<n: nextBlock=textBlocks[i+1]
-			else: nextBlock=document.TextBlock.EMPTY_START
-			hasChanges |= self.classify(prevBlock, currentBlock, nextBlock)
-		return hasChanges
-
-	def classify(self, prev, curr, next):
-		""" generated source for method classify """
-		isContent = False
-		if curr.getLinkDensity() <= 0.333333:
-			if prev.getLinkDensity() <= 0.555556:
-				if curr.getNumWords() <= 16:
-					if next.getNumWords() <= 15:
-						if prev.getNumWords() <= 4:
-							isContent = False
-						else:
-							isContent = True
-					else:
-						isContent = True
-				else:
-					isContent = True
-			else:
-				if curr.getNumWords() <= 40:
-					if next.getNumWords() <= 17:
-						isContent = False
-					else:
-						isContent = True
-				else:
-					isContent = True
-		else:
-			isContent = False
-		return curr.setIsContent(isContent)
+class NumWordsRulesClassifier(RuleClassifier):
+	def __init__(self): RuleClassifier.__init__(self, rules.NUM_WORDS_RULES)
 
 
 
@@ -974,48 +1432,8 @@ class NumWordsRulesClassifier(BoilerpipeFilter):
 #  * 
 #  * @author Christian Kohlschtter
 #  
-class DensityRulesClassifier(BoilerpipeFilter):
-
-	def process(self, doc):
-		""" generated source for method process """
-		textBlocks = doc.getTextBlocks()
-		hasChanges = False
-		
-		n=len(textBlocks)
-		for i,currentBlock in enumerate(textBlocks):
-			if i>0: prevBlock=textBlocks[i-1]
-			else: prevBlock=document.TextBlock.EMPTY_START
-			if i+1<n: nextBlock=textBlocks[i+1]
-			else: nextBlock=document.TextBlock.EMPTY_START
-			hasChanges |= self.classify(prevBlock, currentBlock, nextBlock)
-		return hasChanges
-
-	def classify(self, prev, curr, next):
-		""" generated source for method classify """
-		isContent = False
-		if curr.getLinkDensity() <= 0.333333:
-			if prev.getLinkDensity() <= 0.555556:
-				if curr.getTextDensity() <= 9:
-					if next.getTextDensity() <= 10:
-						if prev.getTextDensity() <= 4:
-							isContent = False
-						else:
-							isContent = True
-					else:
-						isContent = True
-				else:
-					if next.getTextDensity() == 0:
-						isContent = False
-					else:
-						isContent = True
-			else:
-				if next.getTextDensity() <= 11:
-					isContent = False
-				else:
-					isContent = True
-		else:
-			isContent = False
-		return curr.setIsContent(isContent)
+class DensityRulesClassifier(RuleClassifier):
+	def __init__(self): RuleClassifier.__init__(self, rules.DENSITY_RULES)
 
 # 
 #  * A full-text extractor trained on <a href="http://krdwrd.org/">krdwrd</a> <a
@@ -1025,27 +1443,57 @@ class DensityRulesClassifier(BoilerpipeFilter):
 #  * 
 #  * @author Christian Kohlschtter
 #  
-class CanolaFilter(BoilerpipeFilter):
+class CanolaFilter(RuleClassifier):
+	def __init__(self): RuleClassifier.__init__(self, rules.CANOLA_RULES)
+
+
+#
+#  * Sends each document to one of several filters, by the kind of page it looks
+#  * like given shallow statistics of its blocks (see TextDocumentStatistics),
+#  * which the parser collects while flushing them (see parseStatistics):
+#  *
+#  * - ROUTE_SHORT: pages of at most maxShortBlocks blocks, where there is
+#  *	little to remove, go to the short filter (e.g. MarkEverythingContentFilter);
+#  * - ROUTE_LISTING: pages where at least minListingLinkDensity of the words are
+#  *	in links and no block has more than maxListingBlockShare of the words
+#  *	(listings, search results, index pages) go to the listing filter;
+#  * - ROUTE_ARTICLE: the others go to the article filter.
+#  *
+#  * routeCounts and routeSeconds count the documents and the seconds spent by
+#  * the filter of each route, see getReport. See AUTO_EXTRACTOR.
+#
+ROUTE_SHORT = "short"
+ROUTE_LISTING = "listing"
+ROUTE_ARTICLE = "article"
+ROUTES = (ROUTE_SHORT, ROUTE_LISTING, ROUTE_ARTICLE)
+
+class RoutingFilter(BoilerpipeFilter):
+	def __init__(self, article, listing, short, maxShortBlocks=3, minListingLinkDensity=0.33, maxListingBlockShare=0.1):
+		self.filters = {ROUTE_ARTICLE: article, ROUTE_LISTING: listing, ROUTE_SHORT: short}
+		self.maxShortBlocks = maxShortBlocks
+		self.minListingLinkDensity = minListingLinkDensity
+		self.maxListingBlockShare = maxListingBlockShare
+		self.routeCounts = dict((route, 0) for route in ROUTES)
+		self.routeSeconds = dict((route, 0.0) for route in ROUTES)
+
+	def getRoute(self, doc):
+		#collected by the parser, unless a filter ran before this one
+		stats = doc.parseStatistics
+		if stats == None: stats = document.TextDocumentStatistics(doc, False)
+		if stats.numBlocks <= self.maxShortBlocks: return ROUTE_SHORT
+		if stats.getLinkDensity() >= self.minListingLinkDensity and stats.getLargestBlockShare() <= self.maxListingBlockShare: return ROUTE_LISTING
+		return ROUTE_ARTICLE
 
 	def process(self, doc):
-		""" generated source for method process """
-		textBlocks = doc.getTextBlocks()
-		hasChanges = False
-		
-		n=len(textBlocks)
-		for i,currentBlock in enumerate(textBlocks):
-			if i>0: prevBlock=textBlocks[i-1]
-			else: prevBlock=document.TextBlock.EMPTY_START
-			if i+1<n: nextBlock=textBlocks[i+1]
-			else: nextBlock=document.TextBlock.EMPTY_START
-			hasChanges |= self.classify(prevBlock, currentBlock, nextBlock)
-		return hasChanges
+		start = time.time()
+		route = self.getRoute(doc)
+		isUpdated = self.filters[route].process(doc)
+		self.count(route, 1, time.time()-start)
+		return isUpdated
 
-	def classify(self, prev, curr, next):
-		""" generated source for method classify """
-		cond1=curr.getLinkDensity() > 0 and next.getNumWords() > 11
-		cond2=curr.getNumWords() > 19
-		cond3=next.getNumWords() > 6 and next.getLinkDensity() == 0 and prev.getLinkDensity() == 0 and (curr.getNumWords() > 6 or prev.getNumWords() > 7 or next.getNumWords() > 19)
-		isContent = cond1 or cond2 or cond3
-		return curr.setIsContent(isContent)
+	def count(self, route, numDocs, seconds):
+		self.routeCounts[route] += numDocs
+		self.routeSeconds[route] += seconds
 
+	def getReport(self):
+		return "\n".join("%-8s %8d pages %10.3f s" % (route, self.routeCounts[route], self.routeSeconds[route]) for route in ROUTES)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+#
+#  * boilerpipe
+#  *
+#  * Copyright (c) 2009 Christian Kohlschtter
+#  *
+#  * The author licenses this file to You under the Apache License, Version 2.0
+#  * (the "License"); you may not use this file except in compliance with
+#  * the License.  You may obtain a copy of the License at
+#  *
+#  *	 http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#
+
+#
+#  * Re-extraction of recrawled pages. An {@link ExtractionRecord} keeps, for each
+#  * block of a parsed page, a hash of the block and whether it ended up in the
+#  * content. When the page is crawled again, its new blocks are aligned with the
+#  * old ones by hash; the unchanged blocks keep their content flags, and only a
+#  * window of blocks around each change is run through the filter chain again.
+#  *
+#  *	doc, record = extractor.getUpdatedDoc(html)
+#  *	...
+#  *	doc, record = extractor.getUpdatedDoc(recrawledHtml, record)
+#  *
+#  * This is only correct for filter chains which look at a bounded window of
+#  * blocks (see BoilerpipeFilter.isStreamable), such as DEFAULT_EXTRACTOR's:
+#  * the others, e.g. with KeepLargestBlockFilter, may change every flag for one
+#  * changed block, so their pages are always extracted in full. As the window
+#  * of fusion filters is not known in advance, the flags computed at the borders
+#  * of each window must equal the reused ones, or the window is doubled.
+#  *
+#  * The document returned for an incremental extraction holds the parsed blocks,
+#  * not the merged ones, with the same content text (see getContent).
+#
+
+import difflib
+import hashlib
+import struct
+from . import document
+
+#
+#  * The hashes and content flags of the parsed blocks of a page, as returned by
+#  * extractIncremental for the next crawl of the page with the same extractor.
+#  * flags is None if the content could not be mapped to the parsed blocks, e.g.
+#  * because a filter split blocks.
+#
+class ExtractionRecord(object):
+	__slots__ = ("hashes", "flags", "rerunBlocks")
+
+	def __init__(self, hashes, flags):
+		#8 bytes per block
+		self.hashes = hashes
+		#"\1" per content block, "\0" per other block
+		self.flags = flags
+		#the blocks run through the filters for this record, all of them if it was
+		#extracted in full
+		self.rerunBlocks = None
+
+	def __len__(self): return len(self.hashes)//8
+
+	def getHashes(self):
+		hashes = self.hashes
+		return [hashes[i:i+8] for i in range(0, len(hashes), 8)]
+
+	def getFlags(self): return [flag == "\1" for flag in self.flags]
+
+	def toBytes(self):
+		flags = self.flags if self.flags != None else ""
+		return struct.pack("<IB", len(self), self.flags != None) + self.hashes + flags
+
+	@classmethod
+	def fromBytes(cls, data):
+		numBlocks, hasFlags = struct.unpack_from("<IB", data)
+		start = struct.calcsize("<IB")
+		hashes = data[start:start+8*numBlocks]
+		flags = data[start+8*numBlocks:] if hasFlags else None
+		if len(hashes) != 8*numBlocks or (flags != None and len(flags) != numBlocks): raise ValueError("truncated extraction record")
+		return cls(hashes, flags)
+
+#
+#  * The hash of a block: its text, and the counts and labels the filters may
+#  * look at, so that a block whose link or tag changed is not reused.
+#
+def getBlockHash(tb):
+	text = tb.getText()
+	if isinstance(text, unicode): text = text.encode("utf8")
+	labels = ",".join(sorted(tb.getLabels() or ()))
+	features = "%d %d %d %d %s" % (tb.numWordsInAnchorText, tb.numWrappedLines, tb.tagLevel, tb.numWordsInWrappedLines, labels)
+	return hashlib.md5(text+"\0"+features).digest()[:8]
+
+def packFlags(flags): return "".join("\1" if flag else "\0" for flag in flags)
+
+#
+#  * Extracts a page given the record of its previous extraction (or None), with
+#  * at least margin blocks around each change run through the filters. Returns
+#  * (doc, record), doc being None if the page cannot be parsed.
+#
+def extractIncremental(extractor, text, record=None, margin=4):
+	doc = extractor.parseDoc(text)
+	if doc == None: return (None, None)
+	textBlocks = doc.getTextBlocks()
+	hashes = [getBlockHash(tb) for tb in textBlocks]
+	if record != None and record.flags != None and extractor.filter.isStreamable():
+		update = updateFlags(extractor, doc, hashes, record, margin)
+		if update != None:
+			flags, rerunBlocks = update
+			document.setContentFlags(textBlocks, flags)
+			newRecord = ExtractionRecord("".join(hashes), packFlags(flags))
+			newRecord.rerunBlocks = rerunBlocks
+			return (doc, newRecord)
+	texts = [tb.getText() for tb in textBlocks]
+	offsets = [tb.offsetBlocksStart for tb in textBlocks]
+	if extractor.useLabelIndex: doc.enableLabelIndex()
+	extractor.filter.process(doc)
+	positions = document.getContentPositions(doc.getTextBlocks(), texts, offsets)
+	flags = None
+	if positions != None:
+		isContent = [False]*len(texts)
+		for pos in positions: isContent[pos] = True
+		flags = packFlags(isContent)
+	newRecord = ExtractionRecord("".join(hashes), flags)
+	newRecord.rerunBlocks = len(texts)
+	return (doc, newRecord)
+
+#
+#  * The content flags of the blocks of a parsed document, from those of the
+#  * record for the unchanged blocks and from the filters for the blocks around
+#  * the changed ones, and the number of blocks run through the filters; or None
+#  * if the whole document has to be filtered.
+#
+def updateFlags(extractor, doc, hashes, record, margin):
+	oldFlags = record.getFlags()
+	numBlocks = len(hashes)
+	reused = [None]*numBlocks
+	changes = []
+	matcher = difflib.SequenceMatcher(None, record.getHashes(), hashes, False)
+	for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+		if tag == "equal": reused[j1:j2] = oldFlags[i1:i2]
+		else: changes.append((j1, j2))
+	if not changes: return (reused, 0)
+	textBlocks = doc.getTextBlocks()
+	texts = [tb.getText() for tb in textBlocks]
+	offsets = [tb.offsetBlocksStart for tb in textBlocks]
+	while 4*margin < numBlocks:
+		flags = list(reused)
+		rerunBlocks = 0
+		for start, end in getWindows(changes, margin, numBlocks):
+			#the blocks from start to end take the flags of a window margin blocks
+			#wider, if those at its borders agree with the reused ones
+			first = max(start-margin, 0)
+			windowFlags = filterWindow(extractor, doc, textBlocks, texts, offsets, first, end+margin)
+			if windowFlags == None: return None
+			if not agrees(windowFlags, first, reused, start, end, margin, numBlocks): break
+			flags[max(start, 0):end] = windowFlags[max(start, 0)-first:end-first]
+			rerunBlocks += len(windowFlags)
+		else:
+			return (flags, rerunBlocks)
+		margin *= 2
+	return None
+
+#the ranges of blocks around the changes, merged if their windows overlap
+def getWindows(changes, margin, numBlocks):
+	windows = []
+	for j1, j2 in changes:
+		start, end = j1-margin, min(j2+margin, numBlocks)
+		if windows and start-windows[-1][1] < 2*margin: windows[-1] = (windows[-1][0], end)
+		else: windows.append((start, end))
+	return windows
+
+#
+#  * Runs the filters on clones of the blocks from start to end (end being clipped
+#  * to the document), returning their content flags, or None if the content is
+#  * not made of parsed blocks.
+#
+def filterWindow(extractor, doc, textBlocks, texts, offsets, start, end):
+	end = min(end, len(textBlocks))
+	window = document.TextDocument([tb.clone() for tb in textBlocks[start:end]], doc.getTitle())
+	if extractor.useLabelIndex: window.enableLabelIndex()
+	extractor.filter.process(window)
+	positions = document.getContentPositions(window.getTextBlocks(), texts[start:end], offsets[start:end])
+	if positions == None: return None
+	isContent = [False]*(end-start)
+	for pos in positions: isContent[pos] = True
+	return isContent
+
+#
+#  * Whether the unchanged blocks in the outer half of the margin on each side of
+#  * the blocks from start to end got the flags they had, i.e. the change did not
+#  * reach that far. The sides at the start and end of the document are not cut
+#  * by the window, so not checked. windowFlags starts at block first.
+#
+def agrees(windowFlags, first, reused, start, end, margin, numBlocks):
+	guard = max(margin//2, 1)
+	if start > 0:
+		for i in range(start, start+guard):
+			if windowFlags[i-first] != reused[i]: return False
+	if end < numBlocks:
+		for i in range(end-guard, end):
+			if windowFlags[i-first] != reused[i]: return False
+	return True
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+#
+#  * boilerpipe
+#  *
+#  * Copyright (c) 2009 Christian Kohlschtter
+#  *
+#  * The author licenses this file to You under the Apache License, Version 2.0
+#  * (the "License"); you may not use this file except in compliance with
+#  * the License.  You may obtain a copy of the License at
+#  *
+#  *	 http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#
+
+#
+#  * Module attributes which are created on first use, so that importing boilerpy
+#  * does not import every submodule, nor build every extractor.
+#  *
+#  * Python 2 modules cannot have a __getattr__, so a module calls install() at its
+#  * end, which replaces it in sys.modules by a {@link LazyModule} with the same
+#  * attributes plus the lazy ones.
+#
+
+import sys
+import types
+
+class LazyModule(types.ModuleType):
+	def __init__(self, module, factories):
+		types.ModuleType.__init__(self, module.__name__, module.__doc__)
+		self.__dict__.update(module.__dict__)
+		#the functions of the module keep using its dict, which python 2 clears
+		#when the module object is collected
+		self.__dict__["_lazyModule"] = module
+		self.__dict__["_lazyFactories"] = factories
+
+	def __getattr__(self, name):
+		factory = self._lazyFactories.get(name)
+		if factory == None: raise AttributeError("'module' object has no attribute %r" % name)
+		value = factory(self)
+		#the factory may have set it already, e.g. when importing a submodule
+		value = self.__dict__.setdefault(name, value)
+		self._lazyModule.__dict__[name] = value
+		return value
+
+	def __dir__(self):
+		return sorted(set(self.__dict__) | set(self._lazyFactories))
+
+	#whether an attribute was created already
+	def isLoaded(self, name): return name in self.__dict__
+
+#
+#  * Makes the attributes of the module called name lazy: factories maps each
+#  * attribute name to a function returning its value given the module, which is
+#  * called once, on first use. To be called last, as the attributes set after it
+#  * would not be seen. Returns the new module.
+#
+def install(name, factories):
+	module = LazyModule(sys.modules[name], factories)
+	sys.modules[name] = module
+	return module
+
+#returns a factory importing a submodule of a package
+def submodule(package, name):
+	return lambda module: __import__(package + "." + name, fromlist=[name])
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+#
+#  * boilerpipe
+#  *
+#  * Copyright (c) 2009 Christian Kohlschtter
+#  *
+#  * The author licenses this file to You under the Apache License, Version 2.0
+#  * (the "License"); you may not use this file except in compliance with
+#  * the License.  You may obtain a copy of the License at
+#  *
+#  *	 http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#
+
+#
+#  * Block classifiers using trained models, e.g. trained on the features written
+#  * by {@link export.FeatureExporter}.
+#  *
+#  * A model is a JSON file (or a dict) naming the block features it uses, in the
+#  * column names of export.py ("numWords", "prev.linkDensity", "next2.textDensity"...),
+#  * and one of:
+#  *
+#  *	{"type": "logistic", "features": [...], "weights": [...], "bias": b}
+#  *		score = bias + sum(weights[i] * features[i])
+#  *	{"type": "trees", "features": [...], "bias": b, "trees": [tree, ...]}
+#  *		score = bias + the sum of the leaf values of the trees, e.g. a
+#  *		gradient-boosted model. Each tree is given as arrays over its nodes,
+#  *		like scikit-learn's: {"feature": [...], "threshold": [...], "left": [...],
+#  *		"right": [...], "value": [...]}. Node 0 is the root; a node with left -1
+#  *		is a leaf, otherwise features[feature] <= threshold goes to left.
+#  *
+#  * A block is content when sigmoid(score) >= "threshold" (0.5 by default). The
+#  * model is compiled to Python code like the rules of {@link rules.RuleTree}, so
+#  * that a document, or a batch of documents, is scored in one call.
+#
+
+import json
+import math
+from . import filters
+from . import rules
+
+#
+#  * A filter classifying blocks with a model (a dict, or the path of a JSON file).
+#  * Can be used instead of {@link NumWordsRulesClassifier} in filter chains, and
+#  * with batch.processDocuments.
+#
+class LearnedBlockClassifier(filters.RuleClassifier):
+	def __init__(self, model):
+		filters.RuleClassifier.__init__(self, CompiledModel(model))
+		self.model = self.ruleTree.model
+
+#
+#  * A model compiled to Python code, with the functions of a {@link rules.RuleTree}.
+#
+class CompiledModel(object):
+	def __init__(self, model):
+		if isinstance(model, basestring): model = loadModel(model)
+		self.model = model
+		try:
+			features = [rules.parseFeatureName(name) for name in model["features"]]
+		except rules.RuleSyntaxError as e:
+			raise ValueError("invalid model: %s" % e)
+		self.window = max([abs(offset) for feature, offset in features] + [0])
+		blockExpr = lambda i: "%s.%s" % (rules.getBlockName(features[i][1]), features[i][0])
+		columnExpr = lambda i: rules.getVariableName(*features[i])
+		self.source = rules.getClassifierSource(getDecisionExpression(model, blockExpr), getDecisionExpression(model, columnExpr), sorted(set(features)))
+		self.classifyBlocks, self.classify, self.evaluateBatch = rules.compileClassifier(self.source, "<model>")
+
+def loadModel(path):
+	f = open(path)
+	try:
+		return json.load(f)
+	finally:
+		f.close()
+
+#
+#  * Returns the decision of a model as a Python expression; valueExpr(i) returns
+#  * the expression of the i-th feature of the model.
+#
+def getDecisionExpression(model, valueExpr):
+	modelType = model.get("type")
+	numFeatures = len(model["features"])
+	if modelType == "logistic":
+		weights = model["weights"]
+		if len(weights) != numFeatures: raise ValueError("invalid model: %d weights for %d features" % (len(weights), numFeatures))
+		terms = ["%r * %s" % (float(weight), valueExpr(i)) for i, weight in enumerate(weights) if weight != 0]
+	elif modelType == "trees":
+		terms = [getTreeExpression(tree, 0, numFeatures, valueExpr) for tree in model["trees"]]
+	else:
+		raise ValueError("unknown model type: %r" % modelType)
+	score = " + ".join(["%r" % float(model.get("bias", 0))] + terms)
+	return "%s >= %r" % (score, getScoreThreshold(model.get("threshold", 0.5)))
+
+#sigmoid(score) >= threshold, as a threshold on the score
+def getScoreThreshold(threshold):
+	if not 0 < threshold < 1: raise ValueError("invalid model: the threshold must be between 0 and 1")
+	return math.log(threshold / (1.0 - threshold))
+
+def getTreeExpression(tree, node, numFeatures, valueExpr):
+	left = tree["left"][node]
+	if left == -1: return "%r" % float(tree["value"][node])
+	feature = tree["feature"][node]
+	if not 0 <= feature < numFeatures: raise ValueError("invalid model: no feature %r" % feature)
+	return "(%s if %s <= %r else %s)" % (getTreeExpression(tree, left, numFeatures, valueExpr), valueExpr(feature), float(tree["threshold"][node]), getTreeExpression(tree, tree["right"][node], numFeatures, valueExpr))
@@ -17,8 +17,13 @@
 #  * limitations under the License.
 #  
 
-from HTMLParser import HTMLParser
-from xml.sax import ContentHandler
+from HTMLParser import HTMLParser, HTMLParseError, locatestarttagend, tagfind, attrfind, endtagfind, entityref, charref, incomplete, commentclose
+from xml.sax import ContentHandler, InputSource, make_parser
+from xml.sax.handler import feature_external_ges, feature_external_pes, feature_namespaces
+from htmlentitydefs import name2codepoint
+from cStringIO import StringIO
+import abc
+import threading
 from . import document
 from document import DefaultLabels
 import re
@@ -30,10 +35,24 @@ import re
 #----------------------------------------------------------------------------
 
 
+# 
+#  * Returns the value of the given attribute, or <code>None</code>. Accepts both SAX
+#  * attributes and the (name, value) list passed by {@link HTMLParser}.
+#  
+def getAttribute(attrs, name):
+	if attrs == None: return None
+	if hasattr(attrs, "get"): return attrs.get(name)
+	for attrName, value in attrs:
+		if attrName == name: return value
+	return None
+
+
 class TagAction(object):
 	def start(self, contentHandler, tagName, attrs): return False
 	def end(self, contentHandler, tagName): return False
 	def changesTagLevel(self): return False
+	#whether start() looks at the attributes; backends may skip parsing them otherwise
+	def needsAttributes(self): return True
 
 # 
 #  * Marks this tag as "ignorable", i.e. all its inner content is silently skipped.
@@ -51,6 +70,9 @@ class IgnorableElementTagAction(TagAction):
 	def changesTagLevel(self):
 		return True
 
+	def needsAttributes(self):
+		return False
+
 # 
 #  * Marks this tag as "anchor" (this should usually only be set for the <code>&lt;A&gt;</code> tag).
 #  * Anchor tags may not be nested.
@@ -81,6 +103,9 @@ class AnchorTextTagAction(TagAction):
 	def changesTagLevel(self):
 		return True
 
+	def needsAttributes(self):
+		return False
+
 # 
 #  * Marks this tag the body element (this should usually only be set for the <code>&lt;BODY&gt;</code> tag).
 #  
@@ -99,6 +124,9 @@ class BodyTagAction(TagAction):
 	def changesTagLevel(self):
 		return True
 
+	def needsAttributes(self):
+		return False
+
 # 
 #  * Marks this tag a simple "inline" element, which generates whitespace, but no new block.
 #  
@@ -113,6 +141,7 @@ class InlineWhitespaceTagAction(TagAction):
 		return False
 
 	def changesTagLevel(self): return False
+	def needsAttributes(self): return False
 
 # 
 #  * Marks this tag a simple "inline" element, which neither generates whitespace, nor a new block.
@@ -122,6 +151,7 @@ class InlineTagAction(TagAction):
 	def start(self, contentHandler, tagName, attrs): return False
 	def end(self, contentHandler, tagName): return False
 	def changesTagLevel(self): return False
+	def needsAttributes(self): return False
 
 # 
 #  * Explicitly marks this tag a simple "block-level" element, which always generates whitespace
@@ -131,6 +161,7 @@ class BlockTagAction(TagAction):
 	def start(self, contentHandler, tagName, attrs): return True
 	def end(self, contentHandler, tagName): return True
 	def changesTagLevel(self): return True
+	def needsAttributes(self): return False
 
 # 
 #  * Special TagAction for the <code>&lt;FONT&gt;</code> tag, which keeps track of the
@@ -143,21 +174,21 @@ class FontTagAction(TagAction):
 
 	def start(self, contentHandler, tagName, attrs):
 		""" generated source for method start """
-		sizeAttr = attrs.getValue("size")
-		size=None
+		sizeAttr = getAttribute(attrs, "size")
+		#the stack holds effective sizes, so its top is the size in effect
+		if len(contentHandler.fontSizeStack)>0: size=contentHandler.fontSizeStack[-1]
+		else: size=None
 		if sizeAttr != None:
-			match=PAT_FONT_SIZE.match(sizeAttr)
+			match=self.PAT_FONT_SIZE.match(sizeAttr)
 			if match!=None:
-				rel=match.group(0)
-				val=match.group(1)
+				rel=match.group(1)
+				val=int(match.group(2))
 				if len(rel)==0:
 					#  absolute
 					size = val
 				else:
-					#  relative
-					#last non-none element from stack, default 3
-					lastNonNone=(s for s in contentHandler.fontSizeStack[::-1] if s!=None)
-					prevSize=next(lastNonNone,3)
+					#  relative, default 3
+					prevSize=3 if size==None else size
 					if rel[0] == '+': size = prevSize + val
 					else: size = prevSize - val
 		contentHandler.fontSizeStack.append(size)
@@ -196,6 +227,9 @@ class InlineTagLabelAction(TagAction):
 		""" generated source for method changesTagLevel """
 		return False
 
+	def needsAttributes(self):
+		return False
+
 # 
 #  * {@link CommonTagActions} for block-level elements, which triggers some {@link LabelAction} on the generated
 #  * {@link TextBlock}.
@@ -221,6 +255,9 @@ class BlockTagLabelAction(TagAction):
 		""" generated source for method changesTagLevel """
 		return True
 
+	def needsAttributes(self):
+		return False
+
 
 class Chained(TagAction):
 
@@ -242,62 +279,148 @@ class Chained(TagAction):
 		""" generated source for method changesTagLevel """
 		return self.tagAction1.changesTagLevel() or self.tagAction2.changesTagLevel()
 
+	def needsAttributes(self):
+		return self.tagAction1.needsAttributes() or self.tagAction2.needsAttributes()
+
+
+# 
+#  * A node in the tree of markup label states. Each state holds the labels of
+#  * all open markup elements (its ancestors included) and the {@link LabelAction}
+#  * for a block directly inside it.
+#  
+class MarkupLabelState(object):
+	def __init__(self, ancestorLabels, labelAction):
+		self.ancestorLabels = ancestorLabels
+		self.labelAction = labelAction
+
 
+# 
+#  * Shared cache for {@link MarkupTagAction}s: interns label strings and maps
+#  * (parent state, tag name, class, id) to the resulting {@link MarkupLabelState},
+#  * so every distinct path is only computed once.
+#  
+class MarkupLabelCache(object):
+	MAX_SIZE = 100000
+	PAT_NUM = re.compile("[0-9]+")
+	PAT_SPACES = re.compile("[ ]+")
+
+	def __init__(self):
+		self.clear()
+
+	def clear(self):
+		self.labelPool = {}
+		self.elementLabels = {}
+		self.states = {}
+		self.root = MarkupLabelState(frozenset(), None)
+
+	def intern(self, label):
+		return self.labelPool.setdefault(label, label)
+
+	def getState(self, parent, tagName, classVal, id):
+		key = (parent, tagName, classVal, id)
+		state = self.states.get(key)
+		if state != None: return state
+		#open elements keep their states, so dropping the cache is harmless
+		if len(self.states) >= self.MAX_SIZE: self.clear()
+		labels = self.getElementLabels(tagName, classVal, id)
+		ancestors = parent.ancestorLabels
+		labelsWithAncestors = set(ancestors)
+		for l in labels:
+			for an in ancestors:
+				labelsWithAncestors.add(self.intern(an + " " + l))
+			labelsWithAncestors.add(l)
+		#the action carries the labels of the enclosing states too, which lets the
+		#parser reuse its set instead of building the union for every tag
+		if parent.labelAction != None: labelsWithAncestors.update(parent.labelAction.labels)
+		state = MarkupLabelState(ancestors.union(labels), LabelAction(frozenset(labelsWithAncestors)))
+		self.states[key] = state
+		return state
+
+	def getElementLabels(self, tagName, classVal, id):
+		key = (tagName, classVal, id)
+		labels = self.elementLabels.get(key)
+		if labels != None: return labels
+		
+		labels = [self.intern(DefaultLabels.MARKUP_PREFIX + tagName)]
+		if classVal != None:
+			classVal = self.PAT_NUM.sub("#",classVal).strip()
+		if classVal != None and len(classVal)>0:
+			vals = self.PAT_SPACES.split(classVal)
+			labels.append(self.intern(DefaultLabels.MARKUP_PREFIX + "." + ".".join(vals)))
+			if len(vals)>1:
+				for s in vals:
+					labels.append(self.intern(DefaultLabels.MARKUP_PREFIX + "." + s))
+		if id != None and len(id)>0:
+			id = self.PAT_NUM.sub("#",id)
+			labels.append(self.intern(DefaultLabels.MARKUP_PREFIX + "#" + id))
+		labels = tuple(labels)
+		self.elementLabels[key] = labels
+		return labels
+
+
+# 
+#  * Labels blocks with the tag name, class and id of every enclosing element
+#  * (prefixed with {@link DefaultLabels#MARKUP_PREFIX}), so that filters such as
+#  * {@link LabelFusion} can make use of the page structure.
+#  
 class MarkupTagAction(TagAction):
 	""" generated source for class MarkupTagAction """
 
-	def __init__(self, isBlockLevel):
+	def __init__(self, isBlockLevel, cache=None):
 		""" generated source for method __init__ """
 		super(MarkupTagAction, self).__init__()
 		self.isBlockLevel = isBlockLevel
-		self.labelStack = []
-
-	PAT_NUM = re.compile("[0-9]+")
+		if cache == None: cache = MarkupLabelCache()
+		self.cache = cache
 
 	def start(self, contentHandler, tagName, attrs):
 		""" generated source for method start """
-		labels = []
-		labels.append(DefaultLabels.MARKUP_PREFIX + tagName)
-		classVal = attrs.getValue("class")
-		if classVal != None and len(classVal)>0:
-			classVal = self.PAT_NUM.sub("#",classVal).strip()
-			vals = classVal.split(r"[ ]+")
-			labels.append(DefaultLabels.MARKUP_PREFIX + "." + classVal.replace(' ', '.'))
-			if len(vals)>1:
-				for s in vals:
-					labels.append(DefaultLabels.MARKUP_PREFIX + "." + s)
-		id = attrs.get("id")
-		if id != None and len(id)<0:
-			id = self.PAT_NUM.sub("#",id)
-			labels.append(DefaultLabels.MARKUP_PREFIX + "#" + id)
-		ancestors = self.getAncestorLabels()
-		labelsWithAncestors = []
-		for l in labels:
-			for an in ancestors:
-				labelsWithAncestors.append(an)
-				labelsWithAncestors.append(an + " " + l)
-			labelsWithAncestors.append(l)
-		contentHandler.addLabelAction(LabelAction(labelsWithAncestors))
-		self.labelStack.append(labels)
+		if tagName.upper() in VOID_ELEMENTS: return self.isBlockLevel
+		classVal = id = None
+		if hasattr(attrs, "get"):
+			classVal = attrs.get("class")
+			id = attrs.get("id")
+		else:
+			for attrName, value in attrs:
+				if attrName == "class": classVal = value
+				elif attrName == "id": id = value
+		stack = contentHandler.markupStateStack
+		parent = stack[-1] if len(stack)>0 else self.cache.root
+		state = self.cache.getState(parent, tagName, classVal, id)
+		contentHandler.addLabelAction(state.labelAction)
+		stack.append(state)
 		return self.isBlockLevel
 
 	def end(self, contentHandler, tagName):
 		""" generated source for method end """
-		self.labelStack.pop()
+		if tagName.upper() in VOID_ELEMENTS: return self.isBlockLevel
+		stack = contentHandler.markupStateStack
+		if len(stack)>0: stack.pop()
 		return self.isBlockLevel
 
 	def changesTagLevel(self):
 		""" generated source for method changesTagLevel """
 		return self.isBlockLevel
 
-	def getAncestorLabels(self):
-		""" generated source for method getAncestorLabels """
-		labelSet = set()
-		for labels in labelStack:
-			if labels == None:continue 
-			labelSet.update(labels)
-		return labelSet
 
+#elements which never have an end tag
+VOID_ELEMENTS = frozenset(["AREA", "BASE", "BR", "COL", "EMBED", "HR", "IMG", "INPUT", "KEYGEN", "LINK", "META", "PARAM", "SOURCE", "TRACK", "WBR"])
+#the elements whose end tag may be omitted, with the start tags which close them
+IMPLIED_END_ELEMENTS = {
+	"P": frozenset(["ADDRESS", "ARTICLE", "ASIDE", "BLOCKQUOTE", "DD", "DIV", "DL", "DT", "FIELDSET", "FIGURE", "FOOTER", "FORM", "H1", "H2", "H3", "H4", "H5", "H6", "HEADER", "HR", "LI", "MAIN", "NAV", "OL", "P", "PRE", "SECTION", "TABLE", "UL"]),
+	"LI": frozenset(["LI"]),
+	"DT": frozenset(["DT", "DD"]),
+	"DD": frozenset(["DT", "DD"]),
+	"TR": frozenset(["TR", "TBODY", "TFOOT"]),
+	"TD": frozenset(["TD", "TH", "TR", "TBODY", "TFOOT"]),
+	"TH": frozenset(["TD", "TH", "TR", "TBODY", "TFOOT"]),
+	"THEAD": frozenset(["TBODY", "TFOOT"]),
+	"TBODY": frozenset(["TBODY", "TFOOT"]),
+	"OPTION": frozenset(["OPTION", "OPTGROUP"]),
+	"OPTGROUP": frozenset(["OPTGROUP"]),
+	"RT": frozenset(["RT", "RP"]),
+	"RP": frozenset(["RT", "RP"]),
+}
 
 class CommonTagActions:
 	TA_IGNORABLE_ELEMENT=IgnorableElementTagAction()
@@ -343,6 +466,67 @@ defaultTagActionMap={
 
 
 
+# 
+#  * A tag action map which, in addition to the actions of the given map, labels
+#  * blocks using {@link MarkupTagAction}. Tags missing from the map are handled as
+#  * block-level elements, just like the parser does for the default map.
+#  
+class MarkupTagActionMap(dict):
+	def __init__(self, tagActions=None):
+		if tagActions == None: tagActions = defaultTagActionMap
+		self.cache = MarkupLabelCache()
+		self.defaultAction = MarkupTagAction(True, self.cache)
+		inlineAction = MarkupTagAction(False, self.cache)
+		for tagName, tagAction in tagActions.items():
+			#the content of ignorable elements never reaches a block
+			if isinstance(tagAction, IgnorableElementTagAction): self[tagName] = tagAction
+			else: self[tagName] = Chained(tagAction, inlineAction)
+
+	def get(self, tagName, default=None):
+		return dict.get(self, tagName, self.defaultAction)
+
+# 
+#  * A set of simple selectors -- tag names ("nav"), classes (".cookie-banner") and
+#  * ids ("#comments") -- naming elements whose whole subtree is skipped at parse
+#  * time, just like the content of ignorable elements.
+#  * 
+#  * @param selectors A list of selectors, or a string of comma-separated selectors.
+#  
+class IgnoreSelectors(object):
+	def __init__(self, selectors):
+		if isinstance(selectors, basestring): selectors = selectors.split(",")
+		tagNames = set()
+		classNames = set()
+		ids = set()
+		for selector in selectors:
+			selector = selector.strip()
+			if selector.startswith("."): classNames.add(selector[1:])
+			elif selector.startswith("#"): ids.add(selector[1:])
+			elif len(selector)>0: tagNames.add(selector.upper())
+		self.tagNames = frozenset(tagNames)
+		self.classNames = frozenset(classNames)
+		self.ids = frozenset(ids)
+		self.needsAttributes = len(classNames)>0 or len(ids)>0
+
+	# 
+	# 	 * Checks whether the element starts a subtree to be skipped.
+	# 	 * 
+	# 	 * @param tagName The upper-case tag name.
+	# 	 * @param attrs SAX attributes or the (name, value) list of {@link HTMLParser}.
+	# 	 
+	def matches(self, tagName, attrs):
+		if tagName in self.tagNames: return True
+		if not self.needsAttributes or not attrs: return False
+		if hasattr(attrs, "items"): attrs = attrs.items()
+		for attrName, value in attrs:
+			if value == None: continue
+			if attrName == "id":
+				if value in self.ids: return True
+			elif attrName == "class" and len(self.classNames)>0:
+				for className in value.split():
+					if className in self.classNames: return True
+		return False
+
 #----------------------------------------------------------------------------
 #                                LABEL ACTIONS
 #----------------------------------------------------------------------------
@@ -354,6 +538,8 @@ defaultTagActionMap={
 #  
 class LabelAction(object):
 	def __init__(self, *labels):
+		if len(labels)==1 and isinstance(labels[0], frozenset): labels=labels[0]
+		elif len(labels)==1 and isinstance(labels[0], (list, tuple, set)): labels=tuple(labels[0])
 		self.labels = labels
 
 	def addTo(self, textBlock):
@@ -400,6 +586,7 @@ class BoilerpipeBaseParser(object):
 	PAT_VALID_WORD_CHARACTER = re.compile(r"[^\W_]",re.UNICODE)
 #	PAT_WORD = re.compile(r"\ue00a?[\w]+",re.UNICODE)
 	PAT_WORD = re.compile(ur"\ue00a?[\w\"'\.,\!\@\-\:\;\$\?\(\)/]+",re.UNICODE)
+	EMPTY_LABEL_STATE = (frozenset(), ())
 	
 	""" generated source for class BoilerpipeHTMLContentHandler """
 	# 
@@ -410,11 +597,17 @@ class BoilerpipeBaseParser(object):
 	# 	 *			The {@link TagActionMap} to use, e.g.
 	# 	 *			{@link DefaultTagActionMap}.
 	# 	 
-	def __init__(self, tagActions=None):
+	def __init__(self, tagActions=None, ignoreSelectors=None):
 		""" generated source for method __init___0 """
 		#super(BoilerpipeHTMLContentHandler, self).__init__()
 		if tagActions==None: self.tagActions=defaultTagActionMap
 		else: self.tagActions = tagActions
+		if ignoreSelectors!=None and not isinstance(ignoreSelectors, IgnoreSelectors):
+			ignoreSelectors = IgnoreSelectors(ignoreSelectors)
+		self.ignoreSelectors = ignoreSelectors
+		#the open elements of a pruned subtree, outermost first, and their number
+		self.prunedTags = []
+		self.prunedDepth = 0
 
 
 		self.clearTextBuffer()
@@ -429,13 +622,20 @@ class BoilerpipeBaseParser(object):
 		self.currentContainedTextElements=set()
 		self.flush = False
 		self.inAnchorText = False
+		#whether blocks record the indexes of their text elements (see
+		#TextBlock.getContainedTextElements); if not, they get an empty frozenset
+		self.keepTextElements = True
 
 		self.title = None
 		self.tagLevel = 0
 		self.blockTagLevel = -1
 		self.textBlocks = []
+		#of all blocks flushed so far, handed to the TextDocument
+		self.statistics = document.TextDocumentStatistics()
 		self.labelStacks = []
+		self.labelStateStack = []
 		self.fontSizeStack = []
+		self.markupStateStack = []
 	
 	# 
 	# 	 * Recycles this instance.
@@ -455,13 +655,18 @@ class BoilerpipeBaseParser(object):
 		self.flush = False
 		self.inAnchorText = False
 		self.textBlocks=[]
+		self.statistics = document.TextDocumentStatistics()
 		
 		#--------- added -------
 		self.title = None
 		self.tagLevel = 0
 		self.blockTagLevel = -1
 		self.labelStacks = []
+		self.labelStateStack = []
 		self.fontSizeStack = []
+		self.markupStateStack = []
+		self.prunedTags = []
+		self.prunedDepth = 0
 
 
 #------------------------------- SAX Parser methods ----------------------------------------
@@ -476,9 +681,20 @@ class BoilerpipeBaseParser(object):
 
 	#  @Override
 	def startElement(self, name,attrs):
-		self.labelStacks.append([])
+		tagName = name.strip().upper()
+		if self.prunedDepth > 0:
+			if not self.startInPrunedElement(tagName): return
+			#the start tag closed the pruned element, and is one of its siblings
+			self.endPrunedElement(self.prunedName)
+		if self.ignoreSelectors != None and self.ignoreSelectors.matches(tagName, attrs):
+			self.startPrunedElement(name, tagName)
+			return
+		#void elements have no end tag to pop their level
+		if tagName not in VOID_ELEMENTS:
+			self.labelStacks.append([])
+			self.labelStateStack.append(self.getLabelState())
 		
-		tagAction = self.tagActions.get(name.strip().upper())
+		tagAction = self.tagActions.get(tagName)
 
 		if tagAction != None:
 			self.flush |= tagAction.start(self, name, attrs)
@@ -491,7 +707,17 @@ class BoilerpipeBaseParser(object):
 
 	#  @Override
 	def endElement(self, name):
-		tagAction = self.tagActions.get(name.strip().upper())
+		tagName = name.strip().upper()
+		if self.prunedDepth > 0:
+			prunedTags = self.prunedTags
+			if tagName in prunedTags:
+				del prunedTags[len(prunedTags)-1-prunedTags[::-1].index(tagName):]
+				self.prunedDepth = len(prunedTags)
+				if self.prunedDepth == 0: self.endPrunedElement(name)
+				return
+			#the end tag of an ancestor (or a stray one) closes the pruned element as well
+			self.endPrunedElement(self.prunedName)
+		tagAction = self.tagActions.get(tagName)
 
 		
 		if tagAction != None:
@@ -504,10 +730,13 @@ class BoilerpipeBaseParser(object):
 		if self.flush: self.flushBlock()
 		self.lastEvent = self.EVENT_END_TAG
 		self.lastEndTag = name
-		self.labelStacks.pop()
+		if tagName not in VOID_ELEMENTS:
+			self.labelStacks.pop()
+			self.labelStateStack.pop()
 
 	#  @Override
 	def characters(self, content):
+		if self.prunedDepth > 0: return
 		self.textElementIdx += 1
 		if self.flush:
 			self.flushBlock()
@@ -535,12 +764,73 @@ class BoilerpipeBaseParser(object):
 		if endWhitespace: self.addWhitespaceIfNecessary()
 		
 		self.lastEvent = self.EVENT_CHARACTERS
-		self.currentContainedTextElements.add(self.textElementIdx)
+		if self.keepTextElements: self.currentContainedTextElements.add(self.textElementIdx)
 
 	#  @Override
 	def ignorableWhitespace(self, whitespace):
+		if self.prunedDepth > 0: return
 		self.addWhitespaceIfNecessary()
 
+	# 
+	# 	 * Starts skipping the subtree of an element matched by the ignore selectors.
+	# 	 * Like an ignorable element, it separates the blocks before and after it.
+	# 	 
+	def startPrunedElement(self, name, tagName):
+		self.flush = True
+		self.lastEvent = self.EVENT_START_TAG
+		self.lastStartTag = name
+		#a void element has no subtree and no end tag
+		if tagName in VOID_ELEMENTS: return
+		self.prunedName = name
+		self.prunedTags = [tagName]
+		self.prunedDepth = 1
+
+	#
+	# 	 * Tracks a start tag within a pruned subtree. Elements whose end tag may be
+	# 	 * omitted (see IMPLIED_END_ELEMENTS) are closed by the start tags of their
+	# 	 * siblings. Returns whether the pruned element itself was closed.
+	#
+	def startInPrunedElement(self, tagName):
+		prunedTags = self.prunedTags
+		while prunedTags and tagName in IMPLIED_END_ELEMENTS.get(prunedTags[-1], ()): prunedTags.pop()
+		if not prunedTags:
+			self.prunedDepth = 0
+			return True
+		if tagName not in VOID_ELEMENTS: prunedTags.append(tagName)
+		self.prunedDepth = len(prunedTags)
+		return False
+
+	def endPrunedElement(self, name):
+		self.prunedTags = []
+		self.prunedDepth = 0
+		self.flush = True
+		self.flushBlock()
+		self.lastEvent = self.EVENT_END_TAG
+		self.lastEndTag = name
+
+	#
+	# 	 * Counts a text node whose content is dropped anyway, i.e. one inside an
+	# 	 * ignorable or pruned element, without handing over the text. Equivalent
+	# 	 * to calling {@link #characters} with it.
+	#
+	def skipCharacters(self):
+		if self.prunedDepth > 0: return
+		self.textElementIdx += 1
+		if self.flush:
+			self.flushBlock()
+			self.flush = False
+
+	#
+	# 	 * Checks whether {@link #startElement} needs the attributes of the given tag.
+	# 	 *
+	# 	 * @param tagName The upper-case tag name.
+	#
+	def needsAttributes(self, tagName):
+		if self.prunedDepth > 0: return False
+		if self.ignoreSelectors != None and self.ignoreSelectors.needsAttributes: return True
+		tagAction = self.tagActions.get(tagName)
+		return tagAction != None and tagAction.needsAttributes()
+
 #------------------------------- utility methods ----------------------------------------
 
 
@@ -592,23 +882,25 @@ class BoilerpipeBaseParser(object):
 		else:
 			numWordsInWrappedLines = numWords - numWordsCurrentLine
 
-		tb = document.TextBlock(self.textBuffer.strip(), self.currentContainedTextElements, numWords, numLinkedWords, numWordsInWrappedLines, numWrappedLines, self.offsetBlocks)
-		self.currentContainedTextElements = set()
+		if self.keepTextElements:
+			tb = document.TextBlock(self.textBuffer.strip(), self.currentContainedTextElements, numWords, numLinkedWords, numWordsInWrappedLines, numWrappedLines, self.offsetBlocks)
+			self.currentContainedTextElements = set()
+		else:
+			tb = document.TextBlock(self.textBuffer.strip(), frozenset(), numWords, numLinkedWords, numWordsInWrappedLines, numWrappedLines, self.offsetBlocks)
 		self.offsetBlocks += 1
 		self.clearTextBuffer()
 		tb.setTagLevel(self.blockTagLevel)
 		self.addTextBlock(tb)
+		self.statistics.addBlock(tb)
 		self.blockTagLevel = -1
 
 	def addTextBlock(self, tb):
 		""" generated source for method addTextBlock """
-		for fontSize in self.fontSizeStack[::-1]:
-			if fontSize != None:
-				tb.addLabel("font-" + str(fontSize))
-				break
-		for labelStack in self.labelStacks:
-			for labels in labelStack:
-					labels.addTo(tb)
+		if len(self.fontSizeStack)>0 and self.fontSizeStack[-1] != None:
+			tb.addLabel("font-" + str(self.fontSizeStack[-1]))
+		labels, conditionalActions = self.getLabelState()
+		if len(labels)>0: tb.addLabels(labels)
+		for la in conditionalActions: la.addTo(tb)
 		self.textBlocks.append(tb)
 
 
@@ -642,7 +934,9 @@ class BoilerpipeBaseParser(object):
 		""" generated source for method toTextDocument """
 		#  just to be sure
 		self.flushBlock()
-		return document.TextDocument(self.getTextBlocks(), self.getTitle())
+		doc = document.TextDocument(self.getTextBlocks(), self.getTitle())
+		doc.parseStatistics = self.statistics
+		return doc
 
 	def addWhitespaceIfNecessary(self):
 		""" generated source for method addWhitespaceIfNecessary """
@@ -662,27 +956,396 @@ class BoilerpipeBaseParser(object):
 
 	def addLabelAction(self, la):
 		""" generated source for method addLabelAction """
-		if len(self.labelStacks)==0: self.labelStacks.append([])
+		if len(self.labelStacks)==0:
+			self.labelStacks.append([])
+			self.labelStateStack.append(self.EMPTY_LABEL_STATE)
 		self.labelStacks[-1].append(la)
+		labels, conditionalActions = self.labelStateStack[-1]
+		if type(la) == LabelAction:
+			if type(la.labels) == frozenset and labels <= la.labels: labels = la.labels
+			else: labels = labels.union(la.labels)
+		else: conditionalActions = conditionalActions + (la,)
+		self.labelStateStack[-1] = (labels, conditionalActions)
+
+	# 
+	# 	 * Returns the labels of all {@link LabelAction}s currently on the stack, as a
+	# 	 * (labels, conditionalActions) tuple. Each stack level holds the accumulated
+	# 	 * state of its ancestors, so blocks share it until a tag changes it.
+	# 	 
+	def getLabelState(self):
+		if len(self.labelStateStack)==0: return self.EMPTY_LABEL_STATE
+		return self.labelStateStack[-1]
 
 
 
 
 class BoilerpipeHTMLParser(HTMLParser,BoilerpipeBaseParser):
-	def __init__(self):
+	def __init__(self, tagActions=None, ignoreSelectors=None):
 		HTMLParser.__init__(self)
-		BoilerpipeBaseParser.__init__(self)
+		BoilerpipeBaseParser.__init__(self, tagActions, ignoreSelectors)
 		
 	def feed(self,data):
 		self.startDocument()
 		HTMLParser.feed(self,data)
 		self.endDocument()
+
+	# 
+	# 	 * Parses a document given as an iterable of string chunks, yielding the
+	# 	 * {@link TextBlock}s as soon as they are flushed. Only the text after the last
+	# 	 * '<' of the data read so far is held back, so that text is never split and the
+	# 	 * blocks are the same as those of {@link #feed}. The blocks are not kept by the
+	# 	 * parser, and toTextDocument() is of no use afterwards.
+	# 	 
+	def parseStream(self, chunks):
+		self.startDocument()
+		pending = ''
+		for chunk in chunks:
+			pending += chunk
+			cut = pending.rfind('<')
+			if cut <= 0: continue
+			HTMLParser.feed(self, pending[:cut])
+			pending = pending[cut:]
+			for tb in self.drainTextBlocks(): yield tb
+		#unlike a single feed, a bogus "&#" only drops the rest of its own chunk here
+		HTMLParser.feed(self, pending)
+		self.endDocument()
+		for tb in self.drainTextBlocks(): yield tb
+
+	def recycle(self):
+		HTMLParser.reset(self)
+		BoilerpipeBaseParser.recycle(self)
+
+	def drainTextBlocks(self):
+		textBlocks = self.textBlocks
+		self.textBlocks = []
+		return textBlocks
 	
 	def handle_starttag(self, tag, attrs): self.startElement(tag,attrs)
 	def handle_endtag(self, tag): self.endElement(tag)
 	def handle_data(self, data): self.characters(data)
 
+# 
+#  * Drives a {@link BoilerpipeBaseParser} with the expat XML parser, which is a lot
+#  * faster than {@link HTMLParser} but only accepts well-formed documents such as
+#  * XHTML. Parse errors are raised as {@link SAXParseException}.
+#  * 
+#  * Unlike {@link BoilerpipeHTMLParser}, entity and character references are
+#  * resolved. HTML entities declared in an (unread) external DTD are resolved too.
+#  
 class BoilerpipeSAXContentHandler(ContentHandler,BoilerpipeBaseParser):
-	def __init__(self):
+	def __init__(self, tagActions=None, ignoreSelectors=None):
 		ContentHandler.__init__(self)
-		BoilerpipeBaseParser.__init__(self)
+		BoilerpipeBaseParser.__init__(self, tagActions, ignoreSelectors)
+		self.pendingCharacters = []
+
+	def feed(self, data):
+		xmlParser = make_parser()
+		xmlParser.setFeature(feature_namespaces, False)
+		xmlParser.setFeature(feature_external_ges, False)
+		xmlParser.setFeature(feature_external_pes, False)
+		xmlParser.setContentHandler(self)
+		source = InputSource()
+		if isinstance(data, unicode):
+			data = data.encode("utf-8")
+			source.setEncoding("utf-8")
+		source.setByteStream(StringIO(data))
+		self.pendingCharacters = []
+		xmlParser.parse(source)
+
+	def startDocument(self): BoilerpipeBaseParser.startDocument(self)
+
+	def endDocument(self):
+		self.flushCharacters()
+		BoilerpipeBaseParser.endDocument(self)
+
+	def startElement(self, name, attrs):
+		self.flushCharacters()
+		BoilerpipeBaseParser.startElement(self, name, attrs)
+
+	def endElement(self, name):
+		self.flushCharacters()
+		BoilerpipeBaseParser.endElement(self, name)
+
+	#expat splits text at newlines and references; like HTMLParser, hand it over in one piece
+	def characters(self, content):
+		self.pendingCharacters.append(content)
+
+	def ignorableWhitespace(self, whitespace):
+		self.pendingCharacters.append(whitespace)
+
+	def skippedEntity(self, name):
+		codepoint = name2codepoint.get(name)
+		if codepoint != None: self.pendingCharacters.append(unichr(codepoint))
+
+	def flushCharacters(self):
+		if len(self.pendingCharacters) == 0: return
+		content = u"".join(self.pendingCharacters)
+		self.pendingCharacters = []
+		BoilerpipeBaseParser.characters(self, content)
+
+# 
+#  * A cheap check whether a document claims to be XML -- it starts with an XML
+#  * declaration or uses the XHTML namespace -- and is worth trying with
+#  * {@link BoilerpipeSAXContentHandler}.
+#  
+PAT_XHTML_NAMESPACE = re.compile(r"""xmlns\s*=\s*["']http://www\.w3\.org/1999/xhtml["']""")
+
+def looksLikeXML(data):
+	head = data[:1024]
+	if isinstance(head, unicode): head = head.lstrip(u"\ufeff")
+	elif head.startswith("\xef\xbb\xbf"): head = head[3:]
+	if head.lstrip().startswith("<?xml"): return True
+	return PAT_XHTML_NAMESPACE.search(head) != None
+
+
+#----------------------------------------------------------------------------
+#                               PARSER BACKENDS
+#----------------------------------------------------------------------------
+
+# 
+#  * Turns a document into the startElement/endElement/characters events of a
+#  * {@link BoilerpipeBaseParser}. Backends must implement parse.
+#  
+class ParserBackend(object):
+	__metaclass__ = abc.ABCMeta
+
+	@abc.abstractmethod
+	def parse(self, data, contentHandler): pass
+
+class HTMLParserAdapter(HTMLParser):
+	def __init__(self, contentHandler):
+		HTMLParser.__init__(self)
+		self.contentHandler = contentHandler
+
+	def handle_starttag(self, tag, attrs): self.contentHandler.startElement(tag,attrs)
+	def handle_endtag(self, tag): self.contentHandler.endElement(tag)
+	def handle_data(self, data): self.contentHandler.characters(data)
+
+# 
+#  * The generic {@link HTMLParser} of the standard library, as used by
+#  * {@link BoilerpipeHTMLParser}.
+#  
+class HTMLParserBackend(ParserBackend):
+	def parse(self, data, contentHandler):
+		HTMLParserAdapter(contentHandler).feed(data)
+
+# 
+#  * A tokenizer producing only what boilerpipe needs. It finds tags the same way
+#  * {@link HTMLParser} does, so the events are the same, but:
+#  * - attributes are only parsed for tags whose {@link TagAction} looks at them
+#  * - text inside ignorable or pruned elements is counted but never sliced
+#  * - the content of SCRIPT and STYLE is skipped with a single search for the end tag
+#  * - comments, CDATA sections and declarations are skipped with find()
+#  * - no line and column bookkeeping
+#  * 
+#  * Like {@link BoilerpipeHTMLParser}, entity and character references are dropped
+#  * and an unterminated construct ends the document.
+#  
+class FastHTMLTokenizer(ParserBackend):
+	ASCII_LETTERS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+	#elements whose content is not markup
+	RAW_TEXT_END = {
+		"script" : re.compile(r"</\s*script\s*>", re.I),
+		"style" : re.compile(r"</\s*style\s*>", re.I)
+	}
+	PAT_DECL_NAME = re.compile(r"[a-zA-Z][-_.a-zA-Z0-9]*\s*")
+	PAT_MARKED_SECTION_END = re.compile(r"]\s*]\s*>")
+	PAT_MS_MARKED_SECTION_END = re.compile(r"]\s*>")
+	#for unescaping attribute values
+	unescaper = HTMLParser()
+
+	def parse(self, data, contentHandler):
+		n = len(data)
+		i = 0
+		nextTag = nextRef = -1
+		while i < n:
+			if nextTag < i:
+				nextTag = data.find("<", i)
+				if nextTag < 0: nextTag = n
+			if nextRef < i:
+				nextRef = data.find("&", i)
+				if nextRef < 0: nextRef = n
+			j = nextTag if nextTag < nextRef else nextRef
+			if i < j: self.handleText(data, i, j, contentHandler)
+			i = j
+			if i == n: break
+			if j == nextTag: i = self.parseMarkup(data, i, contentHandler)
+			else: i = self.parseReference(data, i, contentHandler)
+			if i < 0: break
+
+	def handleText(self, data, start, end, contentHandler):
+		if contentHandler.inIgnorableElement != 0 or contentHandler.prunedDepth > 0:
+			contentHandler.skipCharacters()
+		else:
+			contentHandler.characters(data[start:end])
+
+	# 
+	# 	 * Skips an entity or character reference at i, returning the position
+	# 	 * after it or -1 if parsing stops there.
+	# 	 
+	def parseReference(self, data, i, contentHandler):
+		if data.startswith("&#", i):
+			match = charref.match(data, i)
+			if match == None:
+				if data.find(";", i) >= 0: self.handleText(data, i, i+2, contentHandler)
+				return -1
+		else:
+			match = entityref.match(data, i)
+			if match == None:
+				if incomplete.match(data, i) != None or i+1 == len(data): return -1
+				self.handleText(data, i, i+1, contentHandler)
+				return i+1
+		k = match.end()
+		if data[k-1] != ";": k -= 1
+		return k
+
+	# 
+	# 	 * Handles the markup starting with the "&lt;" at i, returning the position
+	# 	 * after it or -1 if parsing stops there.
+	# 	 
+	def parseMarkup(self, data, i, contentHandler):
+		next = data[i+1:i+2]
+		if next == "": return -1
+		if next in self.ASCII_LETTERS: return self.parseStartTag(data, i, contentHandler)
+		if next == "/": return self.parseEndTag(data, i, contentHandler)
+		if data.startswith("<!--", i): return self.skipPast(commentclose, data, i+4)
+		if next == "?": return self.skipPastGt(data, i+2)
+		if next == "!":
+			if data.startswith("<![", i): return self.skipMarkedSection(data, i)
+			if data[i:i+9].lower() == "<!doctype": return self.skipPastGt(data, i+9)
+			return self.skipPastGt(data, i+2)
+		self.handleText(data, i, i+1, contentHandler)
+		return i+1
+
+	def skipPast(self, pattern, data, start):
+		match = pattern.search(data, start)
+		if match == None: return -1
+		return match.end()
+
+	def skipPastGt(self, data, start):
+		gt = data.find(">", start)
+		if gt < 0: return -1
+		return gt+1
+
+	def skipMarkedSection(self, data, i):
+		match = self.PAT_DECL_NAME.match(data, i+3)
+		if i+3 == len(data) or (match != None and match.end() == len(data)): return -1
+		if match == None: raise HTMLParseError("expected name token at %r" % data[i:i+20])
+		name = match.group().strip().lower()
+		if name in ("temp", "cdata", "ignore", "include", "rcdata"):
+			return self.skipPast(self.PAT_MARKED_SECTION_END, data, i+3)
+		if name in ("if", "else", "endif"):
+			return self.skipPast(self.PAT_MS_MARKED_SECTION_END, data, i+3)
+		raise HTMLParseError("unknown status keyword %r in marked section" % data[i+3:match.end()])
+
+	def parseStartTag(self, data, i, contentHandler):
+		j = locatestarttagend.match(data, i).end()
+		next = data[j:j+1]
+		if next == ">": endpos = j+1
+		elif data.startswith("/>", j): endpos = j+2
+		elif next == "" or next in self.ASCII_LETTERS or next in "=/": return -1
+		else:
+			#not a tag after all
+			self.handleText(data, i, j, contentHandler)
+			return j
+		match = tagfind.match(data, i+1)
+		tag = match.group(1).lower()
+		selfClosing = data[endpos-2] == "/"
+		#"/>" may also be the end of an unquoted attribute value
+		if selfClosing or contentHandler.needsAttributes(tag.upper()):
+			attrs, k = self.parseAttributes(data, match.end(), endpos)
+			end = data[k:endpos].strip()
+			if end not in (">", "/>"):
+				self.handleText(data, i, endpos, contentHandler)
+				return endpos
+			selfClosing = end == "/>"
+		else:
+			attrs = []
+		contentHandler.startElement(tag, attrs)
+		if selfClosing:
+			contentHandler.endElement(tag)
+			return endpos
+		rawTextEnd = self.RAW_TEXT_END.get(tag)
+		if rawTextEnd == None: return endpos
+		match = rawTextEnd.search(data, endpos)
+		if match == None: return -1
+		if match.start() > endpos: self.handleText(data, endpos, match.start(), contentHandler)
+		contentHandler.endElement(tag)
+		return match.end()
+
+	def parseAttributes(self, data, k, endpos):
+		attrs = []
+		while k < endpos:
+			match = attrfind.match(data, k)
+			if match == None: break
+			name, rest, value = match.group(1, 2, 3)
+			if not rest: value = None
+			elif value[:1] == "'" == value[-1:] or value[:1] == '"' == value[-1:]: value = value[1:-1]
+			if value: value = self.unescaper.unescape(value)
+			attrs.append((name.lower(), value))
+			k = match.end()
+		return attrs, k
+
+	def parseEndTag(self, data, i, contentHandler):
+		gt = data.find(">", i+1)
+		if gt < 0: return -1
+		match = endtagfind.match(data, i)
+		if match != None:
+			contentHandler.endElement(match.group(1).lower())
+			return gt+1
+		match = tagfind.match(data, i+2)
+		if match == None:
+			if data.startswith("</>", i): return i+3
+			return gt+1
+		contentHandler.endElement(match.group(1).lower())
+		return data.find(">", match.end())+1
+
+# 
+#  * A {@link BoilerpipeBaseParser} fed by a {@link ParserBackend}, by default the
+#  * {@link FastHTMLTokenizer}.
+#  
+class BoilerpipeParser(BoilerpipeBaseParser):
+	def __init__(self, backend=None, tagActions=None, ignoreSelectors=None):
+		BoilerpipeBaseParser.__init__(self, tagActions, ignoreSelectors)
+		if backend == None: backend = FastHTMLTokenizer()
+		self.backend = backend
+
+	def feed(self, data):
+		self.startDocument()
+		self.backend.parse(data, self)
+		self.endDocument()
+
+
+# 
+#  * Parsers kept for reuse, with a separate pool per thread: acquire() returns a
+#  * parser given back earlier, or a new one made by createParser(), and release()
+#  * recycles a parser and keeps it (up to maxSize per thread). created and reused
+#  * count the parsers acquired.
+#  
+class ParserPool(object):
+	def __init__(self, createParser, maxSize=2):
+		self.createParser = createParser
+		self.maxSize = maxSize
+		self.local = threading.local()
+		self.created = 0
+		self.reused = 0
+
+	def getFreeParsers(self):
+		try:
+			return self.local.parsers
+		except AttributeError:
+			self.local.parsers = []
+			return self.local.parsers
+
+	def acquire(self):
+		parsers = self.getFreeParsers()
+		if len(parsers) > 0:
+			self.reused += 1
+			return parsers.pop()
+		self.created += 1
+		return self.createParser()
+
+	def release(self, bpParser):
+		bpParser.recycle()
+		parsers = self.getFreeParsers()
+		if len(parsers) < self.maxSize: parsers.append(bpParser)
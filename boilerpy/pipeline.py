@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+#
+#  * boilerpipe
+#  *
+#  * Copyright (c) 2009 Christian Kohlschtter
+#  *
+#  * The author licenses this file to You under the Apache License, Version 2.0
+#  * (the "License"); you may not use this file except in compliance with
+#  * the License.  You may obtain a copy of the License at
+#  *
+#  *	 http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#
+
+#
+#  * Extraction of many pages by a pipeline of stages, each run by its own pool of
+#  * worker processes: parse (Extractor.parseDoc), filter (the filter chain of the
+#  * extractor) and serialize (to a JSON line). The stages are connected by
+#  * bounded queues, so that a slow stage holds the ones before it back instead of
+#  * piling documents up. Parsed documents travel as document.packDocument values,
+#  * filtered ones as their title and content texts.
+#  *
+#  * Parsing dominates for simple filter chains, filtering for heavy ones (e.g.
+#  * ARTICLE_SENTENCES_EXTRACTOR). The workers measure the CPU time each stage
+#  * takes per page, and every rebalanceInterval pages the pools are resized so that
+#  * the slowest stage gets the most workers, see getPoolSizes.
+#  *
+#  *	pipeline = ExtractionPipeline("ARTICLE_EXTRACTOR", workers=8)
+#  *	for line in pipeline.run((path, html) for ...): ...
+#  *
+#  * The JSON lines, {"key": ..., "title": ..., "content": ...} or {"key": ...,
+#  * "error": ...}, come in the order of the pages.
+#
+
+import json
+import threading
+import time
+import Queue
+from multiprocessing import Process, Queue as ProcessQueue, cpu_count
+from . import document
+from . import extractors
+
+STAGES = ("parse", "filter", "serialize")
+
+#
+#  * The number of workers of each stage, given the seconds each stage takes per
+#  * page: every stage gets one worker, and each further worker goes to the
+#  * stage which is then the slowest, i.e. with the most seconds per worker.
+#
+def getPoolSizes(costs, workers):
+	if workers < len(costs): raise ValueError("at least %d workers are needed" % len(costs))
+	sizes = [1]*len(costs)
+	for i in range(workers-len(costs)):
+		slowest = max(range(len(costs)), key=lambda stage: costs[stage]/sizes[stage])
+		sizes[slowest] += 1
+	return sizes
+
+class ExtractionPipeline(object):
+	#extractorName - the name of an extractor of extractors.py
+	#workers - the number of worker processes of all stages; by default the number of CPUs
+	#queueSize - how many pages may wait before each stage
+	#poolSizes - the number of workers of each stage, which disables rebalancing
+	#rebalanceInterval - resize the pools after this many pages
+	def __init__(self, extractorName="ARTICLE_EXTRACTOR", workers=None, queueSize=32, poolSizes=None, rebalanceInterval=100):
+		if not extractorName.endswith("_EXTRACTOR") or not hasattr(extractors, extractorName): raise ValueError("unknown extractor: %s" % extractorName)
+		if poolSizes != None:
+			if len(poolSizes) != len(STAGES) or min(poolSizes) < 1: raise ValueError("poolSizes needs a positive size per stage")
+			workers = sum(poolSizes)
+		elif workers == None:
+			workers = max(cpu_count(), len(STAGES))
+		self.extractorName = extractorName
+		self.workers = workers
+		self.queueSize = queueSize
+		self.initialPoolSizes = list(poolSizes or getPoolSizes([1.0]*len(STAGES), workers))
+		self.rebalanceInterval = rebalanceInterval if poolSizes == None else None
+		#seconds spent by each stage, and pages done, in total and since the last rebalance
+		self.stageTimes = [0.0]*len(STAGES)
+		self.pagesDone = 0
+		self.recentTimes = [0.0]*len(STAGES)
+		self.recentPages = 0
+		#the pool sizes after each rebalance
+		self.rebalances = []
+		self.poolSizes = None
+
+	#the average seconds per page of each stage
+	def getStageCosts(self):
+		return [t/max(self.pagesDone, 1) for t in self.stageTimes]
+
+	#
+	# 	 * Extracts (key, html) pairs, yielding their JSON lines in order. The worker
+	# 	 * processes run until all lines are yielded or the generator is closed.
+	#
+	def run(self, pages):
+		self.start()
+		finished = False
+		try:
+			for line in self.collect(pages): yield line
+			finished = True
+		finally:
+			self.stop(finished)
+
+	def start(self):
+		#the results are not bounded: the stages must never wait for this process,
+		#which may itself wait on a full queue when stopping workers
+		self.queues = [ProcessQueue(self.queueSize) for stage in STAGES] + [ProcessQueue()]
+		self.processes = [[] for stage in STAGES]
+		self.poolSizes = [0]*len(STAGES)
+		self.resize(self.initialPoolSizes)
+
+	def collect(self, pages):
+		feeder = Feeder(pages, self.queues[0])
+		feeder.start()
+		results = {}
+		nextSeq = 0
+		while not feeder.done or nextSeq < feeder.numPages:
+			try:
+				seq, line, times = self.queues[-1].get(True, 0.1)
+			except Queue.Empty:
+				self.checkWorkers()
+				if feeder.error != None: raise feeder.error
+				continue
+			self.addTimes(times)
+			results[seq] = line
+			while nextSeq in results:
+				yield results.pop(nextSeq)
+				nextSeq += 1
+		if feeder.error != None: raise feeder.error
+
+	def addTimes(self, times):
+		for stage, t in enumerate(times):
+			self.stageTimes[stage] += t
+			self.recentTimes[stage] += t
+		self.pagesDone += 1
+		self.recentPages += 1
+		if self.rebalanceInterval != None and self.recentPages >= self.rebalanceInterval:
+			self.resize(getPoolSizes(self.recentTimes, self.workers))
+			self.rebalances.append(list(self.poolSizes))
+			self.recentTimes = [0.0]*len(STAGES)
+			self.recentPages = 0
+
+	def resize(self, sizes):
+		for stage, size in enumerate(sizes):
+			for i in range(self.poolSizes[stage], size):
+				process = Process(target=runStage, args=(stage, self.extractorName, self.queues[stage], self.queues[stage+1]))
+				process.daemon = True
+				process.start()
+				self.processes[stage].append(process)
+			#a worker taking None from its queue exits, once the pages before it are done
+			for i in range(size, self.poolSizes[stage]): self.queues[stage].put(None)
+			self.poolSizes[stage] = size
+
+	def checkWorkers(self):
+		for processes in self.processes:
+			for process in processes:
+				if process.exitcode not in (None, 0): raise RuntimeError("a pipeline worker died with exit code %d" % process.exitcode)
+
+	def stop(self, finished):
+		if finished:
+			self.resize([0]*len(STAGES))
+			for processes in self.processes:
+				for process in processes: process.join()
+		else:
+			for processes in self.processes:
+				for process in processes: process.terminate()
+
+
+#puts the pages into the queue of the first stage, from a thread so that the
+#results can be taken meanwhile
+class Feeder(threading.Thread):
+	def __init__(self, pages, queue):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.pages = pages
+		self.queue = queue
+		self.numPages = 0
+		self.error = None
+		self.done = False
+
+	def run(self):
+		try:
+			for key, html in self.pages:
+				self.queue.put((self.numPages, key, None, html, ()))
+				self.numPages += 1
+		except Exception as e:
+			self.error = e
+		self.done = True
+
+
+#
+#  * The loop of a worker process of a stage. Items are (seq, key, error, value,
+#  * times), with the seconds taken by the stages so far; items with an error go
+#  * through the later stages untouched. The last stage puts (seq, line, times).
+#
+def runStage(stage, extractorName, inQueue, outQueue):
+	extractor = getattr(extractors, extractorName)
+	fn = STAGE_FUNCTIONS[stage]
+	last = stage == len(STAGES)-1
+	while True:
+		item = inQueue.get()
+		if item == None: break
+		seq, key, error, value, times = item
+		#CPU time, which workers waiting for a CPU do not inflate
+		start = time.clock()
+		if error == None or last:
+			try:
+				value = fn(extractor, key, value) if error == None else serializeError(key, error)
+			except Exception as e:
+				error = "%s: %s" % (e.__class__.__name__, e)
+				value = serializeError(key, error) if last else None
+		times += (time.clock()-start,)
+		outQueue.put((seq, value, times) if last else (seq, key, error, value, times))
+
+def parseStage(extractor, key, html):
+	doc = extractor.parseDoc(html, False)
+	if doc == None: raise ValueError("cannot parse the page")
+	return document.packDocument(doc)
+
+def filterStage(extractor, key, packed):
+	doc = document.unpackDocument(packed)
+	if extractor.useLabelIndex: doc.enableLabelIndex()
+	extractor.filter.process(doc)
+	return (doc.getTitle(), [tb.getText() for tb in doc.getTextBlocks() if tb.isContent()])
+
+def serializeStage(extractor, key, lean):
+	title, contentTexts = lean
+	return json.dumps({"key": key, "title": title, "content": "".join(text+'\n' for text in contentTexts)})
+
+def serializeError(key, error):
+	return json.dumps({"key": key, "error": error})
+
+STAGE_FUNCTIONS = (parseStage, filterStage, serializeStage)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+#
+#  * boilerpipe
+#  *
+#  * Copyright (c) 2009 Christian Kohlschtter
+#  *
+#  * The author licenses this file to You under the Apache License, Version 2.0
+#  * (the "License"); you may not use this file except in compliance with
+#  * the License.  You may obtain a copy of the License at
+#  *
+#  *	 http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#
+
+#
+#  * Decision trees over block features, compiled to Python code.
+#  *
+#  * A tree is either a leaf (True for content, False for boilerplate) or a
+#  * (condition, ifTrue, ifFalse) tuple. A condition compares a feature of a block
+#  * in the window around the classified block with a number, e.g.
+#  * "prev.linkDensity <= 0.555556". Blocks are named curr, prev and next, or
+#  * prevN and nextN for the block N positions before or after the current one.
+#  * Blocks outside the document look like {@link TextBlock#EMPTY_START}.
+#  *
+#  * Trees are compiled twice: to a function classifying the blocks of a document
+#  * one by one, with the block attributes inlined, and to a function evaluating
+#  * the tree on every row of a {@link BlockBatch} in one list comprehension.
+#
+
+import re
+
+#the block features which can be used in conditions, with their array typecodes (see batch.BlockBatch)
+FEATURE_TYPECODES = {
+	"numWords": 'i',
+	"numWordsInAnchorText": 'i',
+	"numWordsInWrappedLines": 'i',
+	"numWrappedLines": 'i',
+	"tagLevel": 'i',
+	"linkDensity": 'd',
+	"textDensity": 'd',
+}
+
+PAT_CONDITION = re.compile(r'^\s*((?:prev|curr|next)[0-9]*\.[a-zA-Z]+)\s*(<=|<|>=|>|==|!=)\s*(-?[0-9]+(?:\.[0-9]+)?)\s*$')
+PAT_FEATURE = re.compile(r'^(?:(prev|curr|next)([0-9]*)\.)?([a-zA-Z]+)$')
+
+#the negation of each comparison, which holds as features are never NaN
+NEGATED_OPS = {"<=": ">", "<": ">=", ">=": "<", ">": "<=", "==": "!=", "!=": "=="}
+
+class RuleSyntaxError(ValueError): pass
+
+#
+#  * A parsed condition: the feature of the block at offset (-1 for prev, 1 for
+#  * next) compared with a number. The number is kept as written, so that the
+#  * compiled code compares with exactly the same constant.
+#
+class Condition(object):
+	def __init__(self, text):
+		m = PAT_CONDITION.match(text)
+		if m == None: raise RuleSyntaxError("cannot parse condition: %r" % text)
+		name, self.op, self.threshold = m.groups()
+		self.feature, self.offset = parseFeatureName(name)
+
+	def getVariable(self): return getVariableName(self.feature, self.offset)
+
+#
+#  * Parses a feature name such as "numWords" (or "curr.numWords"), "prev.numWords"
+#  * or "next2.linkDensity", returning a (feature, offset) tuple.
+#
+def parseFeatureName(name):
+	m = PAT_FEATURE.match(name)
+	if m == None: raise RuleSyntaxError("cannot parse block feature: %r" % name)
+	block, distance, feature = m.groups()
+	if feature not in FEATURE_TYPECODES: raise RuleSyntaxError("unknown block feature %r in %r" % (feature, name))
+	if block == None or block == "curr":
+		if distance: raise RuleSyntaxError("curr takes no distance: %r" % name)
+		return feature, 0
+	distance = int(distance or 1)
+	if distance == 0: raise RuleSyntaxError("distance must be positive: %r" % name)
+	return feature, -distance if block == "prev" else distance
+
+#the name of a feature of the block at an offset in generated code, e.g. numWords_m1 for prev.numWords
+def getVariableName(feature, offset):
+	if offset == 0: return "%s_0" % feature
+	if offset < 0: return "%s_m%d" % (feature, -offset)
+	return "%s_p%d" % (feature, offset)
+
+#
+#  * A compiled decision tree. See the module comment for the tree format.
+#  *
+#  * window - the largest distance of a block the tree looks at
+#  * classifyBlocks(textBlocks, pad) - classifies a list of blocks, returns whether any changed
+#  * classify(prev, curr, next) - classifies curr, like the classifiers in filters.py
+#  *	(trees with a window of 1 only)
+#  * evaluateBatch(batch) - returns the decision for each row of a BlockBatch
+#
+class RuleTree(object):
+	def __init__(self, tree):
+		self.tree = tree
+		self.conditions = []
+		self.collectConditions(tree)
+		self.window = max([abs(cond.offset) for cond in self.conditions] + [0])
+		self.columns = sorted(set((cond.feature, cond.offset) for cond in self.conditions))
+		self.source = self.generateSource()
+		self.classifyBlocks, self.classify, self.evaluateBatch = compileClassifier(self.source, "<rules>")
+
+	def collectConditions(self, tree):
+		if isinstance(tree, bool): return
+		if not isinstance(tree, tuple) or len(tree) != 3: raise RuleSyntaxError("expected True, False or a (condition, ifTrue, ifFalse) tuple: %r" % (tree,))
+		cond = Condition(tree[0])
+		self.conditions.append(cond)
+		self.collectConditions(tree[1])
+		self.collectConditions(tree[2])
+
+	#
+	# 	 * Returns the tree as a Python expression; valueExpr(cond) returns the
+	# 	 * expression of the value compared by a condition.
+	#
+	def toExpression(self, tree, conditions, valueExpr):
+		if isinstance(tree, bool): return repr(tree)
+		cond = conditions.next()
+		test = "%s %s %s" % (valueExpr(cond), cond.op, cond.threshold)
+		negatedTest = "%s %s %s" % (valueExpr(cond), NEGATED_OPS[cond.op], cond.threshold)
+		ifTrue = self.toExpression(tree[1], conditions, valueExpr)
+		ifFalse = self.toExpression(tree[2], conditions, valueExpr)
+		#comparisons are booleans, so and/or give the same result as a conditional expression
+		if ifTrue == "True" and ifFalse == "False": return test
+		if ifTrue == "False" and ifFalse == "True": return negatedTest
+		if ifTrue == "True": return "(%s or %s)" % (test, ifFalse)
+		if ifFalse == "False": return "(%s and %s)" % (test, ifTrue)
+		if ifTrue == "False": return "(%s and %s)" % (negatedTest, ifFalse)
+		if ifFalse == "True": return "(%s or %s)" % (negatedTest, ifTrue)
+		return "(%s if %s else %s)" % (ifTrue, test, ifFalse)
+
+	def generateSource(self):
+		blockExpr = lambda cond: "%s.%s" % (getBlockName(cond.offset), cond.feature)
+		columnExpr = lambda cond: cond.getVariable()
+		return getClassifierSource(self.toExpression(self.tree, iter(self.conditions), blockExpr), self.toExpression(self.tree, iter(self.conditions), columnExpr), self.columns)
+
+
+#the name of the block at an offset in generated code
+def getBlockName(offset):
+	if offset == 0: return "curr"
+	if offset < 0: return "prev%d" % -offset
+	return "next%d" % offset
+
+#
+#  * Returns the source of the functions of a compiled classifier (see
+#  * {@link RuleTree}) deciding with a boolean expression, given once over the
+#  * blocks (named by getBlockName) and once over batch columns (named by
+#  * getVariableName). columns lists the (feature, offset) tuples used.
+#
+def getClassifierSource(blockExpression, columnExpression, columns):
+	window = max([abs(offset) for feature, offset in columns] + [0])
+	offsets = sorted(set([offset for feature, offset in columns] + [0]))
+	lines = []
+	# classifyBlocks: the blocks of a document, padded with EMPTY_START
+	names = ", ".join(getBlockName(offset) for offset in offsets)
+	slices = ", ".join("rows[%d:n+%d]" % (window+offset, window+offset) for offset in offsets)
+	lines.append("def classifyBlocks(textBlocks, pad):")
+	lines.append("\tn = len(textBlocks)")
+	lines.append("\trows = [pad]*%d + textBlocks + [pad]*%d" % (window, window))
+	lines.append("\tchanges = False")
+	lines.append("\tfor %s, in zip(%s):" % (names, slices))
+	lines.append("\t\tchanges |= curr.setIsContent(%s)" % blockExpression)
+	lines.append("\treturn changes")
+	if window <= 1:
+		lines.append("def classify(prev1, curr, next1):")
+		lines.append("\treturn curr.setIsContent(%s)" % blockExpression)
+	# evaluateBatch: one column per (feature, offset), shifted against the current row
+	lines.append("def evaluateBatch(batch):")
+	lines.append("\tif batch.padding < %d: raise ValueError('the classifier needs a batch padded with %d rows')" % (window, window))
+	lines.append("\tk = batch.padding")
+	lines.append("\tn = len(batch)")
+	for feature in sorted(set(feature for feature, offset in columns)):
+		lines.append("\tcolumn_%s = batch.getColumn(%r)" % (feature, feature))
+	if len(columns) == 0:
+		lines.append("\treturn [False]*k + [%s]*(n-2*k) + [False]*k" % columnExpression)
+	else:
+		variables = [getVariableName(feature, offset) for feature, offset in columns]
+		columnSlices = ["column_%s[k%+d:n-k%+d]" % (feature, offset, offset) for feature, offset in columns]
+		lines.append("\treturn [False]*k + [%s for %s, in zip(%s)] + [False]*k" % (columnExpression, ", ".join(variables), ", ".join(columnSlices)))
+	return "\n".join(lines) + "\n"
+
+#compiles the source of getClassifierSource, returning (classifyBlocks, classify, evaluateBatch)
+def compileClassifier(source, filename):
+	namespace = {}
+	exec compile(source, filename, "exec") in namespace
+	return namespace["classifyBlocks"], namespace.get("classify"), namespace["evaluateBatch"]
+
+
+compiledTrees = {}
+
+#returns the compiled RuleTree of a tree, compiling each tree once
+def getRuleTree(tree):
+	ruleTree = compiledTrees.get(tree)
+	if ruleTree == None:
+		ruleTree = RuleTree(tree)
+		compiledTrees[tree] = ruleTree
+	return ruleTree
+
+
+# NumWordsRulesClassifier
+NUM_WORDS_RULES = ("curr.linkDensity <= 0.333333",
+	("prev.linkDensity <= 0.555556",
+		("curr.numWords <= 16",
+			("next.numWords <= 15",
+				("prev.numWords <= 4", False, True),
+				True),
+			True),
+		("curr.numWords <= 40",
+			("next.numWords <= 17", False, True),
+			True)),
+	False)
+
+# DensityRulesClassifier
+DENSITY_RULES = ("curr.linkDensity <= 0.333333",
+	("prev.linkDensity <= 0.555556",
+		("curr.textDensity <= 9",
+			("next.textDensity <= 10",
+				("prev.textDensity <= 4", False, True),
+				True),
+			("next.textDensity == 0", False, True)),
+		("next.textDensity <= 11", False, True)),
+	False)
+
+# CanolaFilter: (curr.linkDensity > 0 and next.numWords > 11) or curr.numWords > 19 or
+# (next.numWords > 6 and next.linkDensity == 0 and prev.linkDensity == 0 and
+# (curr.numWords > 6 or prev.numWords > 7 or next.numWords > 19))
+CANOLA_COND3 = ("next.numWords > 6",
+	("next.linkDensity == 0",
+		("prev.linkDensity == 0",
+			("curr.numWords > 6", True,
+				("prev.numWords > 7", True,
+					("next.numWords > 19", True, False))),
+			False),
+		False),
+	False)
+CANOLA_RULES = ("curr.numWords > 19", True,
+	("curr.linkDensity > 0",
+		("next.numWords > 11", True, CANOLA_COND3),
+		CANOLA_COND3))
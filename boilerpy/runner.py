@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+#
+#  * boilerpipe
+#  *
+#  * Copyright (c) 2009 Christian Kohlschtter
+#  *
+#  * The author licenses this file to You under the Apache License, Version 2.0
+#  * (the "License"); you may not use this file except in compliance with
+#  * the License.  You may obtain a copy of the License at
+#  *
+#  *	 http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#
+
+#
+#  * Extraction of many files by several machines. Input manifests list one file
+#  * per line. The coordinator ({@link planLeases}) cuts them into leases of
+#  * consecutive lines, kept in a SQLite database on a filesystem all machines
+#  * share. Workers ({@link BatchWorker}) claim a lease at a time, extract its
+#  * files with a local process pool, and write one JSON line per file to
+#  * <output>/lease-<id>.jsonl, renamed into place once complete:
+#  *	{"path": ..., "title": ..., "content": ...} or {"path": ..., "error": ...}
+#  *
+#  * A claimed lease expires unless its worker renews it, so that the leases of
+#  * crashed workers are claimed again; after maxAttempts claims, a lease fails.
+#  * The worker claiming an expired lease removes the temporary output left by
+#  * the previous owner.
+#  * The clocks of the machines should agree to well within the lease duration.
+#  *
+#  *	python -m boilerpy batch-plan leases.db manifest.txt [--lease-size N]
+#  *	python -m boilerpy batch-work leases.db output/ [--extractor NAME] [--processes N]
+#  *	python -m boilerpy batch-status leases.db
+#
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from multiprocessing import Pool
+from . import extractors
+
+LEASE_PENDING = "pending"
+LEASE_CLAIMED = "claimed"
+LEASE_DONE = "done"
+LEASE_FAILED = "failed"
+LEASE_STATES = (LEASE_PENDING, LEASE_CLAIMED, LEASE_DONE, LEASE_FAILED)
+
+#
+#  * The leases in a SQLite database. A lease is a byte range of a manifest, so
+#  * that a worker reads its lines without scanning the manifest.
+#
+class LeaseStore(object):
+	def __init__(self, path, timeout=60):
+		self.path = path
+		#autocommit; transactions are started explicitly, see transaction()
+		self.connection = sqlite3.connect(path, timeout, isolation_level=None)
+		self.connection.execute("""CREATE TABLE IF NOT EXISTS leases (
+			id INTEGER PRIMARY KEY,
+			manifest TEXT NOT NULL,
+			start INTEGER NOT NULL,
+			end INTEGER NOT NULL,
+			numFiles INTEGER NOT NULL,
+			state TEXT NOT NULL,
+			owner TEXT,
+			expires REAL,
+			attempts INTEGER NOT NULL DEFAULT 0)""")
+		self.connection.execute("CREATE INDEX IF NOT EXISTS leasesByState ON leases (state, expires)")
+
+	def close(self): self.connection.close()
+
+	#runs fn(cursor) in a write transaction, which other connections wait for
+	def transaction(self, fn):
+		cursor = self.connection.cursor()
+		cursor.execute("BEGIN IMMEDIATE")
+		try:
+			result = fn(cursor)
+		except:
+			cursor.execute("ROLLBACK")
+			raise
+		cursor.execute("COMMIT")
+		return result
+
+	def addLeases(self, leases):
+		def add(cursor):
+			cursor.executemany("INSERT INTO leases (manifest, start, end, numFiles, state) VALUES (?, ?, ?, ?, ?)", [lease+(LEASE_PENDING,) for lease in leases])
+		self.transaction(add)
+
+	#
+	# 	 * Claims a pending lease, or an expired one, for duration seconds. Returns
+	# 	 * (id, manifest, start, end), or None if no lease is left to claim. Leases
+	# 	 * expiring after maxAttempts claims fail.
+	#
+	def claim(self, owner, duration, maxAttempts=3):
+		def claimLease(cursor):
+			now = time.time()
+			cursor.execute("UPDATE leases SET state=?, owner=NULL WHERE state=? AND expires<? AND attempts>=?", (LEASE_FAILED, LEASE_CLAIMED, now, maxAttempts))
+			cursor.execute("SELECT id, manifest, start, end FROM leases WHERE state=? OR (state=? AND expires<?) ORDER BY id LIMIT 1", (LEASE_PENDING, LEASE_CLAIMED, now))
+			row = cursor.fetchone()
+			if row == None: return None
+			cursor.execute("UPDATE leases SET state=?, owner=?, expires=?, attempts=attempts+1 WHERE id=?", (LEASE_CLAIMED, owner, now+duration, row[0]))
+			return tuple(row)
+		return self.transaction(claimLease)
+
+	#extends a claimed lease; returns False if the owner lost it
+	def renew(self, leaseId, owner, duration):
+		def renewLease(cursor):
+			cursor.execute("UPDATE leases SET expires=? WHERE id=? AND owner=? AND state=?", (time.time()+duration, leaseId, owner, LEASE_CLAIMED))
+			return cursor.rowcount == 1
+		return self.transaction(renewLease)
+
+	#marks a claimed lease done; returns False if the owner lost it
+	def complete(self, leaseId, owner):
+		def completeLease(cursor):
+			cursor.execute("UPDATE leases SET state=?, expires=NULL WHERE id=? AND owner=? AND state=?", (LEASE_DONE, leaseId, owner, LEASE_CLAIMED))
+			return cursor.rowcount == 1
+		return self.transaction(completeLease)
+
+	#returns the number of leases and of files per lease state
+	def getStatus(self):
+		status = dict((state, (0, 0)) for state in LEASE_STATES)
+		for state, numLeases, numFiles in self.connection.execute("SELECT state, COUNT(*), SUM(numFiles) FROM leases GROUP BY state"):
+			status[state] = (numLeases, numFiles)
+		return status
+
+
+#
+#  * Cuts manifests into leases of leaseSize files (blank lines are skipped) and
+#  * adds them to the store. Returns the number of leases added.
+#
+def planLeases(store, manifests, leaseSize=1000):
+	leases = []
+	for manifest in manifests:
+		manifest = os.path.abspath(manifest)
+		f = open(manifest, "rb")
+		start = offset = 0
+		numFiles = 0
+		for line in f:
+			offset += len(line)
+			if line.strip() == "": continue
+			numFiles += 1
+			if numFiles == leaseSize:
+				leases.append((manifest, start, offset, numFiles))
+				start = offset
+				numFiles = 0
+		f.close()
+		if numFiles > 0: leases.append((manifest, start, offset, numFiles))
+	store.addLeases(leases)
+	return len(leases)
+
+#the files of a lease; relative paths are relative to the directory of the manifest
+def readLeaseFiles(manifest, start, end):
+	f = open(manifest, "rb")
+	try:
+		f.seek(start)
+		lines = f.read(end-start).splitlines()
+	finally:
+		f.close()
+	directory = os.path.dirname(manifest)
+	return [os.path.join(directory, line.strip().decode("utf8")) for line in lines if line.strip() != ""]
+
+def getLeaseOutputName(leaseId): return "lease-%08d.jsonl" % leaseId
+
+
+#
+#  * Claims leases until none is left and extracts their files.
+#  *
+#  * extractorName - the name of an extractor of extractors.py
+#  * processes - the size of the local process pool; 1 extracts in this process
+#  * leaseDuration - seconds a lease is claimed for; it is renewed every
+#  *	leaseDuration/3 seconds while the files are extracted, by a LeaseHeartbeat,
+#  *	so that a slow file does not let the lease expire
+#
+class BatchWorker(object):
+	def __init__(self, store, outputDir, extractorName="ARTICLE_EXTRACTOR", processes=1, leaseDuration=600, maxAttempts=3):
+		if not extractorName.endswith("_EXTRACTOR") or not hasattr(extractors, extractorName): raise ValueError("unknown extractor: %s" % extractorName)
+		self.store = store
+		self.outputDir = outputDir
+		self.extractorName = extractorName
+		self.processes = processes
+		self.leaseDuration = leaseDuration
+		self.maxAttempts = maxAttempts
+		self.owner = "%s:%d:%s" % (socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+		self.leasesDone = 0
+		self.leasesLost = 0
+		self.filesDone = 0
+
+	#runs until no lease is left; returns the number of leases done
+	def run(self):
+		try:
+			os.makedirs(self.outputDir)
+		except OSError:
+			#made by another worker
+			if not os.path.isdir(self.outputDir): raise
+		pool = Pool(self.processes) if self.processes > 1 else None
+		try:
+			while True:
+				lease = self.store.claim(self.owner, self.leaseDuration, self.maxAttempts)
+				if lease == None: break
+				self.runLease(lease, pool)
+		finally:
+			if pool != None:
+				pool.terminate()
+				pool.join()
+		return self.leasesDone
+
+	def runLease(self, lease, pool):
+		leaseId, manifest, start, end = lease
+		paths = readLeaseFiles(manifest, start, end)
+		items = [(self.extractorName, path) for path in paths]
+		results = pool.imap(extractFile, items, 8) if pool != None else (extractFile(item) for item in items)
+		outputName = getLeaseOutputName(leaseId)
+		outputPath = os.path.join(self.outputDir, outputName)
+		tmpPath = "%s.%s.tmp" % (outputPath, self.owner.replace(":", "-"))
+		removeStaleOutput(self.outputDir, outputName)
+		heartbeat = LeaseHeartbeat(self.store.path, leaseId, self.owner, self.leaseDuration)
+		heartbeat.start()
+		f = open(tmpPath, "wb")
+		try:
+			for result in results:
+				f.write(json.dumps(result)+"\n")
+				if heartbeat.lost: return self.loseLease(f, tmpPath)
+			f.close()
+			heartbeat.stop()
+			#the output only appears complete, and only for the owner of the lease
+			if not self.store.renew(leaseId, self.owner, self.leaseDuration): return self.loseLease(f, tmpPath)
+			os.rename(tmpPath, outputPath)
+		except:
+			f.close()
+			removeFile(tmpPath)
+			raise
+		finally:
+			heartbeat.stop()
+		if self.store.complete(leaseId, self.owner):
+			self.leasesDone += 1
+			self.filesDone += len(paths)
+
+	def loseLease(self, f, tmpPath):
+		f.close()
+		#the worker which claimed the lease since may have removed it
+		removeFile(tmpPath)
+		self.leasesLost += 1
+
+
+#
+#  * Renews a lease every duration/3 seconds until stopped, from its own connection
+#  * to the database. lost is set once the lease was claimed by another worker.
+#
+class LeaseHeartbeat(threading.Thread):
+	def __init__(self, path, leaseId, owner, duration):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.path = path
+		self.leaseId = leaseId
+		self.owner = owner
+		self.duration = duration
+		self.stopped = threading.Event()
+		self.lost = False
+
+	def run(self):
+		store = LeaseStore(self.path)
+		try:
+			while not self.stopped.wait(self.duration/3.0):
+				try:
+					renewed = store.renew(self.leaseId, self.owner, self.duration)
+				except sqlite3.OperationalError:
+					#the database is busy; the lease lasts until the next try
+					continue
+				if not renewed:
+					self.lost = True
+					break
+		finally:
+			store.close()
+
+	def stop(self):
+		self.stopped.set()
+		self.join()
+
+#removes the temporary outputs of a lease, written by workers which lost it
+def removeStaleOutput(outputDir, outputName):
+	for name in os.listdir(outputDir):
+		if name.startswith(outputName+".") and name.endswith(".tmp"): removeFile(os.path.join(outputDir, name))
+
+def removeFile(path):
+	try:
+		os.remove(path)
+	except OSError:
+		if os.path.exists(path): raise
+
+
+#extracts a file in a worker process; errors are returned in the result
+def extractFile(item):
+	extractorName, path = item
+	try:
+		doc = getattr(extractors, extractorName).getDocFromFile(path)
+		return {"path": path, "title": doc.getTitle(), "content": doc.getContent()}
+	except Exception as e:
+		return {"path": path, "error": "%s: %s" % (e.__class__.__name__, e)}
+
+#reads the results written by workers, in lease order
+def readResults(outputDir):
+	for name in sorted(os.listdir(outputDir)):
+		if not name.startswith("lease-") or not name.endswith(".jsonl"): continue
+		f = open(os.path.join(outputDir, name), "rb")
+		for line in f: yield json.loads(line)
+		f.close()
+
+
+def main(command, argv):
+	import argparse
+	argParser = argparse.ArgumentParser(prog="python -m boilerpy " + command)
+	argParser.add_argument("db", help="the SQLite database of the leases, on a filesystem shared by the workers")
+	if command == "batch-plan":
+		argParser.add_argument("manifests", nargs="+", help="files listing one input file per line")
+		argParser.add_argument("--lease-size", type=int, default=1000, help="files per lease")
+	elif command == "batch-work":
+		argParser.add_argument("output", help="the directory of the results")
+		argParser.add_argument("--extractor", default="ARTICLE_EXTRACTOR")
+		argParser.add_argument("--processes", type=int, default=1)
+		argParser.add_argument("--lease-duration", type=float, default=600, help="seconds before the lease of a silent worker expires")
+	args = argParser.parse_args(argv)
+	store = LeaseStore(args.db)
+	try:
+		if command == "batch-plan":
+			print "%d leases added" % planLeases(store, args.manifests, args.lease_size)
+		elif command == "batch-work":
+			worker = BatchWorker(store, args.output, args.extractor, args.processes, args.lease_duration)
+			worker.run()
+			print "%d leases, %d files done by %s" % (worker.leasesDone, worker.filesDone, worker.owner)
+		else:
+			for state, (numLeases, numFiles) in sorted(store.getStatus().items()):
+				print "%-8s %8d leases %10d files" % (state, numLeases, numFiles or 0)
+	finally:
+		store.close()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+#
+#  * boilerpipe
+#  *
+#  * Copyright (c) 2009 Christian Kohlschtter
+#  *
+#  * The author licenses this file to You under the Apache License, Version 2.0
+#  * (the "License"); you may not use this file except in compliance with
+#  * the License.  You may obtain a copy of the License at
+#  *
+#  *	 http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#
+
+#
+#  * A small HTTP server extracting pages with a pool of worker processes, so that
+#  * several services can share warm extractors. Run it with
+#  *	python -m boilerpy serve --port 8080
+#  *
+#  * POST /extract with the HTML as the body, or GET /extract?url=... to have the
+#  * page fetched by the worker. Only http and https urls are fetched, and none
+#  * with allowUrls=False (--no-urls): the urls reach whatever the server can,
+#  * including services of its own network. The extractor parameter names the extractor
+#  * (ARTICLE_EXTRACTOR by default). The response is a JSON object:
+#  *	{"title": ..., "content": ..., "extractor": ..., "parsePath": ...,
+#  *	 "timings": {"queue": ..., "fetch": ..., "parse": ..., "filter": ..., "total": ...}}
+#  * with the timings in seconds. Errors are JSON objects with an "error" message.
+#  *
+#  * At most workers+queueSize requests are accepted at a time; the others get a
+#  * 429 right away. Requests not done within requestTimeout, and requests made
+#  * while the server shuts down, get a 503. Connections are kept alive (HTTP/1.1).
+#  * A request which timed out keeps its slot until its worker is done with it,
+#  * or for orphanTimeout seconds: the task of a worker which died (killed for
+#  * its memory, crashed in a C extension) is lost, and never finishes.
+#  *
+#  * GET /health returns {"status": "ok", "workers": ..., "pending": ...}.
+#
+
+import json
+import signal
+import sys
+import threading
+import time
+import urlparse
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from multiprocessing import Pool, TimeoutError
+from . import extractors
+
+DEFAULT_EXTRACTOR = "ARTICLE_EXTRACTOR"
+#the schemes of the urls fetched by GET /extract?url=..., not file: and the like
+URL_SCHEMES = frozenset(["http", "https"])
+
+#the names of the extractors of extractors.py, e.g. ARTICLE_EXTRACTOR
+def getExtractorNames():
+	return [name for name in dir(extractors) if name.endswith("_EXTRACTOR")]
+
+class ExtractionServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+	#address - (host, port) to listen on; port 0 picks a free port, see server_address
+	#workers - the number of worker processes, forked before listening
+	#queueSize - how many requests may wait for a worker
+	#requestTimeout - seconds after which a request gets a 503
+	#fetchTimeout - seconds to wait for a page when given a url
+	#maxBodySize - the largest accepted request body, in bytes
+	#allowUrls - whether GET /extract?url=... fetches pages, or answers 403
+	#orphanTimeout - seconds after which a request which timed out gives its slot
+	#  back, even though its worker did not finish it
+	def __init__(self, address=("127.0.0.1", 8080), workers=2, queueSize=16, requestTimeout=30, fetchTimeout=10, maxBodySize=10*1024*1024, allowUrls=True, orphanTimeout=60):
+		self.extractorNames = frozenset(getExtractorNames())
+		self.allowUrls = allowUrls
+		self.workers = workers
+		self.requestTimeout = requestTimeout
+		self.fetchTimeout = fetchTimeout
+		self.maxBodySize = maxBodySize
+		self.orphanTimeout = orphanTimeout
+		self.slots = threading.Semaphore(workers+queueSize)
+		self.pendingLock = threading.Lock()
+		self.pending = 0
+		#(AsyncResult, deadline) of the requests which timed out, holding a slot
+		self.orphans = []
+		self.closing = False
+		self.pool = Pool(workers, initWorker)
+		try:
+			HTTPServer.__init__(self, address, ExtractionRequestHandler)
+		except:
+			self.pool.terminate()
+			raise
+
+	#
+	# 	 * Hands a page to the pool: returns the AsyncResult of extractInWorker, or
+	# 	 * None if all workers and queue slots are taken. The slot is given back
+	# 	 * with release once the result is got, or with orphan if it timed out.
+	#
+	def submit(self, name, html, url):
+		self.reclaimOrphans()
+		if not self.slots.acquire(False): return None
+		self.addPending(1)
+		return self.pool.apply_async(extractInWorker, (name, html, url, self.fetchTimeout, time.time()))
+
+	def release(self):
+		self.addPending(-1)
+		self.slots.release()
+
+	def orphan(self, asyncResult):
+		with self.pendingLock: self.orphans.append((asyncResult, time.time()+self.orphanTimeout))
+
+	#gives back the slots of the orphans which are done, or waited for long enough
+	def reclaimOrphans(self):
+		now = time.time()
+		with self.pendingLock:
+			kept = [(result, deadline) for result, deadline in self.orphans if not result.ready() and deadline > now]
+			numReclaimed = len(self.orphans)-len(kept)
+			self.orphans = kept
+		for i in range(numReclaimed): self.release()
+
+	def addPending(self, n):
+		with self.pendingLock: self.pending += n
+
+	def server_close(self):
+		self.closing = True
+		HTTPServer.server_close(self)
+		self.pool.terminate()
+		self.pool.join()
+
+
+class ExtractionRequestHandler(BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+	server_version = "BoilerPy"
+	#seconds an idle keep-alive connection stays open
+	timeout = 30
+	#send each response in one piece, without waiting for the ack of the previous
+	#one -- on kept-alive connections, Nagle's algorithm delays responses by ~40 ms
+	wbufsize = -1
+	disable_nagle_algorithm = True
+
+	def do_GET(self):
+		path, params = self.parseRequestPath()
+		if path == "/health":
+			self.server.reclaimOrphans()
+			self.sendJSON(200, {"status": "closing" if self.server.closing else "ok", "workers": self.server.workers, "pending": self.server.pending})
+		elif path == "/extract":
+			url = params.get("url")
+			if url == None: return self.sendError(400, "missing url parameter")
+			if not self.server.allowUrls: return self.sendError(403, "fetching urls is disabled")
+			if urlparse.urlsplit(url).scheme.lower() not in URL_SCHEMES: return self.sendError(400, "only http and https urls are fetched: %s" % url)
+			self.extract(params, None, url)
+		else:
+			self.sendError(404, "not found: %s" % path)
+
+	def do_POST(self):
+		path, params = self.parseRequestPath()
+		try:
+			length = int(self.headers.getheader("content-length"))
+		except (TypeError, ValueError):
+			return self.sendError(411, "a Content-Length is required", False)
+		if length > self.server.maxBodySize: return self.sendError(413, "the body is larger than %d bytes" % self.server.maxBodySize, False)
+		body = self.rfile.read(length)
+		if path != "/extract": return self.sendError(404, "not found: %s" % path)
+		self.extract(params, self.decodeBody(body), None)
+
+	def extract(self, params, html, url):
+		start = time.time()
+		name = params.get("extractor", DEFAULT_EXTRACTOR)
+		if name not in self.server.extractorNames: return self.sendError(400, "unknown extractor: %s" % name)
+		if self.server.closing: return self.sendError(503, "the server is shutting down")
+		asyncResult = self.server.submit(name, html, url)
+		if asyncResult == None: return self.sendError(429, "too many requests")
+		try:
+			status, result = asyncResult.get(self.server.requestTimeout)
+		except TimeoutError:
+			self.server.orphan(asyncResult)
+			return self.sendError(503, "the request timed out")
+		except:
+			self.server.release()
+			raise
+		self.server.release()
+		if status != 200: return self.sendError(status, result)
+		result["extractor"] = name
+		result["timings"]["total"] = time.time()-start
+		self.sendJSON(200, result)
+
+	def parseRequestPath(self):
+		parts = urlparse.urlsplit(self.path)
+		return parts.path, dict(urlparse.parse_qsl(parts.query))
+
+	def decodeBody(self, body):
+		contentType = self.headers.getheader("content-type") or ""
+		encoding = "utf8"
+		if "charset=" in contentType: encoding = contentType.split("charset=")[1].split(";")[0].strip()
+		try:
+			return body.decode(encoding)
+		except (UnicodeDecodeError, LookupError):
+			return body
+
+	def sendError(self, status, message, keepAlive=True):
+		#without reading the body of a request, the connection cannot be reused
+		if not keepAlive: self.close_connection = 1
+		self.sendJSON(status, {"error": message})
+
+	def sendJSON(self, status, obj):
+		data = json.dumps(obj)
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(data)))
+		if self.close_connection: self.send_header("Connection", "close")
+		self.end_headers()
+		self.wfile.write(data)
+
+	def log_message(self, format, *args): pass
+
+
+#
+#  * Runs in the worker processes: builds every extractor once, so that the
+#  * first requests do not pay for it.
+#
+def initWorker():
+	#Ctrl-C stops the server, which terminates the workers
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	for name in getExtractorNames(): getattr(extractors, name)
+
+#
+#  * Extracts a page in a worker process. Returns (200, result) or (status, error
+#  * message); never raises.
+#
+def extractInWorker(name, html, url, fetchTimeout, submitted):
+	try:
+		start = time.time()
+		timings = {"queue": start-submitted, "fetch": 0.0}
+		extractor = getattr(extractors, name)
+		if url != None:
+			try:
+				html = extractor.readFromUrl(url, fetchTimeout)
+			except Exception as e:
+				return 502, "cannot fetch %s: %s" % (url, e)
+			timings["fetch"] = time.time()-start
+		t = time.time()
+		doc = extractor.parseDoc(html)
+		timings["parse"] = time.time()-t
+		if doc == None: return 422, "cannot parse the page"
+		t = time.time()
+		if extractor.useLabelIndex: doc.enableLabelIndex()
+		extractor.filter.process(doc)
+		timings["filter"] = time.time()-t
+		return 200, {"title": doc.getTitle(), "content": doc.getContent(), "parsePath": doc.parsePath, "timings": timings}
+	except Exception as e:
+		return 500, "%s: %s" % (e.__class__.__name__, e)
+
+
+def main(argv):
+	import argparse
+	argParser = argparse.ArgumentParser(prog="python -m boilerpy serve", description="Serves the extractors of boilerpy over HTTP.")
+	argParser.add_argument("--host", default="127.0.0.1")
+	argParser.add_argument("--port", type=int, default=8080)
+	argParser.add_argument("--workers", type=int, default=2, help="worker processes")
+	argParser.add_argument("--queue-size", type=int, default=16, help="requests waiting for a worker before answering 429")
+	argParser.add_argument("--timeout", type=float, default=30, help="seconds before answering 503")
+	argParser.add_argument("--no-urls", action="store_true", help="answer 403 to GET /extract?url=... instead of fetching pages")
+	args = argParser.parse_args(argv)
+	server = ExtractionServer((args.host, args.port), args.workers, args.queue_size, args.timeout, allowUrls=not args.no_urls)
+	print "Serving on http://%s:%d/" % server.server_address
+	sys.stdout.flush()
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
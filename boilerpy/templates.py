@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#
+#  * boilerpipe
+#  *
+#  * Copyright (c) 2009 Christian Kohlschtter
+#  *
+#  * The author licenses this file to You under the Apache License, Version 2.0
+#  * (the "License"); you may not use this file except in compliance with
+#  * the License.  You may obtain a copy of the License at
+#  *
+#  *	 http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#
+
+#
+#  * The template blocks of web sites: navigation, footers, sidebars... whose text
+#  * is the same on most pages of a host. A {@link TemplateIndex} counts, per host,
+#  * the pages each block text was seen on, after the same block (see
+#  * getBlockHashes). Given to an Extractor, it learns from every page extracted
+#  * with a host (see Extractor.getDoc), and once a host has minPages pages, the
+#  * blocks seen on at least threshold of them are labeled STRICTLY_NOT_CONTENT
+#  * and dropped from the document before the filters run.
+#  *
+#  * Dropping blocks changes what the filters see around the remaining ones, so
+#  * the content of a page may differ slightly from that extracted without the
+#  * index; with drop=False, the blocks are only labeled (see
+#  * LabelToBoilerplateFilter).
+#
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from .document import DefaultLabels
+
+#
+#  * Block counts of many hosts, in bounded memory: at most maxHosts hosts, the
+#  * least recently used being evicted, and at most maxBlocksPerHost block texts
+#  * per host, the least frequent half being forgotten when full.
+#
+class TemplateIndex(object):
+	def __init__(self, threshold=0.5, minPages=20, maxHosts=1000, maxBlocksPerHost=2000, drop=True):
+		if not 0 < threshold <= 1: raise ValueError("the threshold must be between 0 and 1")
+		self.threshold = threshold
+		self.minPages = minPages
+		self.maxHosts = maxHosts
+		self.maxBlocksPerHost = maxBlocksPerHost
+		self.drop = drop
+		#host -> HostTemplate, least recently used first
+		self.hosts = OrderedDict()
+		self.blocksDropped = 0
+
+	def __len__(self): return len(self.hosts)
+
+	def getHostTemplate(self, host):
+		template = self.hosts.pop(host, None)
+		if template == None:
+			template = HostTemplate()
+			while len(self.hosts) >= self.maxHosts: self.hosts.popitem(False)
+		self.hosts[host] = template
+		return template
+
+	#
+	# 	 * Labels (and drops) the template blocks of a parsed document of a host,
+	# 	 * then counts its blocks. Returns the number of template blocks.
+	#
+	def process(self, doc, host):
+		template = self.getHostTemplate(host)
+		textBlocks = doc.getTextBlocks()
+		hashes = getBlockHashes(textBlocks)
+		isTemplate = [False]*len(textBlocks)
+		if template.numPages >= self.minPages:
+			minCount = self.threshold*template.numPages
+			counts = template.counts
+			for i, h in enumerate(hashes):
+				if h != None and counts.get(h, 0) >= minCount:
+					isTemplate[i] = True
+					textBlocks[i].addLabel(DefaultLabels.STRICTLY_NOT_CONTENT)
+		template.add(set(h for h in hashes if h != None), self.maxBlocksPerHost)
+		numTemplate = sum(isTemplate)
+		if self.drop and numTemplate > 0:
+			doc.setTextBlocks([tb for tb, flag in zip(textBlocks, isTemplate) if not flag])
+			self.blocksDropped += numTemplate
+		return numTemplate
+
+	#the hashes of the template blocks of a host, see getBlockHashes
+	def getTemplateHashes(self, host):
+		template = self.hosts.get(host)
+		if template == None or template.numPages < self.minPages: return set()
+		minCount = self.threshold*template.numPages
+		return set(h for h, count in template.counts.iteritems() if count >= minCount)
+
+	#writes the counts to a JSON file, replacing it at once
+	def save(self, path):
+		data = {"hosts": [[host, template.numPages, template.counts.items()] for host, template in self.hosts.iteritems()]}
+		tmpPath = path + ".tmp"
+		f = open(tmpPath, "w")
+		try:
+			json.dump(data, f)
+		finally:
+			f.close()
+		os.rename(tmpPath, path)
+
+	#
+	# 	 * Reads the counts written by save(), keeping the most recently used hosts
+	# 	 * if there are more than maxHosts.
+	#
+	def load(self, path):
+		f = open(path)
+		try:
+			data = json.load(f)
+		finally:
+			f.close()
+		for host, numPages, counts in data["hosts"][-self.maxHosts:]:
+			template = self.getHostTemplate(host)
+			template.numPages = numPages
+			template.counts = dict((h, count) for h, count in counts)
+		return self
+
+class HostTemplate(object):
+	__slots__ = ("numPages", "counts")
+
+	def __init__(self):
+		self.numPages = 0
+		#block hash -> number of pages
+		self.counts = {}
+
+	def add(self, hashes, maxBlocks):
+		self.numPages += 1
+		counts = self.counts
+		for h in hashes: counts[h] = counts.get(h, 0) + 1
+		if len(counts) > maxBlocks:
+			#template blocks have the highest counts, page-specific ones the lowest
+			kept = sorted(counts.iteritems(), key=lambda item: item[1], reverse=True)[:maxBlocks//2]
+			self.counts = dict(kept)
+
+#
+#  * The hashes of the texts of blocks (None for blocks without text), each with
+#  * the text of the block before it: a line repeated within articles, such as
+#  * "Advertisement", follows different text on each page, whereas the blocks of
+#  * navigation bars and footers follow the same ones.
+#
+def getBlockHashes(textBlocks):
+	hashes = []
+	prevText = ""
+	for tb in textBlocks:
+		text = tb.getText()
+		if isinstance(text, unicode): text = text.encode("utf8")
+		hashes.append(int(hashlib.md5(prevText+"\0"+text).hexdigest()[:16], 16) if text else None)
+		prevText = text
+	return hashes
+
+#the host of a url, e.g. www.example.com
+def getHost(url):
+	import urlparse
+	return urlparse.urlsplit(url).netloc.lower()
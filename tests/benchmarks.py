@@ -0,0 +1,709 @@
+import os
+import sys
+import time
+from boilerpy import parser
+
+# Rough timings for the parser and extractors. Run from the repository root:
+#   python tests/benchmarks.py > bench_output.txt
+
+def bestOf(fn, repeat=3):
+	best=None
+	for i in range(repeat):
+		start=time.time()
+		fn()
+		elapsed=time.time()-start
+		if best==None or elapsed<best: best=elapsed
+	return best
+
+def report(name, seconds, extra=""):
+	print "%-50s %9.2f ms %s" % (name, seconds*1000, extra)
+	sys.stdout.flush()
+
+
+# a news-like page: navigation, an article with classes and ids, comments and a footer
+def samplePage(numParagraphs=40, numLinks=60):
+	s="<html><head><title>Sample article - Example News</title><script>var x=1;</script></head><body>"
+	s+="<div id='header' class='site-header'><ul class='nav menu'>"
+	for i in range(numLinks):
+		s+="<li class='item item-%d'><a href='/section/%d.html'>Section %d</a></li>" % (i,i,i)
+	s+="</ul></div><div id='main' class='container'><div class='article story'><h1 class='headline'>Sample article</h1>"
+	s+="<p class='byline'>By Some Author, May 1, 2012</p>"
+	for i in range(numParagraphs):
+		s+="<p>Paragraph %d of the article. It has <b>several</b> sentences, and <a href='/link%d.html'>a link</a> in it. " % (i,i)
+		s+="The text goes on for a while so that the block looks like real content.<br>More text follows here.</p>"
+	s+="</div><div id='comments' class='comments'><h3>48 Comments</h3>"
+	for i in range(10):
+		s+="<div class='comment'><span class='author'>user%d</span><p>I think this is great.</p></div>" % i
+	s+="</div></div><div id='footer' class='site-footer'><p>Copyright 2012 Example News. All rights reserved.</p></div>"
+	s+="</body></html>"
+	return s
+
+
+#----------------------------------------------------------------------------
+#                           NESTED LABELS
+#----------------------------------------------------------------------------
+
+def nestedPage(depth):
+	s="<html><body>"
+	for i in range(depth):
+		s+="<div class='level'><p>Paragraph number %d with a few words of text.</p>" % i
+	s+="</div>"*depth
+	s+="</body></html>"
+	return s
+
+# the per-block walk over every level of labelStacks the parser used to do
+class StackWalkParser(parser.BoilerpipeHTMLParser):
+	def addTextBlock(self, tb):
+		for fontSize in self.fontSizeStack[::-1]:
+			if fontSize != None:
+				tb.addLabel("font-" + str(fontSize))
+				break
+		for labelStack in self.labelStacks:
+			for labels in labelStack:
+				labels.addTo(tb)
+		self.textBlocks.append(tb)
+
+def benchNestedLabels():
+	tagActions=dict(parser.defaultTagActionMap)
+	tagActions["DIV"]=parser.BlockTagLabelAction(parser.LabelAction("level"))
+	for depth in (100,500,1000,2000):
+		page=nestedPage(depth)
+		for name,parserClass in (("incremental",parser.BoilerpipeHTMLParser),("stack walk",StackWalkParser)):
+			def parse():
+				bpParser=parserClass(tagActions)
+				bpParser.feed(page)
+				bpParser.toTextDocument()
+			report("nested labels depth=%d (%s)" % (depth,name), bestOf(parse))
+
+
+
+#----------------------------------------------------------------------------
+#                           MARKUP LABELS
+#----------------------------------------------------------------------------
+
+def benchMarkupLabels():
+	page=samplePage()
+	markupTagActions=parser.MarkupTagActionMap()
+	for name,tagActions in (("default map",None),("markup map",markupTagActions)):
+		def parse():
+			for i in range(10):
+				bpParser=parser.BoilerpipeHTMLParser(tagActions)
+				bpParser.feed(page)
+				bpParser.toTextDocument()
+		report("sample page x10 (%s)" % name, bestOf(parse))
+
+
+#----------------------------------------------------------------------------
+#                           TOKENIZER BACKEND
+#----------------------------------------------------------------------------
+
+def benchTokenizer():
+	page=samplePage()
+	#a page with a lot of script, as found on most news sites
+	scriptPage=page.replace("</head>","<script>"+"var s='<div class=\"ad\">'+x+'</div>';\n"*2000+"</script></head>")
+	backends=(("stdlib",parser.HTMLParserBackend()),("fast",parser.FastHTMLTokenizer()))
+	for pageName,html in (("sample page",page),("script page",scriptPage)):
+		for mapName,tagActions in (("default map",None),("markup map",parser.MarkupTagActionMap())):
+			for name,backend in backends:
+				def parse():
+					for i in range(10):
+						bpParser=parser.BoilerpipeParser(backend,tagActions)
+						bpParser.feed(html)
+						bpParser.toTextDocument()
+				report("%s x10, %s (%s)" % (pageName,mapName,name), bestOf(parse))
+
+
+#----------------------------------------------------------------------------
+#                           EXPAT PATH
+#----------------------------------------------------------------------------
+
+def benchXMLMode():
+	from boilerpy.extractors import Extractor
+	xhtml='<?xml version="1.0" encoding="utf-8"?>'+samplePage().replace("<br>","<br/>").replace("<html>",'<html xmlns="http://www.w3.org/1999/xhtml">')
+	for name,xmlMode in (("html",None),("xml",'auto')):
+		extractor=Extractor(None,xmlMode=xmlMode)
+		def parse():
+			for i in range(10):
+				extractor.parseDoc(xhtml)
+		report("xhtml page x10 (%s path)" % name, bestOf(parse), str(extractor.parsePathCounts))
+
+
+#----------------------------------------------------------------------------
+#                           LABEL INDEX
+#----------------------------------------------------------------------------
+
+def benchLabelIndex():
+	from boilerpy import filters
+	from boilerpy.document import DefaultLabels
+	page=samplePage(400,600)
+	labelFilters=filters.FilterChain([
+		filters.LabelToContentFilter("<.byline"),
+		filters.LabelToBoilerplateFilter(DefaultLabels.STRICTLY_NOT_CONTENT,"<#comments"),
+		filters.ExpandTitleToContentFilter(),
+		filters.IgnoreBlocksAfterContentFilter()
+	])
+	bpParser=parser.BoilerpipeHTMLParser(parser.MarkupTagActionMap())
+	bpParser.feed(page)
+	doc=bpParser.toTextDocument()
+	numLabels=sum(len(tb.getLabels()) for tb in doc.getTextBlocks())
+	extra="(%d blocks, %d labels)" % (len(doc.getTextBlocks()),numLabels)
+	report("label filters x20, scan", bestOf(lambda: [labelFilters.process(doc) for i in range(20)]), extra)
+	def buildIndex():
+		doc.labelIndex=None
+		doc.enableLabelIndex()
+	report("building the label index", bestOf(buildIndex), extra)
+	report("label filters x20, label index", bestOf(lambda: [labelFilters.process(doc) for i in range(20)]), extra)
+
+
+#----------------------------------------------------------------------------
+#                           PHRASE MATCHER
+#----------------------------------------------------------------------------
+
+def benchPhraseMatcher():
+	import random
+	from boilerpy.filters import PhraseMatcher, TerminatingBlocksFinder
+	rnd=random.Random(1)
+	words="comment comments reader readers say your add post rate views feedback kommentar kommentare deine meinung commentaires votre avis commenti lascia un commento comentarios deja tu opinion reacties reageer kommentarer skriv".split()
+	texts=["photo gallery number %d of the day, see more pictures" % i for i in range(1000)]
+	for size in (10,100,1000):
+		phrases=set(TerminatingBlocksFinder.DEFAULT_LEXICON["infix"])
+		while len(phrases)<size: phrases.add(" ".join(rnd.choice(words) for i in range(rnd.randint(2,4))))
+		matcher=PhraseMatcher({"infix":phrases})
+		report("%d phrases x1000 blocks (one test per phrase)" % size, bestOf(lambda: [any(p in t for p in phrases) for t in texts]))
+		report("%d phrases x1000 blocks (PhraseMatcher)" % size, bestOf(lambda: [matcher.matches(t) for t in texts]))
+
+
+#----------------------------------------------------------------------------
+#                           TITLE MATCHING
+#----------------------------------------------------------------------------
+
+def benchTitleMatch():
+	from boilerpy import filters
+	bpParser=parser.BoilerpipeHTMLParser()
+	bpParser.feed(samplePage(400,600))
+	doc=bpParser.toTextDocument()
+	filtr=filters.DocumentTitleMatchClassifier(None,True)
+	report("title match x20 on %d blocks" % len(doc.getTextBlocks()), bestOf(lambda: [filtr.process(doc) for i in range(20)]))
+
+
+#----------------------------------------------------------------------------
+#                           STREAMING EXTRACTION
+#----------------------------------------------------------------------------
+
+def benchStreaming():
+	from boilerpy import filters
+	from boilerpy.extractors import Extractor, defaultFilterChain
+	page=samplePage(4000)
+	chunks=[page[i:i+8192] for i in range(0,len(page),8192)]
+	extractor=Extractor(defaultFilterChain)
+	report("default chain, batch", bestOf(lambda: extractor.getContent(page)), "(%d KB page)" % (len(page)/1024))
+	report("default chain, stream of 8 KB chunks", bestOf(lambda: list(extractor.getContentStream(chunks))))
+	#blocks parsed while the filter chain holds back its output; the batch path holds all of them
+	counts={"parsed":0,"live":0}
+	def countParsed(blocks):
+		for tb in blocks:
+			counts["parsed"]+=1
+			yield tb
+	bpParser=parser.BoilerpipeHTMLParser()
+	for tb in defaultFilterChain.processStream(countParsed(bpParser.parseStream(chunks))):
+		counts["live"]=max(counts["live"],counts["parsed"])
+		counts["parsed"]=0
+	bpParser=parser.BoilerpipeHTMLParser()
+	bpParser.feed(page)
+	print "peak blocks held: %d (stream), %d (batch)" % (counts["live"],len(bpParser.toTextDocument().getTextBlocks()))
+
+
+#----------------------------------------------------------------------------
+#                           BATCH CLASSIFICATION
+#----------------------------------------------------------------------------
+
+def benchBatch():
+	from boilerpy import filters, batch
+	pages=[samplePage(3,5) for i in range(1000)]
+	docs=[]
+	for page in pages:
+		bpParser=parser.BoilerpipeHTMLParser()
+		bpParser.feed(page)
+		docs.append(bpParser.toTextDocument())
+	extra="(%d docs, %d blocks)" % (len(docs),sum(len(doc.getTextBlocks()) for doc in docs))
+	for filtr in (filters.NumWordsRulesClassifier(),filters.DensityRulesClassifier(),filters.CanolaFilter()):
+		name=filtr.__class__.__name__
+		report("%s, document by document" % name, bestOf(lambda: [filtr.process(doc) for doc in docs],10), extra)
+		report("%s, batch" % name, bestOf(lambda: batch.classifyDocuments(filtr,docs),10), extra)
+	blockBatch=batch.BlockBatch(docs)
+	report("packing a batch", bestOf(lambda: batch.BlockBatch(docs),10), extra)
+	report("NumWordsRulesClassifier rules on a packed batch", bestOf(lambda: filters.NumWordsRulesClassifier().classifyBatch(blockBatch),10), extra)
+
+
+#----------------------------------------------------------------------------
+#                           RULE COMPILER
+#----------------------------------------------------------------------------
+
+# NumWordsRulesClassifier as it used to be written: a chain of getter calls per block
+class GetterNumWordsRulesClassifier(object):
+	def process(self, doc):
+		from boilerpy.document import TextBlock
+		textBlocks = doc.getTextBlocks()
+		hasChanges = False
+		n=len(textBlocks)
+		for i,currentBlock in enumerate(textBlocks):
+			if i>0: prevBlock=textBlocks[i-1]
+			else: prevBlock=TextBlock.EMPTY_START
+			if i+1<n: nextBlock=textBlocks[i+1]
+			else: nextBlock=TextBlock.EMPTY_START
+			hasChanges |= self.classify(prevBlock, currentBlock, nextBlock)
+		return hasChanges
+
+	def classify(self, prev, curr, next):
+		isContent = False
+		if curr.getLinkDensity() <= 0.333333:
+			if prev.getLinkDensity() <= 0.555556:
+				if curr.getNumWords() <= 16:
+					if next.getNumWords() <= 15:
+						if prev.getNumWords() <= 4: isContent = False
+						else: isContent = True
+					else: isContent = True
+				else: isContent = True
+			else:
+				if curr.getNumWords() <= 40:
+					if next.getNumWords() <= 17: isContent = False
+					else: isContent = True
+				else: isContent = True
+		else: isContent = False
+		return curr.setIsContent(isContent)
+
+def benchRuleCompiler():
+	from boilerpy import filters, batch
+	bpParser=parser.BoilerpipeHTMLParser()
+	bpParser.feed(samplePage(2000,100))
+	doc=bpParser.toTextDocument()
+	extra="(%d blocks)" % len(doc.getTextBlocks())
+	report("NumWordsRules x10, getter calls", bestOf(lambda: [GetterNumWordsRulesClassifier().process(doc) for i in range(10)],5), extra)
+	filtr=filters.NumWordsRulesClassifier()
+	report("NumWordsRules x10, compiled", bestOf(lambda: [filtr.process(doc) for i in range(10)],5), extra)
+	blockBatch=batch.BlockBatch([doc])
+	blockBatch.getColumn("numWords"); blockBatch.getColumn("linkDensity")
+	report("NumWordsRules x10, compiled batch evaluator", bestOf(lambda: [filtr.classifyBatch(blockBatch) for i in range(10)],5), extra)
+
+
+#----------------------------------------------------------------------------
+#                           FEATURE EXPORT
+#----------------------------------------------------------------------------
+
+def benchFeatureExport():
+	import multiprocessing
+	from boilerpy import export, filters
+	from boilerpy.document import TextBlock
+	texts=[samplePage(10,20) for i in range(200)]
+	exporter=export.FeatureExporter(filters.NumWordsRulesClassifier())
+	#one dict per block, walking the blocks of parsed documents
+	def dictRowsOf(docs):
+		rows=[]
+		for docId,doc in enumerate(docs):
+			blocks=doc.getTextBlocks()
+			for i,tb in enumerate(blocks):
+				prev=blocks[i-1] if i>0 else TextBlock.EMPTY_START
+				next=blocks[i+1] if i+1<len(blocks) else TextBlock.EMPTY_START
+				row={"docId":docId,"position":i,"isContent":tb.isContent()}
+				for name,block in (("",tb),("prev.",prev),("next.",next)):
+					for feature in export.DEFAULT_FEATURES: row[name+feature]=getattr(block,feature)
+				rows.append(row)
+		return rows
+	def dictRows():
+		return dictRowsOf([exporter.parseDoc(text) for text in texts])
+	docs=[exporter.parseDoc(text) for text in texts]
+	report("collecting parsed blocks, dict per block", bestOf(lambda: dictRowsOf(docs)), "(%d blocks)" % sum(len(doc.getTextBlocks()) for doc in docs))
+	def columnsOf(docs):
+		sink=export.FeatureArrays(exporter)
+		for docId,doc in enumerate(docs): sink.append(exporter.getColumnsOf(docId,doc))
+	report("collecting parsed blocks, exporter columns", bestOf(lambda: columnsOf(docs)))
+	extra="(%d docs, %d CPUs)" % (len(texts),multiprocessing.cpu_count())
+	report("feature rows, dict per block", bestOf(dictRows), extra)
+	report("feature rows, exporter", bestOf(lambda: exporter.export(texts,export.FeatureArrays(exporter))), extra)
+	report("feature rows, exporter with 2 processes", bestOf(lambda: exporter.export(texts,export.FeatureArrays(exporter),2)), extra)
+
+
+#----------------------------------------------------------------------------
+#                           LEARNED CLASSIFIER
+#----------------------------------------------------------------------------
+
+def randomTreeModel(numTrees, depth, seed=1):
+	import random
+	rnd=random.Random(seed)
+	features=["numWords","linkDensity","textDensity","prev.numWords","prev.linkDensity","next.numWords","next.textDensity"]
+	trees=[]
+	for t in range(numTrees):
+		tree={"feature":[],"threshold":[],"left":[],"right":[],"value":[]}
+		def addNode(level):
+			node=len(tree["feature"])
+			for key in tree: tree[key].append(-1)
+			if level==depth:
+				tree["value"][node]=rnd.uniform(-1,1)
+				return node
+			tree["feature"][node]=rnd.randrange(len(features))
+			tree["threshold"][node]=rnd.uniform(0,1) if "Density" in features[tree["feature"][node]] else rnd.randint(0,30)
+			tree["left"][node]=addNode(level+1)
+			tree["right"][node]=addNode(level+1)
+			return node
+		addNode(0)
+		trees.append(tree)
+	return {"type":"trees","features":features,"trees":trees}
+
+# walks the node arrays of the model for each block
+def walkTreeModel(model, doc):
+	from boilerpy import rules
+	from boilerpy.document import TextBlock
+	features=[rules.parseFeatureName(name) for name in model["features"]]
+	blocks=doc.getTextBlocks()
+	n=len(blocks)
+	for i,block in enumerate(blocks):
+		window={0:block,-1:blocks[i-1] if i>0 else TextBlock.EMPTY_START,1:blocks[i+1] if i+1<n else TextBlock.EMPTY_START}
+		values=[getattr(window[offset],feature) for feature,offset in features]
+		score=0.0
+		for tree in model["trees"]:
+			node=0
+			while tree["left"][node]!=-1:
+				node=tree["left"][node] if values[tree["feature"][node]]<=tree["threshold"][node] else tree["right"][node]
+			score+=tree["value"][node]
+		block.setIsContent(score>=0)
+
+def benchLearnedClassifier():
+	from boilerpy import models, batch
+	model=randomTreeModel(50,4)
+	bpParser=parser.BoilerpipeHTMLParser()
+	bpParser.feed(samplePage(200,100))
+	doc=bpParser.toTextDocument()
+	extra="(50 trees of depth 4, %d blocks)" % len(doc.getTextBlocks())
+	report("tree model, walking node arrays", bestOf(lambda: walkTreeModel(model,doc)), extra)
+	filtr=models.LearnedBlockClassifier(model)
+	report("tree model, compiled", bestOf(lambda: filtr.process(doc)), extra)
+	report("tree model, compiled batch of the same doc x10", bestOf(lambda: batch.classifyDocuments(filtr,[doc]*10)), extra)
+
+
+#----------------------------------------------------------------------------
+#                           FILTER CHAIN SKIPS
+#----------------------------------------------------------------------------
+
+def benchFilterChainSkips():
+	from boilerpy import extractors
+	from boilerpy.extractors import Extractor
+	navPage="<html><body>"+"".join("<div><a href='/%d'>Link %d</a></div>" % (i,i) for i in range(2000))+"</body></html>"
+	for pageName,page in (("sample page",samplePage(400,600)),("navigation page",navPage)):
+		for chainName,chain in (("article",extractors.articleFilterChain),("default",extractors.defaultFilterChain)):
+			for skipNoOps in (False,True):
+				chain=extractors.filters.FilterChain(chain.filterArr,skipNoOps)
+				extractor=Extractor(chain)
+				doc=extractor.parseDoc(page)
+				blocks=[tb.clone() for tb in doc.getTextBlocks()]
+				def process():
+					doc.setTextBlocks([tb.clone() for tb in blocks])
+					chain.process(doc)
+				seconds=bestOf(process)
+				chain.passes=chain.skippedPasses=0
+				process()
+				report("%s, %s chain (%s)" % (pageName,chainName,"skipping no-ops" if skipNoOps else "every pass"), seconds, "%d passes, %d skipped" % (chain.passes,chain.skippedPasses))
+		report("%s, cloning the blocks only" % pageName, bestOf(lambda: [tb.clone() for tb in blocks]))
+
+
+#----------------------------------------------------------------------------
+#                           LEAN EXTRACTION
+#----------------------------------------------------------------------------
+
+# peak memory of extracting pages, each mode in a fresh interpreter: the growth of
+# ru_maxrss over the pages themselves, for one large page, and while keeping the
+# results of many pages
+def benchLeanMemory():
+	import subprocess, os
+	script="""
+import sys, resource
+sys.path.insert(0, "tests")
+from benchmarks import samplePage
+from boilerpy import extractors
+extractor=getattr(extractors, sys.argv[1])
+if sys.argv[3]=="large": pages=[samplePage(4000, 6000)]
+else: pages=[samplePage(40+i%7, 60+i%11)+" "*i for i in range(300)]
+before=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+mode=sys.argv[2]
+if mode=="getContent": results=[extractor.getContent(page) for page in pages]
+elif mode=="getDoc": results=[extractor.getDoc(page) for page in pages]
+else: results=[extractor.getLeanDoc(page) for page in pages]
+print resource.getrusage(resource.RUSAGE_SELF).ru_maxrss-before
+"""
+	for name in ("ARTICLE_EXTRACTOR", "DEFAULT_EXTRACTOR"):
+		for pages in ("large", "many"):
+			for mode in ("getDoc", "getContent", "getLeanDoc"):
+				kb=int(subprocess.check_output([sys.executable, "-c", script, name, mode, pages], env=dict(os.environ, PYTHONPATH=".")))
+				print "%-50s %9d KB" % ("%s, %s page%s, %s" % (name, "one large" if pages=="large" else "300", "" if pages=="large" else "s", mode), kb)
+				sys.stdout.flush()
+
+#----------------------------------------------------------------------------
+#                           PARSER POOL
+#----------------------------------------------------------------------------
+
+# small pages parsed with a new parser each, and with parsers reused from a pool
+def benchParserPool():
+	import gc
+	from boilerpy.extractors import Extractor, articleFilterChain
+	pages=[samplePage(2+i%3, 3+i%5) for i in range(200)]
+	gc.collect()
+	before=len(gc.get_objects())
+	bpParser=parser.BoilerpipeHTMLParser()
+	print "%-50s %9d" % ("gc-tracked objects allocated per new parser", len(gc.get_objects())-before-1)
+	for backend in (None, parser.FastHTMLTokenizer()):
+		backendName="HTMLParser" if backend==None else "FastHTMLTokenizer"
+		for poolParsers in (False, True):
+			extractor=Extractor(articleFilterChain, backend=backend, poolParsers=poolParsers)
+			seconds=bestOf(lambda: [extractor.parseDoc(page) for page in pages])
+			#bestOf parses the pages 3 times
+			created=extractor.parserPool.created if poolParsers else 3*len(pages)
+			report("%s, %d small pages, %s" % (backendName, len(pages), "pooled parsers" if poolParsers else "new parsers"), seconds, "%.0f docs/s, %d parsers for %d docs" % (len(pages)/seconds, created, 3*len(pages)))
+
+#----------------------------------------------------------------------------
+#                           EXTRACTION SERVER
+#----------------------------------------------------------------------------
+
+# the extraction server on localhost: requests over one kept-alive connection, a new
+# connection per request, and a burst of concurrent clients against a small queue
+def benchServer():
+	import httplib, threading
+	from boilerpy import server, extractors
+	page=samplePage()
+	n=50
+	report("in process, %d pages" % n, bestOf(lambda: [extractors.ARTICLE_EXTRACTOR.getContent(page) for i in range(n)]))
+	httpServer=server.ExtractionServer(("127.0.0.1", 0), workers=2, queueSize=2)
+	thread=threading.Thread(target=httpServer.serve_forever)
+	thread.daemon=True
+	thread.start()
+	def post(conn):
+		conn.request("POST", "/extract", page)
+		response=conn.getresponse()
+		response.read()
+		return response.status
+	def keepAlive():
+		conn=httplib.HTTPConnection(*httpServer.server_address)
+		for i in range(n): post(conn)
+		conn.close()
+	def newConnections():
+		for i in range(n): post(httplib.HTTPConnection(*httpServer.server_address))
+	try:
+		report("server, %d pages, one kept-alive connection" % n, bestOf(keepAlive))
+		report("server, %d pages, a connection per page" % n, bestOf(newConnections))
+		statuses=[]
+		def client():
+			conn=httplib.HTTPConnection(*httpServer.server_address)
+			statuses.append(post(conn))
+			conn.close()
+		start=time.time()
+		clients=[threading.Thread(target=client) for i in range(20)]
+		for t in clients: t.start()
+		for t in clients: t.join()
+		report("server, burst of 20 clients, 2 workers + 2 queued", time.time()-start, "%d ok, %d got 429" % (statuses.count(200), statuses.count(429)))
+	finally:
+		httpServer.shutdown()
+		httpServer.server_close()
+
+#----------------------------------------------------------------------------
+#                           BATCH RUNNER
+#----------------------------------------------------------------------------
+
+# the sharded batch runner on local files: lease bookkeeping, and files extracted
+# per second by one worker and by several worker processes sharing the leases
+def benchBatchRunner():
+	import tempfile, shutil, multiprocessing
+	from boilerpy import runner, extractors
+	directory=tempfile.mkdtemp()
+	try:
+		paths=[]
+		for i in range(200):
+			path=os.path.join(directory, "page%d.html" % i)
+			f=open(path, "w")
+			f.write(samplePage(5+i%20, 10+i%30))
+			f.close()
+			paths.append(path)
+		manifest=os.path.join(directory, "manifest.txt")
+		f=open(manifest, "w")
+		f.write("\n".join(paths))
+		f.close()
+		report("%d files in process, getContentFromFile" % len(paths), bestOf(lambda: [extractors.DEFAULT_EXTRACTOR.getContentFromFile(path) for path in paths], 1))
+		store=runner.LeaseStore(os.path.join(directory, "bookkeeping.db"))
+		runner.planLeases(store, [manifest]*50, 1000)
+		def bookkeeping():
+			for i in range(50):
+				leaseId=store.claim("bench", 60)[0]
+				store.renew(leaseId, "bench", 60)
+				store.complete(leaseId, "bench")
+		report("50 leases claimed, renewed and completed", bestOf(bookkeeping, 1))
+		store.close()
+		def work(db, output):
+			store=runner.LeaseStore(db)
+			runner.BatchWorker(store, output, "DEFAULT_EXTRACTOR").run()
+			store.close()
+		for numWorkers in (1, 2, 4):
+			db=os.path.join(directory, "leases%d.db" % numWorkers)
+			store=runner.LeaseStore(db)
+			runner.planLeases(store, [manifest], 20)
+			store.close()
+			start=time.time()
+			workers=[multiprocessing.Process(target=work, args=(db, os.path.join(directory, "output%d" % numWorkers))) for i in range(numWorkers)]
+			for worker in workers: worker.start()
+			for worker in workers: worker.join()
+			seconds=time.time()-start
+			report("%d files, %d worker process%s, leases of 20" % (len(paths), numWorkers, "es" if numWorkers>1 else ""), seconds, "%.0f files/s" % (len(paths)/seconds))
+	finally:
+		shutil.rmtree(directory)
+
+#----------------------------------------------------------------------------
+#                           PIPELINE
+#----------------------------------------------------------------------------
+
+# the size and cost of shipping a parsed page to another process, and pages
+# extracted in process and by the pipeline with fixed and rebalanced pools
+def benchPipeline():
+	import pickle
+	from boilerpy import pipeline, extractors, document
+	pages=[("page%d" % i, samplePage(5+i%20, 10+i%30)) for i in range(200)]
+	doc=extractors.DEFAULT_EXTRACTOR.parseDoc(pages[0][1])
+	report("parsed document pickled, TextDocument", bestOf(lambda: pickle.loads(pickle.dumps(doc, 2))), "%d bytes" % len(pickle.dumps(doc, 2)))
+	report("parsed document pickled, packDocument", bestOf(lambda: document.unpackDocument(pickle.loads(pickle.dumps(document.packDocument(doc), 2)))), "%d bytes" % len(pickle.dumps(document.packDocument(doc), 2)))
+	for name in ("DEFAULT_EXTRACTOR", "ARTICLE_SENTENCES_EXTRACTOR"):
+		extractor=getattr(extractors, name)
+		report("%s, %d pages in process" % (name, len(pages)), bestOf(lambda: [extractor.getContent(html) for key, html in pages], 1))
+		for label, p in (("pools 1/1/1", pipeline.ExtractionPipeline(name, poolSizes=(1, 1, 1))), ("4 workers, rebalanced", pipeline.ExtractionPipeline(name, workers=4, rebalanceInterval=50))):
+			start=time.time()
+			for line in p.run(iter(pages)): pass
+			seconds=time.time()-start
+			costs=", ".join("%s %.2f ms" % (stage, cost*1000) for stage, cost in zip(pipeline.STAGES, p.getStageCosts()))
+			report("%s, pipeline %s" % (name, label), seconds, "%.0f pages/s; %s; pools %s" % (len(pages)/seconds, costs, p.rebalances[-1] if p.rebalances else p.initialPoolSizes))
+
+#----------------------------------------------------------------------------
+#                           DUPLICATES
+#----------------------------------------------------------------------------
+
+# a crawl of 40 pages with copies: each page comes as is, again, with other markup,
+# and with other navigation links; extracted in batches of 20 pages
+def benchDuplicates():
+	from boilerpy import extractors, dedup
+	pages=[samplePage(5+i%20, 10+i) for i in range(40)]
+	texts=pages+pages+[page.replace("class='item", "class='nav-item") for page in pages]+[page.replace("Section 3<", "Weather<") for page in pages]
+	batches=[texts[i:i+20] for i in range(0, len(texts), 20)]
+	for name in ("DEFAULT_EXTRACTOR", "ARTICLE_EXTRACTOR"):
+		extractor=getattr(extractors, name)
+		report("%s, %d pages, getDocs" % (name, len(texts)), bestOf(lambda: [extractor.getDocs(pageBatch) for pageBatch in batches], 1))
+		store=dedup.FingerprintStore()
+		seconds=bestOf(lambda: [extractor.getDocs(pageBatch, store) for pageBatch in batches], 1)
+		assert [doc.getContent() for pageBatch in batches for doc in extractor.getDocs(pageBatch, dedup.FingerprintStore())]==[extractor.getContent(text) for text in texts]
+		counts=", ".join("%s %d" % (outcome, store.counts[outcome]) for outcome in dedup.OUTCOMES[:4])
+		report("%s, %d pages, getDocs with fingerprints" % (name, len(texts)), seconds, "%s; %.0f ms saved by the report" % (counts, store.savedSeconds*1000))
+
+#----------------------------------------------------------------------------
+#                           SITE TEMPLATES
+#----------------------------------------------------------------------------
+
+# pages of one site, whose navigation, comments and footer are the same: the filters
+# alone, and whole extractions, once the template index has learned from 20 pages
+def benchTemplates():
+	from boilerpy import extractors, templates, document
+	pages=[samplePage(5+i%15, 60).replace("Paragraph", "Story %d, paragraph" % i).replace("Sample article", "Story number %d" % i) for i in range(100)]
+	for name in ("DEFAULT_EXTRACTOR", "ARTICLE_EXTRACTOR"):
+		chain=getattr(extractors, name).filter
+		index=templates.TemplateIndex()
+		learning=extractors.Extractor(chain, templateIndex=index)
+		for page in pages[:20]: learning.getDoc(page, "example.com")
+		for label, extractor in (("without templates", extractors.Extractor(chain)), ("with templates", learning)):
+			docs=[]
+			for page in pages[20:]:
+				doc=extractor.parseDoc(page)
+				if extractor.templateIndex!=None: extractor.templateIndex.process(doc, "example.com")
+				docs.append(doc)
+			numBlocks=sum(len(doc.getTextBlocks()) for doc in docs)
+			report("%s, filters of 80 pages, %s" % (name, label), bestOf(lambda: [chain.process(document.TextDocument([tb.clone() for tb in doc.getTextBlocks()], doc.getTitle())) for doc in docs], 3), "%.0f blocks per page" % (numBlocks/80.0))
+			report("%s, 80 pages, %s" % (name, label), bestOf(lambda: [extractor.getDoc(page, "example.com") for page in pages[20:]], 3))
+
+#----------------------------------------------------------------------------
+#                           INCREMENTAL RE-EXTRACTION
+#----------------------------------------------------------------------------
+
+# recrawls of a page whose comment count changed: full extractions, and
+# incremental ones from the record of the previous crawl
+def benchIncremental():
+	from boilerpy import extractors
+	pages=[samplePage(40, 60).replace("48 Comments", "%d Comments" % (48+i)) for i in range(20)]
+	for name in ("DEFAULT_EXTRACTOR", "ARTICLE_EXTRACTOR"):
+		extractor=getattr(extractors, name)
+		doc, first=extractor.getUpdatedDoc(pages[0])
+		def recrawl():
+			record=first
+			for page in pages[1:]: doc, record=extractor.getUpdatedDoc(page, record)
+			return record
+		record=recrawl()
+		report("%s, 19 recrawls, full" % name, bestOf(lambda: [extractor.getContent(page) for page in pages[1:]], 3))
+		report("%s, 19 recrawls, incremental" % name, bestOf(recrawl, 3), "%d of %d blocks filtered per page, record of %d bytes" % (record.rerunBlocks, len(record), len(record.toBytes())))
+
+#----------------------------------------------------------------------------
+#                           ROUTED EXTRACTION
+#----------------------------------------------------------------------------
+
+# a crawl where half of the pages are listings: everything through the article
+# filters, and AUTO_EXTRACTOR, page by page and in a batch; the filters alone
+# first, then whole extractions
+def benchRouting():
+	from boilerpy import extractors, document
+	def listingPage(i):
+		items="".join("<div class='result'><h3><a href='/story/%d.html'>Council votes on the plan for road number %d</a></h3><p>The city council met on Monday to discuss the plan, which would change %d roads.</p></div>" % (j, j, j) for j in range(20))
+		return samplePage(0, 60).replace("<h1 class='headline'>Sample article</h1>", "<h1>Results, page %d</h1>%s" % (i, items))
+	pages=[samplePage(20, 60) if i%2 else listingPage(i) for i in range(40)]
+	router=extractors.AUTO_EXTRACTOR.filter
+	for name in ("ARTICLE_EXTRACTOR", "AUTO_EXTRACTOR"):
+		extractor=getattr(extractors, name)
+		docs=[extractor.parseDoc(page) for page in pages]
+		report("%s, filters of 40 pages" % name, bestOf(lambda: [extractor.filter.process(document.TextDocument([tb.clone() for tb in doc.getTextBlocks()], doc.getTitle())) for doc in docs], 3))
+		report("%s, 40 pages" % name, bestOf(lambda: [extractor.getContent(page) for page in pages], 3))
+		report("%s, 40 pages, getDocs" % name, bestOf(lambda: extractor.getDocs(pages), 3))
+	report("AUTO_EXTRACTOR routes", sum(router.routeSeconds.values()), ", ".join("%s: %d pages" % (route, router.routeCounts[route]) for route in ("short", "listing", "article")))
+
+#----------------------------------------------------------------------------
+#                           IMPORT TIME
+#----------------------------------------------------------------------------
+
+# cold-start cost: each step is timed in a fresh interpreter, with .pyc files written
+def benchImportTime():
+	import subprocess, compileall, os
+	compileall.compile_dir("boilerpy", quiet=True)
+	steps=[
+		("import boilerpy", "import boilerpy"),
+		("import boilerpy.extractors", "import boilerpy.extractors"),
+		("ARTICLE_EXTRACTOR", "import boilerpy.extractors; boilerpy.extractors.ARTICLE_EXTRACTOR"),
+		("first ARTICLE_EXTRACTOR.getContent", "import boilerpy.extractors; boilerpy.extractors.ARTICLE_EXTRACTOR.getContent('<p>Some text</p>')"),
+		("every submodule and extractor", "import boilerpy.extractors as e, boilerpy.export, boilerpy.models; [getattr(e, name) for name in dir(e) if name.endswith('_EXTRACTOR')]"),
+	]
+	for name, statement in steps:
+		script="import time; start=time.time(); %s; print time.time()-start" % statement
+		times=[float(subprocess.check_output([sys.executable, "-c", script], env=dict(os.environ, PYTHONPATH="."))) for i in range(5)]
+		report("cold start, %s" % name, min(times), "%d modules" % int(subprocess.check_output([sys.executable, "-c", "import sys; %s; print len(sys.modules)" % statement], env=dict(os.environ, PYTHONPATH="."))))
+
+def runBenchmarks():
+	benchNestedLabels()
+	benchMarkupLabels()
+	benchTokenizer()
+	benchXMLMode()
+	benchLabelIndex()
+	benchPhraseMatcher()
+	benchTitleMatch()
+	benchStreaming()
+	benchBatch()
+	benchRuleCompiler()
+	benchFeatureExport()
+	benchLearnedClassifier()
+	benchFilterChainSkips()
+	benchImportTime()
+	benchLeanMemory()
+	benchParserPool()
+	benchServer()
+	benchBatchRunner()
+	benchPipeline()
+	benchDuplicates()
+	benchTemplates()
+	benchIncremental()
+	benchRouting()
+
+if __name__=="__main__": runBenchmarks()
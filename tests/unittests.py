@@ -1,14 +1,37 @@
 import unittest
 import sys
-from boilerpy.document import TextDocument,TextBlock
+import os
+import json
+import httplib
+import threading
+from boilerpy.document import TextDocument,TextBlock,TextDocumentStatistics
 from boilerpy.filters import *
-from boilerpy.extractors import Extractor
+from boilerpy.extractors import Extractor,articleFilterChain,defaultFilterChain
+from boilerpy import parser
+from boilerpy import batch
+from boilerpy import export
+from boilerpy import models
+
+GOLDEN_DIR=os.path.join(os.path.dirname(os.path.abspath(__file__)),"golden")
+
+#the (file name, text) of each page of the golden corpus
+def readGoldenPages():
+	pages=[]
+	for filename in sorted(os.listdir(GOLDEN_DIR)):
+		with open(os.path.join(GOLDEN_DIR,filename),'r') as f: pages.append((filename,f.read().decode('utf8')))
+	return pages
 
 def runTests():
 	suite = unittest.TestLoader().loadTestsFromTestCase(TestFilters)
 	unittest.TextTestRunner(verbosity=2).run(suite)
 	suite = unittest.TestLoader().loadTestsFromTestCase(TestParser)
 	unittest.TextTestRunner(verbosity=2).run(suite)
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestServer)
+	unittest.TextTestRunner(verbosity=2).run(suite)
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestBatchRunner)
+	unittest.TextTestRunner(verbosity=2).run(suite)
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestPipeline)
+	unittest.TextTestRunner(verbosity=2).run(suite)
 
 def runOneTest():
 	testName='test_anchor'
@@ -222,6 +245,16 @@ class TestFilters(unittest.TestCase):
 		self.assertEqual(labels,[set(),set([DefaultLabels.TITLE]),set()])
 		self.assertEqual(isChanged,True)
 
+		#matching ignores case and surrounding whitespace, and only needs one instance per extractor
+		filtr=DocumentTitleMatchClassifier(None,True)
+		for title in ["Site | First Title","Second title: Subtitle"]:
+			doc=self.makedoc(["first title","  FIRST TITLE ","First Title of a much longer block","Second title"])
+			doc.setTitle(title)
+			filtr.process(doc)
+			labels=[block.hasLabel(DefaultLabels.TITLE) for block in doc.getTextBlocks()]
+			if title.startswith("Site"): self.assertEqual(labels,[True,True,False,False])
+			else: self.assertEqual(labels,[False,False,False,True])
+
 	def test_minFulltextWords(self):
 		#choose largest block
 		doc=self.makedoc([10,50],None,[True,True])
@@ -258,6 +291,441 @@ class TestFilters(unittest.TestCase):
 		self.assertEqual(hasLabel,[True,True,True,False,True])
 		self.assertEqual(isChanged,True)
 
+	def test_phraseMatcher(self):
+		matcher=PhraseMatcher({"prefix":["comments"],"infix":["have your say","have a say"],"exact":["the end"],"afterNumber":[" comments"]})
+		matches=[matcher.matches(s) for s in ["comments (3)","no comments","please have your say here","have a","the end","the end."," the end","48 comments","48 comment","comments48"]]
+		self.assertEqual(matches,[True,False,True,False,True,False,False,True,False,True])
+		self.assertFalse(PhraseMatcher({}).matches("comments"))
+		self.assertRaises(ValueError,PhraseMatcher,{"suffix":["x"]})
+		
+		#custom lexicons, e.g. for other languages
+		lexicon=mergeLexicons(TerminatingBlocksFinder.DEFAULT_LEXICON,{"prefix":["kommentare"],"infix":[u"ihre meinung"]})
+		doc=self.makedoc(["Kommentare zu diesem Artikel",u"Sagen Sie Ihre Meinung!","48 Comments today","Just some text of the article"])
+		TerminatingBlocksFinder(lexicon).process(doc)
+		hasLabel=[block.hasLabel(DefaultLabels.INDICATES_END_OF_TEXT) for block in doc.getTextBlocks()]
+		self.assertEqual(hasLabel,[True,True,True,False])
+
+	def test_labelIndex(self):
+		lb1=DefaultLabels.TITLE
+		lb2=DefaultLabels.MIGHT_BE_CONTENT
+		doc=self.makedoc([10,10,10,10,10],None,None,[lb1,None,[lb1,lb2],None,lb2])
+		doc.enableLabelIndex()
+		blocks=doc.getTextBlocks()
+		self.assertEqual(doc.getLabelPositions(lb1),[0,2])
+		blocks[3].addLabel(lb1)
+		blocks[2].removeLabel(lb1)
+		blocks[1].addLabels([lb2])
+		self.assertEqual(doc.getLabelPositions(lb1),[0,3])
+		self.assertEqual(doc.getBlocksWithLabels(lb1,lb2),blocks)
+		#merged labels move with the block, removed blocks leave the index
+		blocks[3].mergeNext(blocks[4])
+		doc.setTextBlocks(blocks[:4])
+		self.assertEqual(doc.getBlocksWithLabels(lb2),[blocks[1],blocks[2],blocks[3]])
+		doc.setTextBlocks(blocks[2:4])
+		self.assertEqual(doc.getLabelPositions(lb1),[1])
+		self.assertEqual(doc.getLabelPositions(lb1),[i for i,tb in enumerate(doc.getTextBlocks()) if tb.hasLabel(lb1)])
+
+	def test_labelIndexFilters(self):
+		filterChain=FilterChain([TerminatingBlocksFinder(),DocumentTitleMatchClassifier(None,True),NumWordsRulesClassifier(),IgnoreBlocksAfterContentFilter(),BlockProximityFusion(1,False,False),BoilerplateBlockFilter(),BlockProximityFusion(1,True,False),KeepLargestBlockFilter(),ExpandTitleToContentFilter(),LabelToBoilerplateFilter(DefaultLabels.INDICATES_END_OF_TEXT)])
+		for filename,s in readGoldenPages():
+			doc=Extractor(filterChain).getDoc(s)
+			indexedDoc=Extractor(filterChain,useLabelIndex=True).getDoc(s)
+			self.assertNotEqual(indexedDoc.labelIndex,None)
+			self.assertEqual(indexedDoc.getContent(),doc.getContent())
+
+	def test_streamExtraction(self):
+		extractors=[Extractor(defaultFilterChain),Extractor(NumWordsRulesClassifier()),Extractor(CanolaFilter()),Extractor(MarkEverythingContentFilter()),Extractor(FilterChain([SimpleBlockFusionProcessor(),NumWordsRulesClassifier(),BlockProximityFusion(1,True,True),MinWordsFilter(5),BoilerplateBlockFilter()]))]
+		for filename,s in readGoldenPages():
+			for extractor in extractors:
+				expected=extractor.getContent(s)
+				for size in (1,7,100,len(s)):
+					chunks=[s[i:i+size] for i in range(0,len(s),size)]
+					self.assertEqual("".join(text+"\n" for text in extractor.getContentStream(chunks)),expected,filename)
+		self.assertRaises(ValueError,Extractor(articleFilterChain).getContentStream,"<p>text</p>")
+		self.assertRaises(ValueError,KeepLargestBlockFilter().processStream,iter([]))
+		self.assertFalse(FilterChain([NumWordsRulesClassifier(),KeepLargestBlockFilter()]).isStreamable())
+
+	def test_batchClassification(self):
+		texts=[text for filename,text in readGoldenPages()]
+		texts+=["<html><body></body></html>","<p>One block only, with a few words</p>","<p>a</p><p><a href='x'>linked words here</a></p>"]
+		for filtr in [NumWordsRulesClassifier(),DensityRulesClassifier(),CanolaFilter(),defaultFilterChain]:
+			extractor=Extractor(filtr)
+			docs=extractor.getDocs(texts)
+			self.assertEqual([doc.getContent() for doc in docs],[extractor.getContent(text) for text in texts])
+			#documents which are classified on their own, and within a batch, change the same way
+			docs=[extractor.parseDoc(text) for text in texts]
+			self.assertEqual(batch.processDocuments(filtr,docs),[filtr.process(extractor.parseDoc(text)) for text in texts])
+			docs=extractor.getDocs(texts,batched=True)
+			self.assertEqual([doc.getContent() for doc in docs],[extractor.getContent(text) for text in texts])
+		#a chain skips the same filters, and releases the same blocks in lean mode, in a batch
+		from boilerpy.extractors import createArticleFilterChain
+		for lean in [False,True]:
+			chain,single=createArticleFilterChain(None),createArticleFilterChain(None)
+			docs=[extractor.parseDoc(text) for text in texts]
+			batch.processDocuments(chain,docs,lean)
+			singleDocs=[extractor.parseDoc(text) for text in texts]
+			for doc in singleDocs: single.process(doc,lean)
+			self.assertEqual((chain.passes,chain.skippedPasses),(single.passes,single.skippedPasses))
+			self.assertTrue(chain.skippedPasses>0)
+			self.assertEqual([[(tb.getText(),tb.isContent()) for tb in doc.getTextBlocks()] for doc in docs],[[(tb.getText(),tb.isContent()) for tb in doc.getTextBlocks()] for doc in singleDocs])
+		rows=batch.BlockBatch([self.makedoc([5,10],[0,0],[True,True]),self.makedoc([],[],[]),self.makedoc([7],[0],[True])])
+		self.assertEqual(list(rows.docOffsets),[1,4,5,7])
+		self.assertEqual(list(rows.getColumn("numWords")),[0,5,10,0,0,7,0])
+
+	def test_duplicates(self):
+		from boilerpy import dedup
+		from boilerpy.extractors import ARTICLE_EXTRACTOR
+		with open(os.path.join(GOLDEN_DIR,"news.html"),'r') as f: page=f.read().decode('utf8')
+		markup=page.replace('class="item"','class="menu-item"')
+		near=page.replace(">Local<",">Region<")
+		changed=page.replace("and the rest by 2014","and the rest by 2015")
+		store=dedup.FingerprintStore()
+		texts=[page,page,markup,"<p>Another page with a few words</p>"]
+		docs=ARTICLE_EXTRACTOR.getDocs(texts,store)
+		self.assertEqual([doc.getContent() for doc in docs],[ARTICLE_EXTRACTOR.getContent(text) for text in texts])
+		self.assertTrue(docs[0] is docs[1] and docs[0] is docs[2])
+		self.assertEqual(len(store),2)
+		#near-duplicates take the content over only if the article is the same
+		texts=[near,changed,page,near]
+		docs=ARTICLE_EXTRACTOR.getDocs(texts,store)
+		self.assertEqual([doc.getContent() for doc in docs],[ARTICLE_EXTRACTOR.getContent(text) for text in texts])
+		self.assertEqual(store.counts,{"exact":3,"sameBlocks":1,"near":1,"extracted":3,"unparsable":0})
+		self.assertEqual(store.nearRejected,1)
+		self.assertTrue(store.savedSeconds>0)
+		#the least recently used fingerprints are evicted
+		store=dedup.FingerprintStore(maxSize=2)
+		ARTICLE_EXTRACTOR.getDocs([page,changed],store)
+		ARTICLE_EXTRACTOR.getDocs([page,"<p>Another page with a few words</p>"],store)
+		self.assertEqual(len(store),2)
+		self.assertEqual(store.findRaw(dedup.getRawHash(changed)),None)
+		self.assertNotEqual(store.findRaw(dedup.getRawHash(page)),None)
+		#fingerprints sharing a parsed hash are found until the last of them is evicted
+		store=dedup.FingerprintStore(maxSize=2)
+		first,second=[dedup.Fingerprint(rawHash,1,0,None,None,0.0) for rawHash in ["a","b"]]
+		store.add(first)
+		store.add(second)
+		self.assertTrue(store.findParsed(1) is second)
+		store.add(dedup.Fingerprint("c",2,0,None,None,0.0))
+		self.assertTrue(store.findRaw("a") is None and store.findParsed(1) is second)
+		for rawHash in ["d","e"]: store.add(dedup.Fingerprint(rawHash,3,0,None,None,0.0))
+		self.assertEqual(store.findParsed(1),None)
+		self.assertEqual(dedup.getDistance(0b1011,0b0110),3)
+
+	def test_templates(self):
+		import tempfile
+		from boilerpy import templates
+		def sitePage(i):
+			article="".join("<p>Story %d, paragraph %d, has a good number of words in it for a real article.</p><p>Advertisement</p>" % (i,j) for j in range(4))
+			return "<html><body><ul><li><a href='/'>Home</a></li><li><a href='/news'>News</a></li></ul><h1>Story %d</h1>%s<div>Copyright 2012 Example News</div></body></html>" % (i,article)
+		index=templates.TemplateIndex(minPages=5,maxHosts=2)
+		extractor=Extractor(articleFilterChain,templateIndex=index)
+		for i in range(8):
+			doc=extractor.getDoc(sitePage(i),"example.com")
+			#without the navigation before it, the headline joins the article
+			self.assertTrue(doc.getContent().endswith(Extractor(articleFilterChain).getContent(sitePage(i))))
+		#the navigation and the footer were dropped from the last 3 pages, not the advertisements
+		self.assertEqual(index.blocksDropped,3*3)
+		self.assertEqual(len(index.getTemplateHashes("example.com")),3)
+		doc=Extractor(MarkEverythingContentFilter(),templateIndex=index).getDoc(sitePage(9),"example.com")
+		self.assertEqual(doc.getContent().count("Advertisement"),4)
+		self.assertFalse("Copyright" in doc.getContent())
+		#labeled only
+		index.drop=False
+		doc=Extractor(MarkEverythingContentFilter(),templateIndex=index).getDoc(sitePage(10),"example.com")
+		self.assertEqual([tb.getText() for tb in doc.getTextBlocks() if tb.hasLabel(DefaultLabels.STRICTLY_NOT_CONTENT)],["Home","News","Copyright 2012 Example News"])
+		#other hosts learn on their own, and the least recently used host is evicted
+		extractor.getDoc(sitePage(0),"other.example.com")
+		extractor.getDoc(sitePage(0),"example.com")
+		extractor.getDoc(sitePage(0),"third.example.com")
+		self.assertEqual(index.hosts.keys(),["example.com","third.example.com"])
+		#saved and loaded
+		path=os.path.join(tempfile.mkdtemp(),"templates.json")
+		index.save(path)
+		loaded=templates.TemplateIndex(minPages=5).load(path)
+		self.assertEqual(loaded.hosts.keys(),index.hosts.keys())
+		self.assertEqual(loaded.getTemplateHashes("example.com"),index.getTemplateHashes("example.com"))
+		os.remove(path)
+		os.rmdir(os.path.dirname(path))
+		#the counts of a host are bounded
+		template=templates.HostTemplate()
+		for i in range(10): template.add(set([1,2,100+i]),6)
+		self.assertTrue(len(template.counts)<=6)
+		self.assertEqual((template.counts[1],template.counts[2]),(10,10))
+		self.assertEqual(templates.getHost("http://WWW.Example.com/a/b?c"),"www.example.com")
+
+	def test_incremental(self):
+		from boilerpy import incremental
+		def articlePage(numComments,extra=""):
+			nav="".join("<li><a href='/%d'>Section %d</a></li>" % (i,i) for i in range(20))
+			article="".join("<p>Paragraph %d of the story has a good number of words in it, like a real article.</p>" % i for i in range(30))
+			return "<html><body><ul>%s</ul><h1>Headline</h1>%s%s<h3>%d comments</h3><div>Copyright 2012 Example News</div></body></html>" % (nav,article,extra,numComments)
+		extractor=Extractor(defaultFilterChain)
+		doc,record=extractor.getUpdatedDoc(articlePage(3))
+		self.assertEqual(doc.getContent(),extractor.getContent(articlePage(3)))
+		self.assertEqual(record.rerunBlocks,len(record))
+		#a recrawl with another comment count only filters the blocks around it
+		for page in [articlePage(4),articlePage(4),articlePage(5,"<p>An added paragraph with enough words in it to be content.</p>")]:
+			doc,record=extractor.getUpdatedDoc(page,record)
+			self.assertEqual(doc.getContent(),extractor.getContent(page))
+			self.assertTrue(record.rerunBlocks<len(record)/2)
+		#the two changed blocks, 8 blocks before them and the footer after them
+		self.assertEqual(record.rerunBlocks,11)
+		record=incremental.ExtractionRecord.fromBytes(record.toBytes())
+		doc,record=extractor.getUpdatedDoc(articlePage(3),record)
+		self.assertEqual(doc.getContent(),extractor.getContent(articlePage(3)))
+		#the article filters look at the whole document, so they always run on all of it
+		extractor=Extractor(articleFilterChain)
+		doc,record=extractor.getUpdatedDoc(articlePage(3))
+		doc,record=extractor.getUpdatedDoc(articlePage(4),record)
+		self.assertEqual(doc.getContent(),extractor.getContent(articlePage(4)))
+		self.assertEqual(record.rerunBlocks,len(record))
+		self.assertRaises(ValueError,incremental.ExtractionRecord.fromBytes,record.toBytes()[:-1])
+
+	def test_routing(self):
+		from boilerpy import extractors
+		nav="<ul>%s</ul>" % "".join("<li><a href='/%d'>Section %d</a></li>" % (i,i) for i in range(20))
+		article="<html><body>%s<h1>Headline</h1>%s<div>Copyright 2012</div></body></html>" % (nav,"".join("<p>Paragraph %d of the story has a good number of words in it, like a real article.</p>" % i for i in range(10)))
+		listing="<html><body>%s<h1>Results</h1>%s<div>Copyright 2012</div></body></html>" % (nav,"".join("<h3><a href='/%d'>Council votes on the plan for road %d</a></h3><p>The council met to discuss the plan for %d roads.</p>" % (i,i,i) for i in range(10)))
+		short="<html><body><h1>Not found</h1><p>The page was moved.</p></body></html>"
+		router=RoutingFilter(articleFilterChain,extractors.listingFilterChain,MarkEverythingContentFilter())
+		extractor=Extractor(router)
+		self.assertEqual([router.getRoute(extractor.parseDoc(page)) for page in [article,listing,short]],["article","listing","short"])
+		#the statistics are collected while parsing, and dropped once the blocks change
+		doc=extractor.parseDoc(listing)
+		stats=TextDocumentStatistics(doc,False)
+		self.assertEqual([getattr(doc.parseStatistics,name) for name in ["numBlocks","numWords","numWordsInAnchorText","maxBlockWords"]],[stats.numBlocks,stats.numWords,stats.numWordsInAnchorText,stats.maxBlockWords])
+		FilterChain([MarkEverythingContentFilter(),BlockProximityFusion(1,False,False)]).process(doc)
+		self.assertEqual(doc.parseStatistics,None)
+		self.assertEqual(extractor.getContent(article),Extractor(articleFilterChain).getContent(article))
+		content=extractor.getContent(listing)
+		self.assertTrue(content.startswith("Council votes on the plan for road 0\nThe council met"),content)
+		self.assertFalse("Section" in content or "Copyright" in content)
+		self.assertEqual(extractor.getContent(short),"Not found\nThe page was moved.\n")
+		#batches are routed too, and the same
+		docs=extractor.getDocs([listing,article,short,article])
+		self.assertEqual([doc.getContent() for doc in docs],[extractor.getContent(page) for page in [listing,article,short,article]])
+		#the pages extracted one by one count as well
+		self.assertEqual(router.routeCounts,{"article":5,"listing":3,"short":3})
+		self.assertTrue(router.routeSeconds["article"]>0)
+		self.assertEqual(len(router.getReport().splitlines()),3)
+
+	#the rules of the classifiers, as they were written before they were compiled from rules.py
+	def referenceNumWordsRules(self,prev,curr,next):
+		if curr.getLinkDensity() <= 0.333333:
+			if prev.getLinkDensity() <= 0.555556:
+				if curr.getNumWords() <= 16:
+					if next.getNumWords() <= 15: return prev.getNumWords() > 4
+					return True
+				return True
+			if curr.getNumWords() <= 40: return next.getNumWords() > 17
+			return True
+		return False
+
+	def referenceDensityRules(self,prev,curr,next):
+		if curr.getLinkDensity() <= 0.333333:
+			if prev.getLinkDensity() <= 0.555556:
+				if curr.getTextDensity() <= 9:
+					if next.getTextDensity() <= 10: return prev.getTextDensity() > 4
+					return True
+				return next.getTextDensity() != 0
+			return next.getTextDensity() > 11
+		return False
+
+	def referenceCanolaRules(self,prev,curr,next):
+		cond1=curr.getLinkDensity() > 0 and next.getNumWords() > 11
+		cond2=curr.getNumWords() > 19
+		cond3=next.getNumWords() > 6 and next.getLinkDensity() == 0 and prev.getLinkDensity() == 0 and (curr.getNumWords() > 6 or prev.getNumWords() > 7 or next.getNumWords() > 19)
+		return cond1 or cond2 or cond3
+
+	def test_ruleCompiler(self):
+		#blocks around every threshold of the rules
+		blocks=[TextBlock.EMPTY_START]
+		for numWords in (0,1,4,5,6,7,8,9,10,11,12,15,16,17,18,19,20,40,41,60):
+			for numAnchorWords in (0,1,numWords/3,numWords/2,numWords):
+				for wrappedLines in (0,1,2,3):
+					block=TextBlock("x",set(),numWords,min(numAnchorWords,numWords),numWords if wrappedLines else 0,wrappedLines)
+					blocks.append(block)
+		windows=[(prev,curr,next) for prev in blocks[::23] for curr in blocks for next in blocks[::17]]
+		for filtr,reference in [(NumWordsRulesClassifier(),self.referenceNumWordsRules),(DensityRulesClassifier(),self.referenceDensityRules),(CanolaFilter(),self.referenceCanolaRules)]:
+			for prev,curr,next in windows:
+				filtr.classify(prev,curr,next)
+				self.assertEqual(curr.isContent(),reference(prev,curr,next))
+			#the same rules over a whole document, and over a batch
+			doc=TextDocument([block.clone() for block in blocks[1:]])
+			expected=[reference(prev,curr,next) for prev,curr,next in zip([TextBlock.EMPTY_START]+blocks[1:-1],blocks[1:],blocks[2:]+[TextBlock.EMPTY_START])]
+			filtr.process(doc)
+			self.assertEqual([block.isContent() for block in doc.getTextBlocks()],expected)
+			doc=TextDocument([block.clone() for block in blocks[1:]])
+			batch.classifyDocuments(filtr,[doc])
+			self.assertEqual([block.isContent() for block in doc.getTextBlocks()],expected)
+		
+		#a wider window
+		filtr=RuleClassifier(("prev2.numWords > 5",("next2.numWords >= 10",True,False),False))
+		self.assertEqual(filtr.window,2)
+		self.assertFalse(filtr.isStreamable())
+		for docs in ([self.makedoc([6,6,10,10,10])],[self.makedoc([6,6,10,10,10]),self.makedoc([10,1,0])]):
+			batch.processDocuments(filtr,docs)
+			self.assertEqual([block.isContent() for block in docs[0].getTextBlocks()],[False,False,True,False,False])
+		doc=self.makedoc([6,6,10,10,20])
+		self.assertTrue(filtr.process(doc))
+		self.assertEqual([block.isContent() for block in doc.getTextBlocks()],[False,False,True,False,False])
+		
+		self.assertRaises(ValueError,RuleClassifier,("curr.words > 5",True,False))
+		self.assertRaises(ValueError,RuleClassifier,("curr.numWords => 5",True,False))
+		self.assertRaises(ValueError,RuleClassifier,("curr.numWords > 5",True))
+
+	def test_featureExport(self):
+		import tempfile,shutil
+		texts=["<html><body><p>One <a href='x'>two</a> three</p><div class='c'>Four five</div></body></html>","","<html><body><p>Only block</p></body></html>"]
+		exporter=export.FeatureExporter(NumWordsRulesClassifier(),("numWords","linkDensity"),1,["<.c"],parser.MarkupTagActionMap())
+		self.assertEqual(exporter.getColumnNames(),["docId","position","numWords","linkDensity","prev.numWords","prev.linkDensity","next.numWords","next.linkDensity","label:<.c","isContent"])
+		arrays=exporter.export(texts,export.FeatureArrays(exporter))
+		self.assertEqual(len(arrays),3)
+		self.assertEqual(list(arrays.getColumn("docId")),[0,0,2])
+		self.assertEqual(list(arrays.getColumn("position")),[0,1,0])
+		self.assertEqual(list(arrays.getColumn("numWords")),[3,2,2])
+		self.assertEqual(list(arrays.getColumn("prev.numWords")),[0,3,0])
+		self.assertEqual(list(arrays.getColumn("next.numWords")),[2,0,0])
+		self.assertAlmostEqual(arrays.getColumn("linkDensity")[0],1/3.0)
+		self.assertEqual(list(arrays.getColumn("next.linkDensity")),[0,0,0])
+		self.assertEqual(list(arrays.getColumn("label:<.c")),[0,1,0])
+		doc=Extractor(NumWordsRulesClassifier()).getDoc(texts[0])
+		self.assertEqual(list(arrays.getColumn("isContent"))[:2],[block.isContent() for block in doc.getTextBlocks()])
+		
+		parallelArrays=exporter.export(texts,export.FeatureArrays(exporter),processes=2,chunksize=1)
+		self.assertEqual(parallelArrays.columns,arrays.columns)
+		directory=tempfile.mkdtemp()
+		try:
+			files=exporter.export(texts,export.FeatureFiles(exporter,directory))
+			files.close()
+			self.assertEqual(export.readFeatureFiles(directory),zip(exporter.getColumnNames(),arrays.columns))
+		finally:
+			shutil.rmtree(directory)
+
+	def test_learnedClassifier(self):
+		import tempfile,json,math
+		#NumWordsRulesClassifier as a tree model, with leaves of -1 (boilerplate) and 1 (content)
+		treeModel={"type":"trees","features":["linkDensity","prev.linkDensity","numWords","next.numWords","prev.numWords"],"trees":[{
+			"feature":  [0,1,-1,2,2,3,-1,4,-1,-1,-1,3,-1,-1,-1],
+			"threshold":[0.333333,0.555556,0,16,40,15,0,4,0,0,0,17,0,0,0],
+			"left":     [1,3,-1,5,11,7,-1,9,-1,-1,-1,13,-1,-1,-1],
+			"right":    [2,4,-1,6,12,8,-1,10,-1,-1,-1,14,-1,-1,-1],
+			"value":    [0,0,-1,0,0,0,1,0,1,-1,1,0,1,-1,1]}]}
+		texts=[text for filename,text in readGoldenPages()]
+		f=tempfile.NamedTemporaryFile(suffix=".json",delete=False)
+		json.dump(treeModel,f)
+		f.close()
+		try:
+			filtr=models.LearnedBlockClassifier(f.name)
+		finally:
+			os.remove(f.name)
+		for text in texts:
+			self.assertEqual(Extractor(filtr).getContent(text),Extractor(NumWordsRulesClassifier()).getContent(text))
+			self.assertEqual("".join(t+"\n" for t in Extractor(filtr).getContentStream(text)),Extractor(NumWordsRulesClassifier()).getContent(text))
+		docs=Extractor(FilterChain([filtr,BoilerplateBlockFilter()])).getDocs(texts)
+		self.assertEqual([doc.getContent() for doc in docs],[Extractor(FilterChain([NumWordsRulesClassifier(),BoilerplateBlockFilter()])).getContent(text) for text in texts])
+		
+		#logistic regression, with a wider window
+		logisticModel={"type":"logistic","features":["numWords","linkDensity","next2.numWords"],"weights":[0.5,-4.0,0.25],"bias":-5.0,"threshold":0.7}
+		filtr=models.LearnedBlockClassifier(logisticModel)
+		self.assertEqual(filtr.window,2)
+		doc=Extractor(None).parseDoc(texts[0])
+		blocks=doc.getTextBlocks()
+		numWordsAfter=[block.getNumWords() for block in blocks[2:]]+[0,0]
+		expected=[1/(1+math.exp(-(-5.0+0.5*block.getNumWords()-4.0*block.getLinkDensity()+0.25*after)))>=0.7 for block,after in zip(blocks,numWordsAfter)]
+		filtr.process(doc)
+		self.assertEqual([block.isContent() for block in doc.getTextBlocks()],expected)
+		self.assertTrue(True in expected and False in expected)
+		doc=Extractor(None).parseDoc(texts[0])
+		batch.processDocuments(filtr,[Extractor(None).parseDoc(texts[1]),doc,Extractor(None).parseDoc(texts[2])])
+		self.assertEqual([block.isContent() for block in doc.getTextBlocks()],expected)
+		
+		self.assertRaises(ValueError,models.LearnedBlockClassifier,{"type":"logistic","features":["words"],"weights":[1]})
+		self.assertRaises(ValueError,models.LearnedBlockClassifier,{"type":"svm","features":[]})
+
+	def test_filterChainSkips(self):
+		#no content blocks: nothing to fuse or to remove words from
+		chain=FilterChain([BlockProximityFusion(1,False,False),MinWordsFilter(3),BoilerplateBlockFilter()])
+		doc=self.makedoc([5,5,5],None,[False,False,False])
+		self.assertTrue(chain.process(doc))
+		self.assertEqual(len(doc.getTextBlocks()),0)
+		self.assertEqual((chain.passes,chain.skippedPasses),(1,2))
+		#every block is content, and there is no title
+		chain=FilterChain([BoilerplateBlockFilter(),ExpandTitleToContentFilter(),LabelToBoilerplateFilter(DefaultLabels.STRICTLY_NOT_CONTENT)])
+		doc=self.makedoc([5,5,5],None,[True,True,True])
+		self.assertFalse(chain.process(doc))
+		self.assertEqual((chain.passes,chain.skippedPasses),(0,3))
+		doc=self.makedoc([5,5,5],None,[True,True,True],[None,DefaultLabels.STRICTLY_NOT_CONTENT,None])
+		self.assertTrue(chain.process(doc))
+		self.assertEqual([block.isContent() for block in doc.getTextBlocks()],[True,False,True])
+		self.assertEqual((chain.passes,chain.skippedPasses),(1,5))
+		#an idempotent filter runs again only if what it reads or writes changed
+		classifier=NumWordsRulesClassifier()
+		chain=FilterChain([classifier,classifier,InvertedFilter(),classifier])
+		doc=self.makedoc([20,2,3],None,[False,False,False])
+		chain.process(doc)
+		expected=self.makedoc([20,2,3],None,[False,False,False])
+		FilterChain(chain.filterArr,False).process(expected)
+		self.assertEqual([block.isContent() for block in doc.getTextBlocks()],[block.isContent() for block in expected.getTextBlocks()])
+		self.assertEqual([block.isContent() for block in doc.getTextBlocks()],[True,True,False])
+		self.assertEqual((chain.passes,chain.skippedPasses),(3,1))
+
+	def test_filterChainSkipsGoldenCorpus(self):
+		from boilerpy import extractors
+		chains=[extractors.articleFilterChain,extractors.defaultFilterChain,extractors.largestContentFilterChain,extractors.ARTICLE_SENTENCES_EXTRACTOR.filter]
+		for filename,s in readGoldenPages():
+			for chain in chains:
+				extractor=Extractor(chain)
+				content=extractor.getContent(s)
+				chain.skipNoOps=False
+				try:
+					self.assertEqual(extractor.getContent(s),content,filename)
+				finally:
+					chain.skipNoOps=True
+
+	def test_leanExtraction(self):
+		from boilerpy import extractors
+		chain=FilterChain([NumWordsRulesClassifier(),MinWordsFilter(3),IgnoreBlocksAfterContentFilter(),BoilerplateBlockFilter()])
+		self.assertEqual(getReleasePoints(chain),(1,3))
+		self.assertEqual(getReleasePoints(FilterChain([chain,KeepLargestBlockFilter()])),(1,5))
+		self.assertEqual(getReleasePoints(FilterChain([chain,KeepLargestBlockFilter(True)])),(5,5))
+		self.assertEqual(getReleasePoints(extractors.articleFilterChain),(9,9))
+		
+		doc=self.makedoc([2,10,30,10],None,None,[None,None,DefaultLabels.TITLE,None])
+		FilterChain([MinWordsFilter(3),LabelToBoilerplateFilter(DefaultLabels.TITLE)]).process(doc,True)
+		self.assertEqual([tb.getText() for tb in doc.getTextBlocks()],["","","",""])
+		self.assertEqual([tb.getLabels() for tb in doc.getTextBlocks()],[set()]*4)
+		self.assertEqual(doc.getTextBlocks()[2].getNumWords(),30)
+		
+		names=["ARTICLE_EXTRACTOR","DEFAULT_EXTRACTOR","CANOLA_EXTRACTOR","LARGEST_CONTENT_EXTRACTOR","ARTICLE_SENTENCES_EXTRACTOR"]
+		for filename,s in readGoldenPages():
+			for name in names:
+				extractor=getattr(extractors,name)
+				doc=extractor.getDoc(s)
+				leanDoc=extractor.getLeanDoc(s)
+				self.assertEqual(leanDoc.getContent(),doc.getContent(),(filename,name))
+				self.assertEqual(leanDoc.getTitle(),doc.getTitle())
+	
+	def test_lazyImports(self):
+		#importing boilerpy imports nothing else; extractors are built on first use
+		import subprocess
+		script="import sys,boilerpy; print sorted(m for m in sys.modules if m.startswith('boilerpy.') and sys.modules[m]!=None); from boilerpy import extractors; print extractors.isLoaded('ARTICLE_EXTRACTOR'), 'urllib2' in sys.modules"
+		out=subprocess.check_output([sys.executable,"-c",script],env=dict(os.environ,PYTHONPATH=os.pathsep.join(sys.path)))
+		self.assertEqual(out.split("\n")[:2],["['boilerpy.lazy']","False False"])
+		import boilerpy
+		from boilerpy import extractors
+		self.assertTrue(boilerpy.extractors is extractors)
+		self.assertTrue(extractors.ARTICLE_EXTRACTOR is extractors.ARTICLE_EXTRACTOR)
+		self.assertTrue(extractors.ARTICLE_EXTRACTOR.filter is articleFilterChain)
+		self.assertTrue(extractors.ARTICLE_SENTENCES_EXTRACTOR.filter.filterArr[0] is articleFilterChain)
+		self.assertTrue("CANOLA_EXTRACTOR" in dir(extractors))
+		self.assertRaises(AttributeError,getattr,extractors,"NO_SUCH_EXTRACTOR")
+		#import * builds the extractors, and importing the module does not import batch extraction
+		script="import sys; from boilerpy.extractors import *; print ARTICLE_EXTRACTOR.filter is articleFilterChain, isinstance(DEFAULT_EXTRACTOR,Extractor), 'boilerpy.batch' in sys.modules, 'boilerpy.dedup' in sys.modules"
+		out=subprocess.check_output([sys.executable,"-c",script],env=dict(os.environ,PYTHONPATH=os.pathsep.join(sys.path)))
+		self.assertEqual(out.strip(),"True True False False")
+		self.assertEqual([name for name in extractors.__all__ if not hasattr(extractors,name)],[])
+	
 	def test_numWordsClassifier(self):
 		#accepts or rejects block based on machine-trained decision tree rules
 		#using features from previous, current and next block
@@ -365,6 +833,26 @@ class TestParser(unittest.TestCase):
 		textArr=[block.getText() for block in blocks]
 		self.assertEqual(textArr,[content[0]])
 
+	def test_ignoreSelectors(self):
+		template="<html><body><nav><ul><li>Home</li></ul></nav><p>*</p><div class='ad cookie-banner'><div><p>Accept</p></div><p>Cookies</p></div><p>*</p><div id='comments'><p>First!</p></div><footer>Copyright</footer></body></html>"
+		content=self.makecontent([10,12])
+		s=template.replace('*',content[0],1).replace('*',content[1],1)
+		doc=Extractor(None,"nav, .cookie-banner, #comments, footer").parseDoc(s)
+		textArr=[block.getText() for block in doc.getTextBlocks()]
+		self.assertEqual(textArr,content)
+		#elements without end tags are closed by their siblings, and by the end of their parent
+		for backend in [None,parser.FastHTMLTokenizer()]:
+			extractor=Extractor(None,".ad",backend=backend)
+			page="<html><body>%s</body></html>"
+			doc=extractor.parseDoc(page % "<ul><li class='ad'>Sponsored<li>Item two<li>Item three</ul>")
+			self.assertEqual([block.getText() for block in doc.getTextBlocks()],["Item two","Item three"])
+			doc=extractor.parseDoc(page % "<p class='ad'>Sponsored<p>Main article text")
+			self.assertEqual([block.getText() for block in doc.getTextBlocks()],["Main article text"])
+			doc=extractor.parseDoc(page % "<div><p class='ad'>Sponsored <b>link</b></div><p>After the ad")
+			self.assertEqual([block.getText() for block in doc.getTextBlocks()],["After the ad"])
+			doc=extractor.parseDoc(page % "<ul><li class='ad'>Sponsored<ul><li>Nested<li>Nested too</ul><li>Item two</ul>")
+			self.assertEqual([block.getText() for block in doc.getTextBlocks()],["Item two"])
+
 	def assertRange(self,val,minval,maxval):
 		self.assertTrue(val>=minval and val<=maxval)
 
@@ -402,6 +890,31 @@ class TestParser(unittest.TestCase):
 		levelArr=[block.getTagLevel() for block in blocks]
 		self.assertEqual(levelArr,[5,3])
 	
+	def test_labels(self):
+		tagActions=dict(parser.defaultTagActionMap)
+		tagActions["H1"]=parser.BlockTagLabelAction(parser.LabelAction(DefaultLabels.TITLE))
+		tagActions["DIV"]=parser.BlockTagLabelAction(parser.ConditionalLabelAction(lambda tb:tb.getNumWords()>2,DefaultLabels.MIGHT_BE_CONTENT))
+		tagActions["FONT"]=parser.CommonTagActions.TA_FONT
+		s="<html><body><div><h1>Big title</h1><font size='+2'><p>Short one</p></font><p>Three words here</p></div><p>Outside</p></body></html>"
+		bpParser=parser.BoilerpipeHTMLParser(tagActions)
+		bpParser.feed(s)
+		labels=[block.getLabels() for block in bpParser.toTextDocument().getTextBlocks()]
+		self.assertEqual(labels,[set([DefaultLabels.TITLE]),set(["font-5"]),set([DefaultLabels.MIGHT_BE_CONTENT]),set()])
+
+	def test_markupLabels(self):
+		s="<html><body><div id='nav' class='menu main'><p>Home</p><br><p>News 24</p></div><div class='story'><p>Text</p></div></body></html>"
+		bpParser=parser.BoilerpipeHTMLParser(parser.MarkupTagActionMap())
+		bpParser.feed(s)
+		doc=bpParser.toTextDocument()
+		blocks=doc.getTextBlocks()
+		for label in ["<div","<.menu.main","<.menu","<.main","<#nav","<p","<#nav <p","<.menu <p"]:
+			self.assertIn(label,blocks[1].getLabels())
+		self.assertNotIn("<.story",blocks[1].getLabels())
+		self.assertIn("<.story <p",blocks[2].getLabels())
+		self.assertNotIn("<#nav",blocks[2].getLabels())
+		LabelFusion().process(doc)
+		self.assertEqual([block.getText() for block in doc.getTextBlocks()],["Home\nNews 24","Text"])
+
 	def test_merge(self):
 		block1=TextBlock("AA BB CC ",set([0]),3,3,3,1,0)
 		block2=TextBlock("DD EE FF GG HH II JJ .",set([1]),6,0,6,2,1)
@@ -417,4 +930,392 @@ class TestParser(unittest.TestCase):
 		self.assertEqual(block1.getOffsetBlocksStart(),0)
 		self.assertEqual(block1.getOffsetBlocksEnd(),1)
 
+	def test_mergeRange(self):
+		blocks=[TextBlock("AA BB",set([i]),2,1 if i==1 else 0,0,0,i) for i in range(4)]
+		merged=blocks[0].clone()
+		merged.mergeRange(blocks[1:])
+		chained=blocks[0].clone()
+		for block in blocks[1:]: chained.mergeNext(block)
+		self.assertEqual(merged.getText(),"AA BB\nAA BB\nAA BB\nAA BB")
+		self.assertEqual(merged.getText(),chained.getText())
+		self.assertEqual(merged.getNumWords(),8)
+		self.assertAlmostEqual(merged.getLinkDensity(),1.0/8.0)
+		self.assertEqual(merged.getContainedTextElements(),set([0,1,2,3]))
+		self.assertEqual(merged.getOffsetBlocksEnd(),3)
+
+	def blockState(self,doc):
+		return [doc.getTitle()]+[(block.getText(),block.getNumWords(),block.getNumWordsInAnchorText(),block.numWordsInWrappedLines,block.numWrappedLines,block.getOffsetBlocksStart(),block.getOffsetBlocksEnd(),block.getTagLevel(),block.getLabels(),block.getContainedTextElements()) for block in doc.getTextBlocks()]
+
+	def test_tokenizerGoldenCorpus(self):
+		fontTagActions=dict(parser.defaultTagActionMap)
+		fontTagActions["FONT"]=parser.CommonTagActions.TA_FONT
+		configs=[(None,None),(parser.MarkupTagActionMap(),None),(fontTagActions,"ul, .comments, #sidebar")]
+		for filename,s in readGoldenPages():
+			for tagActions,ignoreSelectors in configs:
+				expected=parser.BoilerpipeHTMLParser(tagActions,ignoreSelectors)
+				expected.feed(s)
+				actual=parser.BoilerpipeParser(parser.FastHTMLTokenizer(),tagActions,ignoreSelectors)
+				actual.feed(s)
+				expectedState=self.blockState(expected.toTextDocument())
+				self.assertTrue(len(expectedState)>1)
+				self.assertEqual(self.blockState(actual.toTextDocument()),expectedState,filename)
+		#backends have to implement parse
+		self.assertRaises(TypeError,parser.ParserBackend)
+
+	def test_recycleAndTextElements(self):
+		s="<html><head><title>T</title></head><body><p>One <b>two</b></p><div>Three"
+		expected=parser.BoilerpipeHTMLParser()
+		expected.feed(s+"</div></body></html>")
+		expectedState=self.blockState(expected.toTextDocument())
+		bpParser=parser.BoilerpipeHTMLParser()
+		bpParser.feed(s)
+		bpParser.recycle()
+		self.assertEqual(bpParser.rawdata,"")
+		bpParser.feed(s+"</div></body></html>")
+		self.assertEqual(self.blockState(bpParser.toTextDocument()),expectedState)
+		self.assertEqual([tb.getContainedTextElements() for tb in expected.toTextDocument().getTextBlocks()],[set([1,2,3]),set([4])])
+		
+		bpParser=parser.BoilerpipeHTMLParser()
+		bpParser.keepTextElements=False
+		bpParser.feed(s+"</div></body></html>")
+		doc=bpParser.toTextDocument()
+		self.assertEqual([state[:-1] for state in self.blockState(doc)[1:]],[state[:-1] for state in expectedState[1:]])
+		self.assertEqual([tb.getContainedTextElements() for tb in doc.getTextBlocks()],[frozenset()]*2)
+
+	def test_parserPool(self):
+		texts=[text for filename,text in readGoldenPages()]
+		#a page the HTMLParser fails on, and one leaving half a tag in the parser
+		texts[1:1]=["<html><body><p>Before</p><![foo[ x ]]><p>After</p></body></html>","<p>Cut <a href='x"]
+		for backend in (None,parser.FastHTMLTokenizer()):
+			pooled=Extractor(articleFilterChain,backend=backend)
+			unpooled=Extractor(articleFilterChain,backend=backend,poolParsers=False)
+			for text in texts+texts:
+				doc=pooled.parseDoc(text)
+				expected=unpooled.parseDoc(text)
+				self.assertEqual(doc==None,expected==None)
+				if doc!=None: self.assertEqual(self.blockState(doc),self.blockState(expected))
+			self.assertEqual((pooled.parserPool.created,pooled.parserPool.reused),(1,2*len(texts)-1))
+		
+		#each thread has parsers of its own
+		import threading
+		pool=parser.ParserPool(parser.BoilerpipeHTMLParser)
+		acquired=[]
+		def run():
+			acquired.append(pool.acquire())
+			pool.release(acquired[-1])
+		for i in range(2):
+			thread=threading.Thread(target=run)
+			thread.start()
+			thread.join()
+		run()
+		run()
+		self.assertEqual(pool.created,3)
+		self.assertTrue(acquired[2] is acquired[3])
+
+	def test_parseStream(self):
+		s="<html><head><title>T</title></head><body><p>One &amp; one</p><div>Two<!-- a < b --></div><script>if(a<b){}</script><p title='<'>Three</p></body></html>"
+		expected=parser.BoilerpipeHTMLParser()
+		expected.feed(s)
+		expectedState=self.blockState(expected.toTextDocument())
+		for size in (1,3,len(s)):
+			blocks=list(parser.BoilerpipeHTMLParser().parseStream(s[i:i+size] for i in range(0,len(s),size)))
+			self.assertEqual(self.blockState(TextDocument(blocks,"T")),expectedState)
+
+	def test_tokenizerBackend(self):
+		s="<html><body><p>Text &amp; more</p><script>var s='<p>no</p>';</script><p>After</p></body></html>"
+		doc=Extractor(None,backend=parser.FastHTMLTokenizer()).parseDoc(s)
+		self.assertEqual([block.getText() for block in doc.getTextBlocks()],["Text more","After"])
+
+	def test_xmlMode(self):
+		extractor=Extractor(None,xmlMode="auto")
+		xhtml='<?xml version="1.0"?><html xmlns="http://www.w3.org/1999/xhtml"><head><title>XHTML page</title></head><body><div><p>Some text\nover two lines</p><br/><p>More <a href="x">linked</a> text</p></div></body></html>'
+		doc=extractor.parseDoc(xhtml)
+		htmlDoc=Extractor(None).parseDoc(xhtml)
+		self.assertEqual(doc.parsePath,"xml")
+		self.assertEqual(htmlDoc.parsePath,"html")
+		self.assertEqual(self.blockState(doc),self.blockState(htmlDoc))
+		
+		doc=extractor.parseDoc('<?xml version="1.0"?><html><body><p>Unclosed<br></p></body></html>')
+		self.assertEqual(doc.parsePath,"xml-fallback")
+		self.assertEqual([block.getText() for block in doc.getTextBlocks()],["Unclosed"])
+		
+		doc=extractor.parseDoc('<html><body><p>Plain HTML</p></body></html>')
+		self.assertEqual(doc.parsePath,"html")
+		self.assertEqual(extractor.parsePathCounts,{"xml":1,"xml-fallback":1,"html":1})
+
+class TestServer(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		from boilerpy import server
+		cls.server=server.ExtractionServer(("127.0.0.1",0),1,1,requestTimeout=10)
+		thread=threading.Thread(target=cls.server.serve_forever)
+		thread.daemon=True
+		thread.start()
+	
+	@classmethod
+	def tearDownClass(cls):
+		cls.server.shutdown()
+		cls.server.server_close()
+	
+	def request(self,conn,method,path,body=None):
+		conn.request(method,path,body,{} if body==None else {"Content-Type":"text/html; charset=utf-8"})
+		response=conn.getresponse()
+		return response.status,json.loads(response.read())
+	
+	def connect(self):
+		return httplib.HTTPConnection(*self.server.server_address)
+	
+	def test_extract(self):
+		page=u"<html><head><title>Caf\xe9</title></head><body><p>"+" ".join(["Some words of the article."]*10)+"</p></body></html>"
+		conn=self.connect()
+		status,result=self.request(conn,"POST","/extract",page.encode("utf8"))
+		self.assertEqual(status,200)
+		self.assertEqual(result["content"],Extractor(articleFilterChain).getContent(page))
+		self.assertEqual((result["title"],result["extractor"],result["parsePath"]),(u"Caf\xe9","ARTICLE_EXTRACTOR","html"))
+		self.assertEqual(sorted(result["timings"]),["fetch","filter","parse","queue","total"])
+		#the same connection is kept alive
+		sock=conn.sock
+		status,result=self.request(conn,"POST","/extract?extractor=KEEP_EVERYTHING_EXTRACTOR","<html><body><p>Menu</p><p>Text</p></body></html>")
+		self.assertEqual((status,result["content"]),(200,"Menu\nText\n"))
+		self.assertTrue(conn.sock is sock)
+		self.assertEqual(self.request(conn,"POST","/extract?extractor=NO_EXTRACTOR","<p>x</p>"),(400,{"error":"unknown extractor: NO_EXTRACTOR"}))
+		self.assertEqual(self.request(conn,"GET","/health"),(200,{"status":"ok","workers":1,"pending":0}))
+		conn.close()
+	
+	def test_extractUrl(self):
+		from BaseHTTPServer import HTTPServer,BaseHTTPRequestHandler
+		class PageHandler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				self.send_response(200)
+				self.send_header("Content-Type","text/html; charset=utf-8")
+				self.end_headers()
+				self.wfile.write("<html><head><title>Fetched</title></head><body><p>Fetched text</p></body></html>")
+			def log_message(self,format,*args): pass
+		pageServer=HTTPServer(("127.0.0.1",0),PageHandler)
+		thread=threading.Thread(target=pageServer.serve_forever)
+		thread.daemon=True
+		thread.start()
+		try:
+			conn=self.connect()
+			status,result=self.request(conn,"GET","/extract?extractor=KEEP_EVERYTHING_EXTRACTOR&url=http://%s:%d/page.html" % pageServer.server_address)
+			self.assertEqual((status,result["title"],result["content"]),(200,"Fetched","Fetched text\n"))
+			status,result=self.request(conn,"GET","/extract")
+			self.assertEqual(status,400)
+			#local files and other schemes are refused
+			for url in ["file:///etc/passwd","FILE:/etc/passwd","ftp://example.com/page.html","/etc/passwd"]:
+				status,result=self.request(conn,"GET","/extract?url=%s" % url)
+				self.assertEqual((status,result["error"]),(400,"only http and https urls are fetched: %s" % url))
+			self.server.allowUrls=False
+			try:
+				status,result=self.request(conn,"GET","/extract?url=http://%s:%d/page.html" % pageServer.server_address)
+				self.assertEqual((status,result),(403,{"error":"fetching urls is disabled"}))
+			finally:
+				self.server.allowUrls=True
+			conn.close()
+		finally:
+			pageServer.shutdown()
+			pageServer.server_close()
+	
+	def test_overload(self):
+		conn=self.connect()
+		#take the worker and the queue slot
+		self.assertTrue(self.server.slots.acquire(False))
+		self.assertTrue(self.server.slots.acquire(False))
+		try:
+			self.assertEqual(self.request(conn,"POST","/extract","<p>x</p>"),(429,{"error":"too many requests"}))
+		finally:
+			self.server.slots.release()
+			self.server.slots.release()
+		self.server.closing=True
+		try:
+			self.assertEqual(self.request(conn,"POST","/extract","<p>x</p>")[0],503)
+		finally:
+			self.server.closing=False
+		self.assertEqual(self.request(conn,"POST","/extract","<p>x</p>")[0],200)
+		conn.close()
+	
+	def test_workerDeath(self):
+		import socket,signal,time
+		from boilerpy import server
+		#a single slot, taken by a page fetched from a server which never answers
+		deadServer=server.ExtractionServer(("127.0.0.1",0),1,0,requestTimeout=1,fetchTimeout=30,orphanTimeout=0.5)
+		thread=threading.Thread(target=deadServer.serve_forever)
+		thread.daemon=True
+		thread.start()
+		listener=socket.socket()
+		listener.bind(("127.0.0.1",0))
+		listener.listen(1)
+		listener.settimeout(10)
+		try:
+			responses=[]
+			def fetch():
+				conn=httplib.HTTPConnection(*deadServer.server_address)
+				responses.append(self.request(conn,"GET","/extract?url=http://%s:%d/" % listener.getsockname()))
+				conn.close()
+			client=threading.Thread(target=fetch)
+			client.start()
+			#the worker is fetching the page: kill it, which loses its task
+			pageConn,_=listener.accept()
+			for process in deadServer.pool._pool: os.kill(process.pid,signal.SIGKILL)
+			client.join()
+			self.assertEqual(responses,[(503,{"error":"the request timed out"})])
+			#the slot comes back after orphanTimeout, and a new worker extracts
+			conn=httplib.HTTPConnection(*deadServer.server_address)
+			deadline=time.time()+10
+			while True:
+				status,result=self.request(conn,"POST","/extract","<html><body><p>Some text</p></body></html>")
+				if status!=429 or time.time()>deadline: break
+				time.sleep(0.1)
+			self.assertEqual(status,200)
+			conn.close()
+			pageConn.close()
+		finally:
+			listener.close()
+			deadServer.shutdown()
+			deadServer.server_close()
+
+def runBatchWorker(db,outputDir,processes):
+	from boilerpy import runner
+	store=runner.LeaseStore(db)
+	runner.BatchWorker(store,outputDir,"DEFAULT_EXTRACTOR",processes).run()
+	store.close()
+
+class TestBatchRunner(unittest.TestCase):
+	def setUp(self):
+		import tempfile
+		self.dir=tempfile.mkdtemp()
+	
+	def tearDown(self):
+		import shutil
+		shutil.rmtree(self.dir)
+	
+	def writeManifest(self,lines):
+		path=os.path.join(self.dir,"manifest.txt")
+		f=open(path,"w")
+		f.write("\n".join(lines)+"\n")
+		f.close()
+		return path
+	
+	def test_workers(self):
+		import multiprocessing
+		from boilerpy import runner
+		names=sorted(os.listdir(GOLDEN_DIR))
+		#absolute and relative paths, a blank line and a missing file
+		lines=[os.path.join(GOLDEN_DIR,name) for name in names]*3+["",os.path.join(os.path.relpath(GOLDEN_DIR,self.dir),names[0]),"missing.html"]
+		db=os.path.join(self.dir,"leases.db")
+		store=runner.LeaseStore(db)
+		self.assertEqual(runner.planLeases(store,[self.writeManifest(lines)],2),7)
+		outputDir=os.path.join(self.dir,"output")
+		workers=[multiprocessing.Process(target=runBatchWorker,args=(db,outputDir,processes)) for processes in (1,1,2)]
+		for worker in workers: worker.start()
+		for worker in workers: worker.join()
+		self.assertEqual(store.getStatus(),{"pending":(0,0),"claimed":(0,0),"done":(7,14),"failed":(0,0)})
+		results=list(runner.readResults(outputDir))
+		self.assertEqual([os.path.abspath(result["path"]) for result in results],[os.path.abspath(os.path.join(self.dir,line)) for line in lines if line!=""])
+		from boilerpy import extractors
+		for result in results[:-1]:
+			self.assertEqual(result["content"],extractors.DEFAULT_EXTRACTOR.getContentFromFile(result["path"]))
+		self.assertTrue(results[-1]["error"].startswith("IOError"))
+		self.assertEqual(sorted(os.listdir(outputDir)),[runner.getLeaseOutputName(i) for i in range(1,8)])
+		store.close()
+	
+	def test_expiredLeases(self):
+		from boilerpy import runner
+		store=runner.LeaseStore(os.path.join(self.dir,"leases.db"))
+		runner.planLeases(store,[self.writeManifest([os.path.join(GOLDEN_DIR,"news.html")]*3)],2)
+		#a worker claims the first lease and crashes
+		self.assertEqual(store.claim("crashed",-1)[0],1)
+		self.assertFalse(store.renew(2,"crashed",60))
+		worker=runner.BatchWorker(store,self.dir,"DEFAULT_EXTRACTOR")
+		self.assertEqual(worker.run(),2)
+		self.assertFalse(store.complete(1,"crashed"))
+		self.assertEqual(store.connection.execute("SELECT attempts FROM leases ORDER BY id").fetchall(),[(2,),(1,)])
+		self.assertEqual(len(list(runner.readResults(self.dir))),3)
+		
+		#leases failing again and again are given up
+		runner.planLeases(store,[self.writeManifest(["a.html"])],2)
+		for i in range(3): self.assertEqual(store.claim("crashed",-1)[0],3)
+		self.assertEqual(store.claim("crashed",-1),None)
+		self.assertEqual(store.getStatus()["failed"],(1,1))
+		store.close()
+	
+	def test_heartbeat(self):
+		import time
+		from boilerpy import runner
+		db=os.path.join(self.dir,"leases.db")
+		store=runner.LeaseStore(db)
+		runner.planLeases(store,[self.writeManifest([os.path.join(GOLDEN_DIR,"news.html")]*2)],2)
+		#the output left by a worker which crashed with the lease
+		stalePath=os.path.join(self.dir,runner.getLeaseOutputName(1)+".crashed-1-abc.tmp")
+		open(stalePath,"w").close()
+		#files slower than the lease: the lease is renewed meanwhile, so no other worker gets it
+		other=runner.LeaseStore(db)
+		claims=[]
+		def slowExtract(item):
+			time.sleep(0.5)
+			claims.append(other.claim("other",60))
+			return extractFile(item)
+		extractFile=runner.extractFile
+		runner.extractFile=slowExtract
+		try:
+			worker=runner.BatchWorker(store,self.dir,"DEFAULT_EXTRACTOR",leaseDuration=0.3)
+			self.assertEqual(worker.run(),1)
+		finally:
+			runner.extractFile=extractFile
+		self.assertEqual(claims,[None,None])
+		self.assertEqual(worker.leasesLost,0)
+		self.assertFalse(os.path.exists(stalePath))
+		self.assertEqual(len(list(runner.readResults(self.dir))),2)
+		other.close()
+		store.close()
+
+
+class TestPipeline(unittest.TestCase):
+	def readPages(self,extractor):
+		return [(name,extractor.readFromFile(os.path.join(GOLDEN_DIR,name))) for name in sorted(os.listdir(GOLDEN_DIR))]
+	
+	def test_packDocument(self):
+		import pickle
+		from boilerpy import document,extractors
+		for name in ("DEFAULT_EXTRACTOR","ARTICLE_EXTRACTOR","ARTICLE_SENTENCES_EXTRACTOR"):
+			extractor=getattr(extractors,name)
+			for key,html in self.readPages(extractor):
+				doc=extractor.parseDoc(html)
+				packed=pickle.loads(pickle.dumps(document.packDocument(doc),2))
+				unpacked=document.unpackDocument(packed)
+				self.assertEqual([(tb.getText(),tb.labels,tb.textDensity,tb.linkDensity,tb.offsetBlocksStart,tb.tagLevel) for tb in unpacked.getTextBlocks()],[(tb.getText(),tb.labels,tb.textDensity,tb.linkDensity,tb.offsetBlocksStart,tb.tagLevel) for tb in doc.getTextBlocks()])
+				extractor.filter.process(unpacked)
+				self.assertEqual(unpacked.getContent(),extractor.getContent(html))
+	
+	def test_pipeline(self):
+		from boilerpy import pipeline,extractors
+		pages=self.readPages(extractors.ARTICLE_EXTRACTOR)*5
+		pages.insert(3,("broken",None))
+		expected=[extractors.ARTICLE_EXTRACTOR.getContent(html) for key,html in pages if html!=None]
+		for p in (pipeline.ExtractionPipeline(poolSizes=(1,1,1),queueSize=2),pipeline.ExtractionPipeline(workers=5,queueSize=2,rebalanceInterval=4)):
+			results=[json.loads(line) for line in p.run(iter(pages))]
+			self.assertEqual([result["key"] for result in results],[key for key,html in pages])
+			self.assertTrue(results[3]["error"].startswith("TypeError"))
+			self.assertEqual([result["content"] for result in results if "error" not in result],expected)
+			self.assertEqual(p.pagesDone,len(pages))
+			self.assertEqual(len(p.rebalances),0 if p.rebalanceInterval==None else len(pages)//4)
+			self.assertTrue(all(process.exitcode==0 for processes in p.processes for process in processes))
+		
+		#stopping early terminates the workers
+		p=pipeline.ExtractionPipeline(poolSizes=(1,1,1))
+		lines=p.run(iter(pages))
+		lines.next()
+		lines.close()
+		for processes in p.processes:
+			for process in processes: process.join()
+	
+	def test_poolSizes(self):
+		from boilerpy import pipeline
+		self.assertEqual(pipeline.getPoolSizes([3.0,2.0,0.1],6),[3,2,1])
+		self.assertEqual(pipeline.getPoolSizes([0.0,0.0,0.0],3),[1,1,1])
+		self.assertEqual(pipeline.getPoolSizes([0.1,5.0,0.1],5),[1,3,1])
+		self.assertRaises(ValueError,pipeline.getPoolSizes,[1.0,1.0,1.0],2)
+		self.assertRaises(ValueError,pipeline.ExtractionPipeline,"NO_EXTRACTOR")
+
+
 runTests()